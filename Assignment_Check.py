@@ -1,30 +1,126 @@
-import matplotlib.pyplot as plt
-import networkx as nx
+from conflict_graph import as_networkx
+from layout import get_layout
+from instrument import timed
 
 
-def check_Sat(graph, schedule):
+def _slot(assignment):
+    #SAT schedules map course -> slot, SMT schedules course -> [slot, room]
+    return assignment[0] if isinstance(assignment, (list, tuple)) else assignment
+
+
+def _unique_edges(graph):
+    """
+    Every conflicting pair once as (course, course, # of shared students), also for a networkx MultiGraph
+    (where each shared student is its own parallel edge)
+    """
+    if hasattr(graph, 'weighted_edges'):
+        return graph.weighted_edges()
+    counts = {}
+    for u, v in graph.edges():
+        key = (u, v) if str(u) <= str(v) else (v, u)
+        counts[key] = counts.get(key, 0) + 1
+    return [(u, v, weight) for (u, v), weight in counts.items()]
+
+
+@timed('validate')
+def validate_schedule(graph, schedule, room_capacity=None, course_enrollment=None):
+    """
+    Checks a schedule in O(courses + conflicting pairs) and collects every problem instead of stopping at the first one.
+    schedule: course -> slot, or course -> [slot, room] (then room_capacity and course_enrollment are needed for the capacity check)
+    Returns a dict with
+    - valid: True if every list below is empty
+    - missing: courses of the graph without a slot
+    - conflicts: (course, course, slot, # of shared students) for conflicting courses in the same slot
+    - double_booked: (slot, room, [courses]) for rooms holding more than one exam at the same time
+    - over_capacity: (course, room, enrollment, capacity)
+    - unknown_rooms: (course, room) for rooms that aren't in room_capacity
+    """
+    missing = [node for node in graph if node not in schedule]
+    conflicts = []
+    for u, v, weight in _unique_edges(graph):
+        if u in schedule and v in schedule and _slot(schedule[u]) == _slot(schedule[v]):
+            conflicts.append((u, v, _slot(schedule[u]), weight))
+
+    double_booked = []
+    over_capacity = []
+    unknown_rooms = []
+    booked = {}
+    for course, assignment in schedule.items():
+        if not isinstance(assignment, (list, tuple)):
+            continue
+        slot, room = assignment[0], assignment[1]
+        booked.setdefault((slot, room), []).append(course)
+        if room_capacity is None or course_enrollment is None:
+            continue
+        if room not in room_capacity:
+            unknown_rooms.append((course, room))
+        elif room_capacity[room] < course_enrollment[course]:
+            over_capacity.append((course, room, course_enrollment[course], room_capacity[room]))
+    for (slot, room), courses in booked.items():
+        if len(courses) > 1:
+            double_booked.append((slot, room, courses))
+
+    return {
+        'valid': not (missing or conflicts or double_booked or over_capacity or unknown_rooms),
+        'missing': missing,
+        'conflicts': conflicts,
+        'double_booked': double_booked,
+        'over_capacity': over_capacity,
+        'unknown_rooms': unknown_rooms,
+    }
+
+
+def print_violations(report, limit=20):
+    """
+    Prints the problems of a validate_schedule report, at most limit of each kind (None for all)
+    """
+    lines = {
+        'missing': lambda course: f"Invalid assignment: {course} has no slot.",
+        'conflicts': lambda c: f"Invalid assignment: {c[0]} and {c[1]} have the same color ({c[2]}), {c[3]} shared students.",
+        'double_booked': lambda b: f"Invalid assignment: {', '.join(map(str, b[2]))} are in the same room ({b[1]}, slot {b[0]}).",
+        'over_capacity': lambda o: f"Invalid assignment: {o[0]} exceeds room capacity ({o[2]} students, {o[1]} holds {o[3]}).",
+        'unknown_rooms': lambda u: f"Invalid assignment: {u[0]} is in unknown room {u[1]}.",
+    }
+    for kind, line in lines.items():
+        problems = report[kind]
+        for problem in problems[:limit]:
+            print(line(problem))
+        if limit is not None and len(problems) > limit:
+            print(f"... and {len(problems) - limit} more {kind.replace('_', ' ')}")
+
+
+@timed('check')
+def check_Sat(graph, schedule, show=True):
     """
     This function checks the validity of the assignment provided by the SAT solver implementation of the Final Exam Scheduler
     Displays a graphical representation of the assignment by coloring the courses corresponding to each color
-    Manually checks validity by iterating through and ensuring that neighbors are not the same color
+    Checks every conflicting pair once (validate_schedule) and prints every violation.
+    Returns False if the schedule is invalid
     """
-    #iterate through the graph and compare neighbors: 
-    for node in graph.nodes():
-        for neighbor in graph.neighbors(node):
-            if schedule[node] == schedule[neighbor]:
-                print(f"Invalid assignment: {node} and {neighbor} have the same color.")
-                return False
+    if schedule is None:
+        print("No schedule to check.")
+        return False
+    report = validate_schedule(graph, schedule)
+    if not report['valid']:
+        print_violations(report)
+        return False
     
-    visualize_schedule(graph, schedule)
+    visualize_schedule(graph, schedule, show)
     
     #Color the graph:
 
-def visualize_schedule(graph, schedule):
+def visualize_schedule(graph, schedule, show=True):
     """
     Visualize the graph with nodes colored according to their assigned slot.
-    graph: a NetworkX graph
+    graph: a ConflictGraph or NetworkX graph
     schedule: dict mapping node -> slot
+    show: False skips drawing entirely (headless runs), no layout is computed
     """
+    if not show:
+        return
+    #Plotting libraries are only imported when something is drawn
+    import matplotlib.pyplot as plt
+    import networkx as nx
     # Determine unique slots
     
     unique_slots = sorted(set(schedule.values()))
@@ -33,10 +129,10 @@ def visualize_schedule(graph, schedule):
     color_mapping = {slot: cmap(i % cmap.N) for i, slot in enumerate(unique_slots)}
     # Assign colors to nodes
     node_colors = [color_mapping[schedule[node]] for node in graph.nodes()]
-    # Compute layout
-    pos = nx.spring_layout(graph)
+    # Shared cached layout
+    pos = get_layout(graph)
     # Draw nodes and edges
-    nx.draw(graph, pos, with_labels=True, node_color=node_colors, edge_color='gray')
+    nx.draw(as_networkx(graph), pos, with_labels=True, node_color=node_colors, edge_color='gray')
     # Create legend mapping slots to colors
     from matplotlib.patches import Patch
     legend_handles = [Patch(color=color_mapping[slot], label=f"Slot {slot}") for slot in unique_slots]
@@ -44,83 +140,54 @@ def visualize_schedule(graph, schedule):
     plt.title("Exam Schedule Coloring by Slot")
     plt.show()
 
-def visualize_schedule_by_room(graph, schedule):
+def visualize_schedule_by_room(graph, schedule, show=True):
     """
     Visualize the graph with nodes colored according to their assigned room.
-    graph: a NetworkX graph
+    graph: a ConflictGraph or NetworkX graph
     schedule: dict mapping node -> [slot, room]
+    show: False skips drawing entirely (headless runs)
     """
+    if not show:
+        return
+    import matplotlib.pyplot as plt
+    import networkx as nx
     unique_rooms = sorted(set([room for slot, room in schedule.values()]))
     cmap = plt.get_cmap('tab20')
     color_mapping = {room: cmap(i % cmap.N) for i, room in enumerate(unique_rooms)}
     node_colors = [color_mapping[schedule[node][1]] for node in graph.nodes()]
-    pos = nx.spring_layout(graph)
-    nx.draw(graph, pos, with_labels=True, node_color=node_colors, edge_color='gray')
+    pos = get_layout(graph)
+    nx.draw(as_networkx(graph), pos, with_labels=True, node_color=node_colors, edge_color='gray')
     from matplotlib.patches import Patch
     legend_handles = [Patch(color=color_mapping[room], label=f"{room}") for room in unique_rooms]
     plt.legend(handles=legend_handles)
     plt.title("Exam Schedule Coloring by Room")
     plt.show()
 
-def check_SMT(graph, schedule, room_list, room_capacity, course_enrollment):
+@timed('check')
+def check_SMT(graph, schedule, room_list, room_capacity, course_enrollment, show=True):
     """
-    Takes in the conflict graph, schedule(a dictionary mapping course -> [Slot, Room]), room_list(A dict associating the # of the room with the room name), Course_enrollment(A dict associating the course with the enrollment size)
-    and room_capacity(A dict associating the room with the capacity) (I have no clue why i did it in such a roundabout way)
-    This function checks the validity of the assignment provided by the SMT solver implementation of the Final Exam Scheduler
+    Takes in the conflict graph, schedule(a dictionary mapping course -> [Slot, Room]), room_list(the list of room names), Course_enrollment(A dict associating the course with the enrollment size)
+    and room_capacity(A dict associating the room with the capacity)
+    This function checks the validity of the assignment provided by the SMT solver implementation of the Final Exam Scheduler:
+    no conflicting courses in the same slot, no room with two exams at once, no course in a room that is too small.
+    (slot, room) pairs are hashed, so this is linear in the # of courses + conflicting pairs, and every violation is printed.
     Displays a graphical representation of the assignment by coloring the courses corresponding
+    Returns False if the schedule is invalid
     """
-    # Iterate through the graph and compare neighbors:
-    for node in graph.nodes():
-        for neighbor in graph.neighbors(node):
-            if schedule[node] == schedule[neighbor]:
-                print(f"Invalid assignment: {node} and {neighbor} have the same color.")
-                return False
-            
-    """
-    Here's me making sense of it all: 
-    Schedule = Dictionary where {Course -> [Slot,Room NAME]}
-    Room_list = Dictionary where {Room # -> Room Name}
-    Room_capacity = Dictionary where {Room Name -> Room Capacity}
-    Course_enrollment = Dictionary where {Course Name -> Enrollment Size}
-    Assigned_Rooms = List of [Slot, Room]
-    Course_list = List of Courses, indexed the same as Assigned_Rooms
-    """
-    
-            
-    #Confirm Room Assignments are correct: Need to check all concurrent slots aren't in the same room 
-    #Currently, schedule is a dict mapping a course -> [Slot, Room] 
-    #Essentially just flatten it to [Slot, Room]
-    Assigned_Rooms = list(schedule.values())
-    Course_list = list(schedule.keys())
-    # Check if the current Course and next course are enrolled in the same slot
-    # THe following code essentially iterates through the Assignments [1,# Of Courses] and compares it to the next assignment, to see if they are in the same slot
-    # Working example would be: 3 classes: Compare [1,2], [1,3], and [2,3]
-    for i in range(len(Assigned_Rooms)-1):
-        # Assigned[rooms...] gives the room #, roomlist[room #] gives the room name, room_capacity[room name] gives the room capacity, compare to the Course capacity -- Course_list[i] gives the course name, course_enrollment[Course_list[i]] gives the course enrollment #
-        print(Assigned_Rooms[i][1])
-        if room_capacity[Assigned_Rooms[i][1]] < course_enrollment[Course_list[i]]:
-                print(f"Invalid assignment: {Course_list[i]} exceeds room capacity.")
-                return False
-        for j in range(i+1, len(Assigned_Rooms)):
-            # If in the same slot,
-            if Assigned_Rooms[i][0] == Assigned_Rooms[j][0]:
-                # Check if they are in the same room: 
-                if Assigned_Rooms[i][1] == Assigned_Rooms[j][1]:
-                    # If they are in the same room, return false
-                    # Print a warning 
-                    print(f"Invalid assignment: {Course_list[i]} and {Course_list[j]} are in the same room.")
-                    return False
-    #Check that the last course doesn't exceed the room capacity
-    if room_capacity[Assigned_Rooms[j][1]] < course_enrollment[Course_list[i]]:
-        print(f"Invalid assignment: {Course_list[len(Assigned_Rooms)-1]} exceeds room capacity.")
+    if schedule is None:
+        print("No schedule to check.")
+        return False
+    report = validate_schedule(graph, schedule, room_capacity, course_enrollment)
+    if not report['valid']:
+        print_violations(report)
         return False
-    
 
     print("Valid assignment: No Room Conflicts found.")
 
-    vis_schedule = {}
-    for key in schedule.keys():
-        vis_schedule[key] = schedule[key][0]
-    print("Visualizing schedule...", vis_schedule)
-    visualize_schedule(graph, vis_schedule)
-    #visualize_schedule_by_room(graph, schedule)
+    if show:
+        vis_schedule = {}
+        for key in schedule.keys():
+            vis_schedule[key] = schedule[key][0]
+        print("Visualizing schedule...", vis_schedule)
+        visualize_schedule(graph, vis_schedule, show)
+    #visualize_schedule_by_room(graph, schedule, show)
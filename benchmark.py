@@ -1,111 +1,274 @@
-import pandas as pd
+import argparse
+import contextlib
+import csv
+import io
+import json
+import statistics
 import sys
-import random
 import time
-from final_exam import *
-from solve_final import *
 
-def generate_subset_csv(input_file, num_students):
-    # Load the full dataset
-    df = pd.read_csv(input_file)
+import numpy as np
 
-    # Get the unique anonymized student IDs
-    unique_ids = df['Anonymized ID'].unique()
+from final_exam import data_conv_frame, build_conflict_graph, translate_nodes, generate_clauses, decode_model
+from solve_final import solve_clauses
+from Assignment_Check import validate_schedule
+from rooms import load_rooms
+from parallel import run_parallel
+from columnar import read_registrations
+from scoring import ScheduleScorer, METRICS
 
 
-    # Randomly select the desired number of unique student IDs
-    selected_ids = random.sample(list(unique_ids), num_students)
+"""
+Benchmark grid: registration subsets of num_students students x k values x backends.
+- subsets are sampled in memory with a fixed seed, so every run (and every machine) benchmarks the same students
+- every cell is run repeats times, each phase (convert, graph, encode, solve, check) is timed on its own and reported
+  as the median and the spread (max - min)
+- the cells can run in a process pool, results come back in grid order either way
+- every schedule found is also scored for student burden (back to back exams, exam days, see scoring.py)
+- results go to JSON and/or CSV, and a previous JSON result can be given as a baseline: cells that got slower than
+  the tolerance (or lost their answer) are flagged as regressions
+For the SMT backends z3 builds and solves the constraints in one call, so their encode time is the room domain
+preprocessing only and the rest is counted as solve time.
+The portfolio backend races the portfolio.py solvers (each encodes in its own process, so it is all solve time)
+and records the winning solver in the row, to tune portfolio.DEFAULT_BACKENDS on the same grid.
+"""
 
-    # Filter the DataFrame to include only those student entries
-    filtered_df = df[df['Anonymized ID'].isin(selected_ids)]
+BACKENDS = ['sat', 'smt-lia', 'smt-lra', 'optimize', 'portfolio']
+PHASES = ['convert', 'graph', 'encode', 'solve', 'check']
 
-    # Save the filtered DataFrame to a new CSV
+DEFAULT_SIZES = [10, 25, 50, 100, 250, 500, 1000, 2392]
+DEFAULT_KS = [5, 10, 20]
+
+
+def subset_registrations(data, num_students, seed=0):
+    """
+    The registration rows of num_students randomly picked students (all of them if there aren't that many)
+    """
+    unique_ids = data['Anonymized ID'].unique()
+    rng = np.random.default_rng(seed)
+    selected_ids = rng.choice(unique_ids, size=min(num_students, len(unique_ids)), replace=False)
+    return data[data['Anonymized ID'].isin(selected_ids)]
+
+
+def generate_subset_csv(input_file, num_students, seed=0):
+    """
+    Writes a subset to test_{num_students}_students.csv, for looking at an instance outside of the benchmark
+    """
+    df = read_registrations(input_file)
     output_file = f"test_{num_students}_students.csv"
-    filtered_df.to_csv(output_file, index=False)
+    subset_registrations(df, num_students, seed).to_csv(output_file, index=False)
     print(f"Created: {output_file}")
 
-def main():
-
-    """
-    "Enrollments gives a mapping of course title -> number of students enrolled"
-    enrollments = counts.to_dict()
-    SMT_start = time.time()
-    LIA_model = solve_SMT_LIA(course_list, conflicts, 20, room_list, room_capacities , enrollments)
-    satisfiable = LIA_model != None
-    SMT_end = time.time()
-    SMT_net = SMT_end - SMT_start
-    print(f"SMT Solve Time: {SMT_net:.4f}s, Satisfiable: {satisfiable}")
-    """
-
-
-
-    """
-    I will try to record the results of the Solvers for instances of 10, 25, 50, 100, 250, 500, 1000, 2392
-    at each one of these instances, I will record the time it takes to solve the problem, and will try for k values of 5, 10, 15, 20, 40
-    """
-    input_file = "Course_Reg.csv"
-    
-    for num_students in [10, 25, 50, 100, 250, 500, 1000, 2392]:
-        # Generate a subset CSV for the current number of students
-        generate_subset_csv(input_file, num_students)
-        for k in [5, 10, 20]:
-            convert_start = time.time()
-            data, course_list, student_dict, student_edges = data_conv(f'test_{num_students}_students.csv')
-            convert_end = time.time()
-            convert_net = convert_end - convert_start
-            graph = graph_conv(course_list, student_edges, False)
-            #create_clauses_start = time.time()
-            #clauses, reverse_translate = create_clauses(course_list, student_dict, student_edges, graph, k)
-            #create_clauses_end = time.time()
-            #create_clauses_net = create_clauses_end - create_clauses_start
-            #to_DIMACS(clauses, graph, "benchmarks.cnf")
-            #solve_start = time.time()
-            # Run SAT solver and record if it found a solution
-            #student_times = solve_final_exam_dimacs("benchmarks.cnf", k)
-            #sat = student_times != None
-            #solve_end = time.time()
-            #solve_net = solve_end - solve_start
-            '''
-            with open("timing_results.txt", "a") as f:
-                f.write(
-                    f"Students: {num_students}, k: {k}, "
-                    f"Convert Time: {convert_net:.4f}s, Clause Time: {create_clauses_net:.4f}s, "
-                    f"SAT Solve Time: {solve_net:.4f}s, SAT Satisfiable: {sat}\n"
-                )
-            '''
-
-            """
-            SMT Solver :
-            """
-
-            #Since we want no conflicts at all, only need a set of the conflicts.
-            conflicts = list(set(graph.edges))
-            # Compute a series mapping course title -> count
-            counts = data['Course Title'].value_counts()
-            #print(counts)
-            rooms = pd.read_csv("Exam-Rooms.csv")
-            room_capacities = {}
-            room_list = []
-            for idx, row in rooms.iterrows():
-                room_name    =  row['Building'] + ' ' + str(row['Room'])       # the room identifier
-                room_list.append(room_name)
-                room_capacity = row['EMS']  # whatever the column holding capacity is called
-                room_capacities[room_name] = room_capacity
-            # Convert to a plain dict
-
-            "Enrollments gives a mapping of course title -> number of students enrolled"
-            enrollments = counts.to_dict()
-            SMT_start = time.time()
-            LIA_model = solve_SMT_LIA(course_list, conflicts, k, room_list, room_capacities , enrollments)
-            satisfiable = LIA_model != None
-            SMT_end = time.time()
-            SMT_net = SMT_end - SMT_start
-
-            with open("timing_results.txt", "a") as f:
-                f.write(
-                    f"SMT Solve - Students: {num_students}, k: {k}, "
-                    f"SMT Solve Time: {SMT_net:.4f}s, SMT Satisfiable: {satisfiable}\n"
-                )
+
+def _quiet(func, *args, **kwargs):
+    #The solvers and checkers print the whole schedule, keep that out of the benchmark output
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def run_backend(backend, graph, enrollments, rooms, k, timeout=None):
+    """
+    Encodes and solves one instance with one backend.
+    Returns (status, schedule, encode seconds, solve seconds, extra row fields), status is 'SAT', 'UNSAT' or 'TIMEOUT'
+    (for 'optimize', 'SAT' means an optimal schedule was found)
+    """
+    start = time.perf_counter()
+    if backend == 'sat':
+        translate_dict, reverse_translate = translate_nodes(graph)
+        clauses = list(generate_clauses(graph, k, translate_dict))
+        encoded = time.perf_counter()
+        status, model = solve_clauses(clauses, timeout=timeout)
+        schedule = decode_model(model, k, reverse_translate) if status == 'SAT' else None
+        return status, schedule, encoded - start, time.perf_counter() - encoded, {}
+    if backend == 'portfolio':
+        from portfolio import portfolio_solve
+        result = portfolio_solve(graph, k, timeout=timeout)
+        return result['status'], result['schedule'], 0.0, time.perf_counter() - start, {'winner': result['winner']}
+
+    #z3 is only loaded for the SMT backends
+    from smt_solve import solve_SMT_LIA, solve_SMT_lra, conflict_solve
+    course_list = list(graph)
+    domains = rooms.domains(course_list, enrollments)
+    encoded = time.perf_counter()
+    #The time limit is set on each solver, and z3's unknown comes back as TIMEOUT rather than UNSAT
+    if backend == 'smt-lia':
+        status, schedule = _quiet(solve_SMT_LIA, course_list, graph.edges(), k, rooms.room_list, rooms.room_capacity, enrollments,
+                                  domains=domains, timeout=timeout)
+    elif backend == 'smt-lra':
+        status, schedule = _quiet(solve_SMT_lra, course_list, graph.edges(), k, rooms.room_list, rooms.room_capacity, enrollments,
+                                  domains=domains, timeout=timeout)
+    elif backend == 'optimize':
+        status, schedule = _quiet(conflict_solve, course_list, graph.weighted_edges(), k, rooms.room_list, rooms.room_capacity,
+                                  enrollments, domains=domains, timeout=timeout)
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+    return status, schedule, encoded - start, time.perf_counter() - encoded, {}
+
+
+def check_schedule(backend, graph, schedule, enrollments, rooms):
+    """
+    True if the schedule has no violations (see Assignment_Check.validate_schedule)
+    """
+    if backend in ('sat', 'portfolio'):
+        return validate_schedule(graph, schedule)['valid']
+    return validate_schedule(graph, schedule, rooms.room_capacity, enrollments)['valid']
+
+
+def summarize(samples):
+    """
+    Median and spread (max - min) of a list of seconds
+    """
+    if not samples:
+        return None, None
+    return statistics.median(samples), max(samples) - min(samples)
+
+
+def bench_cell(subset, num_students, k, backend, repeats, timeout, room_file):
+    """
+    Worker: repeats runs of one grid cell, every phase timed separately.
+    Returns (status, row dict)
+    """
+    rooms = load_rooms(room_file)
+    times = {phase: [] for phase in PHASES}
+    status = None
+    valid = None
+    burden = {}
+    extra = {}
+    for _ in range(repeats):
+        start = time.perf_counter()
+        data, course_list, student_dict, student_edges, enrollment = data_conv_frame(subset)
+        converted = time.perf_counter()
+        graph = build_conflict_graph(course_list, student_edges, enrollment)
+        built = time.perf_counter()
+        times['convert'].append(converted - start)
+        times['graph'].append(built - converted)
+
+        enrollments = data['Course Title'].value_counts().to_dict()
+        status, schedule, encode, solve, extra = run_backend(backend, graph, enrollments, rooms, k, timeout)
+        times['encode'].append(encode)
+        times['solve'].append(solve)
+        if schedule is not None:
+            start = time.perf_counter()
+            valid = check_schedule(backend, graph, schedule, enrollments, rooms)
+            times['check'].append(time.perf_counter() - start)
+            burden = ScheduleScorer(enrollment, k, list(graph)).score(schedule)
+
+    row = {'students': num_students, 'k': k, 'backend': backend, 'status': status, 'valid': valid, 'repeats': repeats,
+           'courses': len(graph), 'conflicts': graph.number_of_edges()}
+    #i.e. the portfolio winner of the last run
+    row.update(extra)
+    #Student burden of the last schedule (see scoring.py)
+    for metric in METRICS:
+        row[f'burden_{metric}'] = burden.get(metric)
+    for phase in PHASES:
+        row[f'{phase}_median'], row[f'{phase}_spread'] = summarize(times[phase])
+    row['total_median'] = sum(row[f'{phase}_median'] or 0 for phase in PHASES)
+    return status, row
+
+
+def run_benchmark(input_file="Course_Reg.csv", sizes=DEFAULT_SIZES, ks=DEFAULT_KS, backends=BACKENDS, repeats=3, seed=0,
+                  timeout=60, room_file="Exam-Rooms.csv", workers=1):
+    """
+    Runs every (size, k, backend) cell, workers > 1 runs the cells in a process pool.
+    The registration file is read once, every size is sampled from it in memory.
+    Returns the list of row dicts in grid order
+    """
+    data = read_registrations(input_file)
+    subsets = {num_students: subset_registrations(data, num_students, seed) for num_students in sizes}
+    tasks = [(subsets[num_students], num_students, k, backend, repeats, timeout, room_file)
+             for num_students in sizes for k in ks for backend in backends]
+    rows = []
+    for (_, num_students, k, backend, _, _, _), result in zip(tasks, run_parallel(bench_cell, tasks, workers)):
+        if result['result'] is not None:
+            rows.append(result['result'])
+        else:
+            rows.append({'students': num_students, 'k': k, 'backend': backend, 'status': result['status'], 'error': result['error']})
+    return rows
+
+
+def write_json(rows, filename, config=None):
+    with open(filename, "w") as f:
+        json.dump({'config': config or {}, 'rows': rows}, f, indent=2)
+
+
+def write_csv(rows, filename):
+    columns = []
+    for row in rows:
+        columns += [key for key in row if key not in columns]
+    with open(filename, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def compare_baseline(rows, baseline_file, tolerance=0.25, min_seconds=0.05):
+    """
+    Compares the rows with a JSON result of an earlier run, cell by cell.
+    A phase is a regression when its median grew by more than tolerance (fraction) and more than min_seconds,
+    a cell is also a regression when the baseline had an answer (SAT/UNSAT) and this run doesn't.
+    Returns a list of (students, k, backend, what, baseline, now)
+    """
+    with open(baseline_file) as f:
+        baseline = {(row['students'], row['k'], row['backend']): row for row in json.load(f)['rows']}
+    regressions = []
+    for row in rows:
+        key = (row['students'], row['k'], row['backend'])
+        old = baseline.get(key)
+        if old is None:
+            continue
+        if old.get('status') in ('SAT', 'UNSAT') and row.get('status') not in ('SAT', 'UNSAT'):
+            regressions.append(key + ('status', old['status'], row.get('status')))
+            continue
+        for phase in PHASES + ['total']:
+            before, now = old.get(f'{phase}_median'), row.get(f'{phase}_median')
+            if before is None or now is None:
+                continue
+            if now > before * (1 + tolerance) and now - before > min_seconds:
+                regressions.append(key + (phase, before, now))
+    return regressions
+
+
+def print_rows(rows):
+    for row in rows:
+        if 'error' in row:
+            print(f"Students: {row['students']}, k: {row['k']}, {row['backend']}: {row['status']} {row['error'] or ''}")
+            continue
+        phases = ", ".join(f"{phase} {row[f'{phase}_median']:.4f}s (+-{row[f'{phase}_spread']:.4f})"
+                           for phase in PHASES if row[f'{phase}_median'] is not None)
+        print(f"Students: {row['students']}, k: {row['k']}, {row['backend']}: {row['status']}, valid: {row['valid']}, {phases}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the final exam schedulers on registration subsets")
+    parser.add_argument("--input", default="Course_Reg.csv")
+    parser.add_argument("--rooms", default="Exam-Rooms.csv")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--ks", type=int, nargs="+", default=DEFAULT_KS)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=60, help="solver time limit per run in seconds")
+    parser.add_argument("--workers", type=int, default=1, help="processes to run the grid cells in")
+    parser.add_argument("--json", help="write the results to this JSON file")
+    parser.add_argument("--csv", help="write the results to this CSV file")
+    parser.add_argument("--baseline", help="JSON result of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before a phase is flagged")
+    args = parser.parse_args(argv)
+
+    rows = run_benchmark(args.input, args.sizes, args.ks, args.backends, args.repeats, args.seed, args.timeout, args.rooms, args.workers)
+    print_rows(rows)
+    if args.json:
+        write_json(rows, args.json, {key: value for key, value in vars(args).items() if key not in ('json', 'csv', 'baseline')})
+    if args.csv:
+        write_csv(rows, args.csv)
+    if args.baseline:
+        regressions = compare_baseline(rows, args.baseline, args.tolerance)
+        for students, k, backend, what, before, now in regressions:
+            print(f"REGRESSION students: {students}, k: {k}, {backend}, {what}: {before} -> {now}")
+        if regressions:
+            return 1
+    return 0
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
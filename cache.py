@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from enrollment import Enrollment, EXCLUDE_COURSES
+from conflict_graph import ConflictGraph
+from rooms import RoomCatalogue
+from instrument import phase
+from columnar import read_registrations
+
+
+"""
+On disk cache of the parsed registration data and conflict graph, so an unchanged Course_Reg.csv isn't parsed again.
+Entries are keyed by a hash of the registration (and room) file contents plus the parsing options, and stored as one
+compressed .npz per key in CACHE_DIR:
+- the integer codes of every registration row (enough to rebuild the Anonymized ID / Course Title columns)
+- the student and course arrays and the student x course incidence matrix (CSR arrays)
+- the conflict graph's courses and weight matrix (CSR arrays)
+- the room names and capacities, if a room file is given
+Hits refresh the file's modification time, and once the directory holds more than max_bytes the least recently used
+entries are deleted.
+"""
+
+CACHE_DIR = ".data_cache"
+CACHE_MAX_BYTES = 256 * 2**20
+
+#Bump when the stored layout changes, old entries then just stop matching
+CACHE_VERSION = 1
+
+
+def fingerprint(registration_file, room_file=None, **options):
+    """
+    sha256 of the file contents (every file of a columnar .cols directory), the parsing options and the cache version
+    """
+    digest = hashlib.sha256()
+    for filename in (registration_file, room_file):
+        if filename is None:
+            digest.update(b'\0')
+            continue
+        files = [filename]
+        if os.path.isdir(filename):
+            files = [os.path.join(filename, name) for name in sorted(os.listdir(filename))]
+        for path in files:
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(2**20), b''):
+                    digest.update(chunk)
+        digest.update(b'\1')
+    settings = {'version': CACHE_VERSION, 'exclude': EXCLUDE_COURSES, **options}
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _cache_file(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.npz")
+
+
+def _strings(values):
+    #Object arrays would need pickle, store text as fixed width unicode instead
+    values = np.asarray(values)
+    return values.astype(str) if values.dtype == object else values
+
+
+def _parse(registration_file):
+    """
+    Cold path: read the csv and encode it (the same steps as data_conv_encoded + build_conflict_graph)
+    """
+    from final_exam import data_conv_frame, build_conflict_graph
+    with phase('read_csv'):
+        data = read_registrations(registration_file)
+    data, course_list, student_dict, student_edges, enrollment = data_conv_frame(data)
+    graph = build_conflict_graph(course_list, student_edges, enrollment)
+    return data, course_list, enrollment, graph
+
+
+def _save(path, data, course_list, enrollment, graph, rooms):
+    student_codes = pd.Index(enrollment.students).get_indexer(data['Anonymized ID'])
+    course_codes = pd.Index(enrollment.courses).get_indexer(data['Course Title'])
+    incidence = enrollment.incidence
+    weights = graph.weights
+    arrays = {
+        'student_codes': student_codes.astype(np.int32),
+        'course_codes': course_codes.astype(np.int32),
+        'students': _strings(enrollment.students),
+        'courses': _strings(enrollment.courses),
+        'incidence_indptr': incidence.indptr,
+        'incidence_indices': incidence.indices,
+        'incidence_shape': np.asarray(incidence.shape),
+        'course_list': np.asarray([enrollment.course_index[course] for course in course_list], dtype=np.int32),
+        'graph_courses': np.asarray([enrollment.course_index[course] for course in graph.courses], dtype=np.int32),
+        'weights_indptr': weights.indptr,
+        'weights_indices': weights.indices,
+        'weights_data': weights.data,
+    }
+    if rooms is not None:
+        arrays['room_names'] = _strings(rooms.room_list)
+        arrays['room_capacities'] = np.asarray(rooms.capacities)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp = path + ".tmp"
+    with open(temp, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    #Readers never see a half written entry
+    os.replace(temp, path)
+
+
+def _load(path):
+    with np.load(path) as stored:
+        arrays = {name: stored[name] for name in stored.files}
+    courses = arrays['courses'].astype(object)
+    students = arrays['students']
+    if students.dtype.kind == 'U':
+        students = students.astype(object)
+    shape = tuple(arrays['incidence_shape'])
+    incidence = sparse.csr_matrix((np.ones(len(arrays['incidence_indices']), dtype=np.int32),
+                                   arrays['incidence_indices'], arrays['incidence_indptr']), shape=shape)
+    enrollment = Enrollment(students, courses, incidence)
+
+    #Only the two columns the schedulers use are rebuilt
+    data = pd.DataFrame({
+        'Anonymized ID': students[arrays['student_codes']],
+        'Course Title': courses[arrays['course_codes']],
+    })
+    course_list = courses[arrays['course_list']].tolist()
+    n = len(arrays['graph_courses'])
+    weights = sparse.csr_matrix((arrays['weights_data'], arrays['weights_indices'], arrays['weights_indptr']), shape=(n, n))
+    graph = ConflictGraph(courses[arrays['graph_courses']].tolist(), weights)
+    rooms = None
+    if 'room_names' in arrays:
+        rooms = RoomCatalogue(arrays['room_names'].tolist(), arrays['room_capacities'].tolist())
+    return data, course_list, enrollment, graph, rooms
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, keep=None):
+    """
+    Deletes the least recently used entries until the cache holds at most max_bytes (keep is never deleted)
+    """
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".npz"):
+            path = os.path.join(cache_dir, name)
+            info = os.stat(path)
+            entries.append((info.st_mtime, info.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        os.remove(path)
+        total -= size
+
+
+def load_cached(registration_file, room_file=None, cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+    """
+    Parsed registration data, conflict graph and rooms, from the cache when the files haven't changed.
+    Returns (data, course_list, enrollment, graph, rooms): data only has the Anonymized ID and Course Title columns on a hit,
+    rooms is a RoomCatalogue (None without room_file). cache_dir=None always parses
+    """
+    if cache_dir is None:
+        data, course_list, enrollment, graph = _parse(registration_file)
+        return data, course_list, enrollment, graph, RoomCatalogue.from_csv(room_file) if room_file else None
+
+    key = fingerprint(registration_file, room_file)
+    path = _cache_file(cache_dir, key)
+    if os.path.exists(path):
+        try:
+            with phase('cache_load'):
+                loaded = _load(path)
+            #Mark as recently used for the LRU eviction
+            os.utime(path)
+            return loaded
+        except (OSError, KeyError, ValueError):
+            #Unreadable entry (i.e. from an interrupted write by an old version), parse again and overwrite it
+            pass
+
+    data, course_list, enrollment, graph = _parse(registration_file)
+    rooms = RoomCatalogue.from_csv(room_file) if room_file else None
+    with phase('cache_store'):
+        _save(path, data, course_list, enrollment, graph, rooms)
+        evict(cache_dir, max_bytes, keep=path)
+    return data, course_list, enrollment, graph, rooms
+
+
+def clear_cache(cache_dir=CACHE_DIR):
+    """
+    Deletes every cache entry
+    """
+    evict(cache_dir, max_bytes=0)
@@ -0,0 +1,83 @@
+from pysat.card import CardEnc, EncType
+
+
+"""
+At-most-one encodings for the "each course gets at most one slot" constraint.
+- pairwise: (-a V -b) for every pair, O(k^2) clauses and no new variables (the original encoding)
+- commander: groups of 3 literals share a commander variable, recursively, O(k) clauses
+- everything else comes from pysat's CardEnc family (seqcounter, ladder, totalizer, ...)
+"""
+
+CARDENC_TYPES = {
+    'seqcounter': EncType.seqcounter,
+    'ladder': EncType.ladder,
+    'bitwise': EncType.bitwise,
+    'totalizer': EncType.totalizer,
+    'mtotalizer': EncType.mtotalizer,
+    'kmtotalizer': EncType.kmtotalizer,
+    'sortnetwrk': EncType.sortnetwrk,
+    'cardnetwrk': EncType.cardnetwrk,
+}
+
+ENCODINGS = ['pairwise', 'commander'] + list(CARDENC_TYPES)
+
+
+def at_most_one(lits, encoding, pool):
+    """
+    Returns the clauses saying at most one of lits is true.
+    pool: pysat IDPool, new auxiliary variables are taken from it
+    """
+    if encoding == 'pairwise':
+        return pairwise_amo(lits)
+    if encoding == 'commander':
+        return commander_amo(lits, pool)
+    if encoding in CARDENC_TYPES:
+        return CardEnc.atmost(lits, bound=1, vpool=pool, encoding=CARDENC_TYPES[encoding]).clauses
+    raise ValueError(f"Unknown at-most-one encoding: {encoding}")
+
+
+def pairwise_amo(lits):
+    """
+    i.e. for 3 colors 1,2,3: (-1 V -2), (-1 V -3), (-2 V -3)
+    """
+    clauses = []
+    for i in range(len(lits)-1):
+        for j in range(i+1, len(lits)):
+            clauses.append([-lits[i], -lits[j]])
+    return clauses
+
+
+def commander_amo(lits, pool, group_size=3):
+    """
+    Commander encoding (Klieber & Kwon): split the literals into groups, each with a commander variable c
+    - at most one literal of the group is true (pairwise, the group is small)
+    - any literal of the group being true makes c true: (-l V c)
+    - c is only true if a literal of the group is: (-c V l1 V l2 ...)
+    then at most one of the commanders is true, encoded the same way until there are few enough left for pairwise
+    """
+    clauses = []
+    while len(lits) > group_size + 1:
+        commanders = []
+        for start in range(0, len(lits), group_size):
+            group = lits[start:start + group_size]
+            c = pool.id()
+            commanders.append(c)
+            clauses.extend(pairwise_amo(group))
+            for lit in group:
+                clauses.append([-lit, c])
+            clauses.append([-c] + group)
+        lits = commanders
+    clauses.extend(pairwise_amo(lits))
+    return clauses
+
+
+def at_most(lits, bound, pool, encoding='kmtotalizer'):
+    """
+    At most bound of lits are true (pysat CardEnc), used for the per slot room limits.
+    kmtotalizer gives the fewest clauses for the room limits on Course_Reg.csv
+    """
+    if bound >= len(lits):
+        return []
+    if bound == 0:
+        return [[-lit] for lit in lits]
+    return CardEnc.atmost(lits, bound=bound, vpool=pool, encoding=CARDENC_TYPES[encoding]).clauses
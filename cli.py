@@ -0,0 +1,293 @@
+import argparse
+import json
+import sys
+import time
+
+
+"""
+Command line entry point of the final exam scheduler, one subcommand per step:
+    python cli.py ingest --registrations Course_Reg.csv --to-cols
+    python cli.py solve-sat --registrations test-subset.csv --k 5 --output schedule.json
+    python cli.py solve-smt --rooms Room_Test.csv --k 5 --method two-stage
+    python cli.py optimize --k 4 --method tabu --timeout 10
+    python cli.py validate schedule.json --rooms Room_Test.csv
+    python cli.py bench --sizes 50 100 --ks 5 10     (the rest of the arguments go to benchmark.py)
+Only argparse/json is imported up front: every subcommand imports what it needs when it runs, so a headless solve never
+loads matplotlib, networkx, plotly or z3 (python final_exam.py still runs every solver with the plots).
+"""
+
+
+def load(args, rooms=False):
+    """
+    (data, course_list, enrollment, graph, rooms) of --registrations (and --rooms if rooms), through .data_cache unless --no-cache
+    """
+    from cache import load_cached, CACHE_DIR
+    start = time.time()
+    loaded = load_cached(args.registrations, args.rooms if rooms else None, None if args.no_cache else CACHE_DIR)
+    print(f"Loaded {args.registrations} in {time.time() - start:.2f}s")
+    return loaded
+
+
+def write_schedule(schedule, filename):
+    #Tuples and numpy ints don't survive json.dump
+    with open(filename, "w") as f:
+        json.dump({str(course): [int(value[0]), str(value[1])] if isinstance(value, (list, tuple)) else int(value)
+                   for course, value in schedule.items()}, f, indent=2)
+
+
+def read_schedule(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def finish(args, status, schedule, graph, room_capacity=None, enrollments=None):
+    """
+    Prints the status and the violations of schedule, writes it to --output. Returns the exit code
+    """
+    from Assignment_Check import validate_schedule, print_violations
+    print("Status: ", status)
+    if schedule is None:
+        return 1
+    report = validate_schedule(graph, schedule, room_capacity, enrollments)
+    print_violations(report)
+    print("Valid: ", report['valid'], " Slots used: ", len({value[0] if isinstance(value, (list, tuple)) else value
+                                                               for value in schedule.values()}))
+    if args.output:
+        write_schedule(schedule, args.output)
+        print("Schedule written to", args.output)
+    return 0
+
+
+def ingest(args):
+    """
+    Parses the registrations (fills the cache), optionally converts them to the columnar format or streams them in chunks
+    """
+    if args.to_cols:
+        from columnar import to_columnar
+        print("Columnar copy written to", to_columnar(args.registrations))
+    if args.stream:
+        from streaming import stream_registrations
+        start = time.time()
+        try:
+            course_list, _, graph, enrollment = stream_registrations(args.registrations, args.chunksize, args.grouped)
+        except ValueError as error:
+            #--grouped on a file that isn't sorted by Anonymized ID (or a row with a missing value)
+            print("Error: ", error)
+            return 1
+        print(f"Streamed {args.registrations} in {time.time() - start:.2f}s")
+        students = len(enrollment.students) if enrollment is not None else None
+    else:
+        _, course_list, enrollment, graph, _ = load(args)
+        students = len(enrollment.students)
+    print("# of Students: ", students, " # of Courses: ", len(course_list),
+          " Conflicting pairs: ", graph.number_of_edges())
+    return 0
+
+
+def solve_sat(args):
+    """
+    Conflict free k slot schedule (slots only)
+    """
+    _, _, _, graph, _ = load(args)
+    start = time.time()
+    if args.reduce or args.symmetry_breaking or args.warm_start:
+        from final_exam import coloring_status
+        from kernel import solve_reduced
+        deadline = None if args.timeout is None else start + args.timeout
+        statuses = []
+
+        def solve(component, k):
+            #--timeout is for the whole solve, every kernel component gets what is left of it
+            remaining = None if deadline is None else max(deadline - time.time(), 0.001)
+            status, schedule = coloring_status(component, k, encoding=args.encoding, symmetry_breaking=args.symmetry_breaking,
+                                               warm_start=args.warm_start, timeout=remaining)
+            statuses.append(status)
+            return schedule
+        schedule = solve_reduced(graph, args.k, solve) if args.reduce else solve(graph, args.k)
+        if schedule is not None:
+            status = 'SAT'
+        else:
+            status = 'TIMEOUT' if 'TIMEOUT' in statuses else 'UNSAT'
+    else:
+        from parallel import color_task
+        status, schedule = color_task(graph, args.k, args.encoding, timeout=args.timeout)
+    print(f"Solved in {time.time() - start:.2f}s")
+    if args.show and schedule is not None:
+        from Assignment_Check import check_Sat
+        check_Sat(graph, schedule)
+    return finish(args, status, schedule, graph)
+
+
+def solve_smt(args):
+    """
+    Conflict free k slot schedule with rooms: SMT (z3, one model) or two stage (SAT slots, then per slot room matching)
+    """
+    data, course_list, _, graph, rooms = load(args, rooms=True)
+    enrollments = data['Course Title'].value_counts().to_dict()
+    start = time.time()
+    if args.method == 'smt':
+        #final_exam.SMT_solve without the room file read, plus the status and the time limit
+        from smt_solve import solve_SMT_LIA
+        from heuristic import dsatur
+        status, schedule = 'UNSAT', None
+        if rooms.check_sizes(course_list, enrollments):
+            hint = dsatur(graph, enrollments) if args.warm_start else None
+            status, schedule = solve_SMT_LIA(course_list, graph.edges(), args.k, rooms.room_list, rooms.room_capacity, enrollments,
+                                             hint, rooms.domains(course_list, enrollments), timeout=args.timeout)
+    else:
+        from room_assign import two_stage_solve
+        status, schedule, _ = two_stage_solve(graph, args.k, rooms.room_list, rooms.room_capacity, enrollments, timeout=args.timeout)
+    print(f"Solved in {time.time() - start:.2f}s")
+    if args.show and schedule is not None:
+        from Assignment_Check import check_SMT
+        check_SMT(graph, schedule, rooms.room_list, rooms.room_capacity, enrollments)
+    return finish(args, status, schedule, graph, rooms.room_capacity, enrollments)
+
+
+def optimize(args):
+    """
+    Fewest shared students in the same slot when k is too small for a conflict free schedule
+    """
+    data, course_list, enrollment, graph, rooms = load(args, rooms=args.method == 'smt')
+    enrollments = data['Course Title'].value_counts().to_dict()
+    start = time.time()
+    if args.method == 'smt':
+        #z3 Optimize with rooms, prints its model
+        from final_exam import SMT_conflict_solve
+        SMT_conflict_solve(graph, data, args.rooms, course_list, args.k, timeout=args.timeout)
+        print(f"Solved in {time.time() - start:.2f}s")
+        return 0
+    if args.method == 'maxsat':
+        from maxsat import min_conflict_solve
+        result = min_conflict_solve(graph, args.k, timeout=args.timeout if args.timeout is not None else 60, enrollments=enrollments)
+        print("Conflicts: ", result['cost'], " Lower bound: ", result['lower_bound'], " Gap: ", f"{result['gap']:.1%}")
+        status = result['status']
+    else:
+        from localsearch import local_search_solve
+        result = local_search_solve(graph, args.k, timeout=args.timeout if args.timeout is not None else 10,
+                                    enrollments=enrollments)
+        if result is None:
+            #No restart finished in time
+            print("Status: ", 'TIMEOUT')
+            return 1
+        print("Conflicts: ", result['cost'])
+        status = 'OPTIMAL' if result['cost'] == 0 else 'TIMEOUT'
+    print("Status: ", status)
+    print(f"Solved in {time.time() - start:.2f}s")
+    from scoring import ScheduleScorer
+    print("Burden: ", ScheduleScorer(enrollment, args.k, list(graph)).score(result['schedule']))
+    if args.output:
+        write_schedule(result['schedule'], args.output)
+        print("Schedule written to", args.output)
+    return 0
+
+
+def validate(args):
+    """
+    Checks a schedule JSON (course -> slot, or course -> [slot, room]) against the registrations and scores its student burden
+    """
+    from Assignment_Check import validate_schedule, print_violations
+    from scoring import ScheduleScorer
+    schedule = read_schedule(args.schedule)
+    has_rooms = any(isinstance(value, list) for value in schedule.values())
+    data, _, enrollment, graph, rooms = load(args, rooms=has_rooms)
+    if has_rooms:
+        enrollments = data['Course Title'].value_counts().to_dict()
+        report = validate_schedule(graph, schedule, rooms.room_capacity, enrollments)
+    else:
+        report = validate_schedule(graph, schedule)
+    print_violations(report, limit=None if args.all else 20)
+    print("Valid: ", report['valid'])
+    k = args.k or max((value[0] if isinstance(value, list) else value for value in schedule.values()), default=1)
+    print("Burden: ", ScheduleScorer(enrollment, k, list(graph)).score(schedule))
+    if args.show:
+        from Assignment_Check import check_Sat, check_SMT
+        if has_rooms:
+            check_SMT(graph, schedule, rooms.room_list, rooms.room_capacity, enrollments)
+        else:
+            check_Sat(graph, schedule)
+    return 0 if report['valid'] else 1
+
+
+def bench(args, bench_args):
+    import benchmark
+    return benchmark.main(bench_args)
+
+
+def solving_options(k):
+    #A new parent per subcommand: parents share their actions, so one set_defaults(k=...) would change every subcommand
+    solving = argparse.ArgumentParser(add_help=False)
+    solving.add_argument("--k", type=int, default=k, help="# of exam slots")
+    solving.add_argument("--timeout", type=float, default=None, help="solver time limit in seconds")
+    solving.add_argument("--output", help="write the schedule to this JSON file")
+    solving.add_argument("--show", action="store_true", help="draw the schedule (matplotlib)")
+    return solving
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Final exam scheduler")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--registrations", default="test-subset.csv", help="registration csv or .cols directory")
+    common.add_argument("--rooms", default="Room_Test.csv")
+    common.add_argument("--no-cache", action="store_true", help="always parse the registration file")
+    common.add_argument("--report", help="write the instrumentation report (per phase times, sizes, solver statistics) to this JSON file")
+
+    sub = subparsers.add_parser("ingest", parents=[common], help="parse and cache the registrations")
+    sub.add_argument("--to-cols", action="store_true", help="also write the columnar (.cols) copy of a csv")
+    sub.add_argument("--stream", action="store_true", help="read the file in chunks (see streaming.py)")
+    sub.add_argument("--chunksize", type=int, default=100_000)
+    sub.add_argument("--grouped", action="store_true", help="with --stream: the file is sorted by Anonymized ID (bounded memory), "
+                                                          "Course_Reg.csv is not, stream it without --grouped")
+    sub.set_defaults(func=ingest)
+
+    sub = subparsers.add_parser("solve-sat", parents=[common, solving_options(5)], help="conflict free schedule, slots only")
+    sub.add_argument("--encoding", default="pairwise", help="at-most-one encoding (see cardinality.ENCODINGS)")
+    sub.add_argument("--symmetry-breaking", action="store_true")
+    sub.add_argument("--warm-start", action="store_true")
+    sub.add_argument("--reduce", action="store_true", help="peel low degree courses and solve the components separately")
+    sub.set_defaults(func=solve_sat)
+
+    sub = subparsers.add_parser("solve-smt", parents=[common, solving_options(5)], help="conflict free schedule with rooms")
+    sub.add_argument("--method", choices=["smt", "two-stage"], default="smt")
+    sub.add_argument("--warm-start", action="store_true", help="smt: start from the DSATUR schedule")
+    sub.set_defaults(func=solve_smt)
+
+    sub = subparsers.add_parser("optimize", parents=[common, solving_options(4)], help="minimum conflict schedule")
+    sub.add_argument("--method", choices=["maxsat", "tabu", "smt"], default="maxsat")
+    sub.set_defaults(func=optimize)
+
+    sub = subparsers.add_parser("validate", parents=[common], help="check and score a schedule JSON")
+    sub.add_argument("schedule")
+    sub.add_argument("--k", type=int, default=None, help="# of slots for the burden (defaults to the largest slot used)")
+    sub.add_argument("--all", action="store_true", help="print every violation")
+    sub.add_argument("--show", action="store_true")
+    sub.set_defaults(func=validate)
+
+    #Everything after bench is left unparsed for benchmark.main
+    sub = subparsers.add_parser("bench", help="benchmark grid, the arguments go to benchmark.py", add_help=False)
+    sub.set_defaults(func=bench)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, rest = parser.parse_known_args(argv)
+    if args.func is bench:
+        return bench(args, rest)
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    report_file = args.report
+    if report_file:
+        import instrument
+        instrument.enable()
+    code = args.func(args)
+    if report_file:
+        instrument.write_report(report_file)
+        instrument.disable()
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
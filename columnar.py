@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+"""
+Columnar binary format for the registration files.
+Course_Reg.csv repeats the same long strings (course titles, sections, "Registered") on every row. Here every column is
+dictionary encoded once: a .npy of integer codes (one per row) plus a .npy of the distinct values, in a directory:
+    Course_Reg.cols/
+        meta.json           column names, # of rows, file stem of every column
+        col0_codes.npy      int32 codes (-1 for missing values), opened with mmap
+        col0_values.npy     the distinct values, index = code
+The codes are memory mapped, so opening the file reads almost nothing, and the columns become pandas Categoricals
+(codes + dictionary) instead of one Python string per row.
+Convert once with to_columnar("Course_Reg.csv") or python columnar.py Course_Reg.csv, then pass the .cols directory
+anywhere a registration csv goes (data_conv, data_conv_encoded, load_cached, benchmark.py --input).
+"""
+
+COLUMNAR_SUFFIX = ".cols"
+
+
+def is_columnar(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, "meta.json"))
+
+
+def to_columnar(csv_file, out_dir=None):
+    """
+    Converts a registration csv, returns the directory it was written to (defaults to the csv name with .cols)
+    """
+    if out_dir is None:
+        out_dir = os.path.splitext(csv_file)[0] + COLUMNAR_SUFFIX
+    os.makedirs(out_dir, exist_ok=True)
+    data = pd.read_csv(csv_file)
+    columns = {}
+    for i, column in enumerate(data.columns):
+        codes, values = pd.factorize(data[column])
+        values = np.asarray(values)
+        if values.dtype == object:
+            #Fixed width unicode, so the dictionary loads without pickle
+            values = values.astype(str)
+        stem = f"col{i}"
+        np.save(os.path.join(out_dir, f"{stem}_codes.npy"), codes.astype(np.int32))
+        np.save(os.path.join(out_dir, f"{stem}_values.npy"), values)
+        columns[column] = stem
+    with open(os.path.join(out_dir, "meta.json"), "w") as f:
+        json.dump({'rows': len(data), 'columns': columns, 'source': os.path.basename(csv_file)}, f, indent=2)
+    return out_dir
+
+
+class ColumnarRegistrations:
+    """
+    An opened .cols directory. Codes are memory mapped, the value dictionaries are small and loaded on first use
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.rows = meta['rows']
+        self.columns = list(meta['columns'])
+        self._stems = meta['columns']
+        self._values = {}
+
+    def __len__(self):
+        return self.rows
+
+    def codes(self, column):
+        return np.load(os.path.join(self.path, f"{self._stems[column]}_codes.npy"), mmap_mode='r')
+
+    def values(self, column):
+        if column not in self._values:
+            values = np.load(os.path.join(self.path, f"{self._stems[column]}_values.npy"))
+            self._values[column] = values.astype(object) if values.dtype.kind == 'U' else values
+        return self._values[column]
+
+    def categorical(self, column):
+        return pd.Categorical.from_codes(self.codes(column), categories=self.values(column))
+
+    def to_frame(self, columns=None):
+        """
+        Data frame with one Categorical per column (all columns by default)
+        """
+        return pd.DataFrame({column: self.categorical(column) for column in columns or self.columns})
+
+
+def read_registrations(path, columns=None):
+    """
+    Registration data frame from either a csv file or a .cols directory
+    """
+    if is_columnar(path):
+        return ColumnarRegistrations(path).to_frame(columns)
+    return pd.read_csv(path, usecols=columns)
+
+
+if __name__ == "__main__":
+    for csv_file in sys.argv[1:]:
+        print(f"Created: {to_columnar(csv_file)}")
@@ -0,0 +1,169 @@
+import numpy as np
+from scipy import sparse
+
+
+class ConflictGraph:
+    """
+    Weighted course conflict graph.
+    Stored as a symmetric (courses x courses) CSR co-enrollment matrix with a zero diagonal,
+    weights[i, j] = number of students enrolled in both course i and course j.
+    Exposes the small part of the networkx graph interface that the solvers and checkers use
+    (iteration over the nodes, nodes(), neighbors(), degree(), edges()) so there is one entry per conflicting pair
+    instead of one parallel edge per shared student.
+    """
+
+    def __init__(self, courses, weights):
+        self.courses = list(courses)
+        self.index = {course: i for i, course in enumerate(self.courses)}
+        weights = sparse.csr_matrix(weights)
+        weights.eliminate_zeros()
+        weights.sort_indices()
+        self.weights = weights
+
+    @classmethod
+    def from_incidence(cls, enrollment, course_list):
+        """
+        Builds the graph from an Enrollment as incidence^T * incidence.
+        Nodes are the courses in course_list, plus any other course that conflicts with something (same node set as the old MultiGraph)
+        """
+        incidence = enrollment.incidence
+        return cls.from_co_enrollment(enrollment.courses, incidence.T @ incidence, course_list)
+
+    @classmethod
+    def from_co_enrollment(cls, courses, co_enrollment, course_list):
+        """
+        Builds the graph from a (courses x courses) co-enrollment count matrix (the diagonal, course sizes, is ignored).
+        courses: title of every row/column, nodes are picked the same way as from_incidence
+        """
+        co_enrollment = sparse.csr_matrix(co_enrollment, copy=True)
+        #Drop the diagonal (course enrollment sizes), only keep the conflicts
+        co_enrollment.setdiag(0)
+        co_enrollment.eliminate_zeros()
+
+        course_index = {course: j for j, course in enumerate(courses)}
+        nodes = [course_index[course] for course in course_list]
+        listed = set(nodes)
+        has_edge = np.flatnonzero(np.diff(co_enrollment.indptr))
+        nodes += [j for j in has_edge.tolist() if j not in listed]
+        weights = co_enrollment[nodes][:, nodes]
+        return cls([courses[j] for j in nodes], weights)
+
+    @classmethod
+    def from_student_edges(cls, course_list, student_edges):
+        """
+        Builds the graph from the student -> [(course, course), ...] dictionary made by data_conv.
+        Every pair adds 1 to the weight of that edge.
+        """
+        courses = list(course_list)
+        index = {course: i for i, course in enumerate(courses)}
+        rows = []
+        cols = []
+        for edges in student_edges.values():
+            for u, v in edges:
+                for course in (u, v):
+                    if course not in index:
+                        index[course] = len(courses)
+                        courses.append(course)
+                rows.append(index[u])
+                cols.append(index[v])
+        n = len(courses)
+        ones = np.ones(len(rows), dtype=np.int32)
+        #Duplicate (row, col) entries are summed, which gives the shared student counts
+        upper = sparse.coo_matrix((ones, (rows, cols)), shape=(n, n)).tocsr()
+        return cls(courses, upper + upper.T)
+
+    def __len__(self):
+        return len(self.courses)
+
+    def __iter__(self):
+        return iter(self.courses)
+
+    def __contains__(self, course):
+        return course in self.index
+
+    def nodes(self):
+        return list(self.courses)
+
+    def number_of_nodes(self):
+        return len(self.courses)
+
+    def number_of_edges(self):
+        return self.weights.nnz // 2
+
+    def _row(self, course):
+        i = self.index[course]
+        start, end = self.weights.indptr[i], self.weights.indptr[i+1]
+        return self.weights.indices[start:end], self.weights.data[start:end]
+
+    def neighbors(self, course):
+        """
+        Returns the list of courses sharing at least one student with course
+        """
+        cols, _ = self._row(course)
+        return [self.courses[j] for j in cols]
+
+    def weighted_neighbors(self, course):
+        """
+        Returns the list of (conflicting course, # of shared students)
+        """
+        cols, data = self._row(course)
+        return [(self.courses[j], w) for j, w in zip(cols.tolist(), data.tolist())]
+
+    def degree(self, course):
+        """
+        Number of distinct conflicting courses
+        """
+        i = self.index[course]
+        return int(self.weights.indptr[i+1] - self.weights.indptr[i])
+
+    def weight(self, u, v):
+        """
+        Number of students enrolled in both u and v (0 if they don't conflict)
+        """
+        cols, data = self._row(u)
+        j = self.index[v]
+        pos = np.searchsorted(cols, j)
+        if pos < len(cols) and cols[pos] == j:
+            return int(data[pos])
+        return 0
+
+    def edges(self):
+        """
+        Returns each conflicting pair once as (course, course)
+        """
+        upper = sparse.triu(self.weights, k=1).tocoo()
+        return [(self.courses[i], self.courses[j]) for i, j in zip(upper.row.tolist(), upper.col.tolist())]
+
+    def weighted_edges(self):
+        """
+        Returns each conflicting pair once as (course, course, # of shared students)
+        """
+        upper = sparse.triu(self.weights, k=1).tocoo()
+        return [(self.courses[i], self.courses[j], w) for i, j, w in zip(upper.row.tolist(), upper.col.tolist(), upper.data.tolist())]
+
+    def subgraph(self, nodes):
+        """
+        ConflictGraph on only the given courses (in that order) and the conflicts between them
+        """
+        idx = [self.index[node] for node in nodes]
+        return ConflictGraph([self.courses[i] for i in idx], self.weights[idx][:, idx])
+
+    def to_networkx(self):
+        """
+        Simple weighted networkx Graph, used for drawing
+        """
+        #networkx is only needed for drawing, don't pay for the import otherwise
+        import networkx as nx
+        G = nx.Graph()
+        G.add_nodes_from(self.courses)
+        G.add_weighted_edges_from(self.weighted_edges())
+        return G
+
+
+def as_networkx(graph):
+    """
+    Returns a networkx graph for either a ConflictGraph or a graph that is already a networkx graph
+    """
+    if isinstance(graph, ConflictGraph):
+        return graph.to_networkx()
+    return graph
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from itertools import combinations
+from scipy import sparse
+
+
+#Courses that never get a final exam (Study away placeholders)
+EXCLUDE_COURSES = ['Domestic Study Away', 'International Study Away', 'Doshisha University', 'New College Oxford',
+                   'Gottingen University', 'UIC Yonsei University', 'Universidad de los Andes']
+
+
+class Enrollment:
+    """
+    Dictionary encoded registration data.
+    - students: array of the unique Anonymized IDs, index i is the integer code of that student
+    - courses: array of the unique Course Titles, index j is the integer code of that course
+    - incidence: sparse (students x courses) 0/1 CSR matrix, incidence[i, j] = 1 if student i is enrolled in course j
+    """
+
+    def __init__(self, students, courses, incidence):
+        self.students = students
+        self.courses = courses
+        self.incidence = incidence
+        #Course title -> integer code
+        self.course_index = {course: j for j, course in enumerate(courses)}
+
+    def __len__(self):
+        return len(self.students)
+
+    def student_courses(self, i):
+        """
+        Returns the course titles student code i is enrolled in
+        """
+        row = self.incidence.indices[self.incidence.indptr[i]:self.incidence.indptr[i+1]]
+        return [self.courses[j] for j in row]
+
+    def course_sizes(self):
+        """
+        Returns the number of unique students enrolled in each course as a dict course title -> count
+        """
+        counts = np.asarray(self.incidence.sum(axis=0)).ravel()
+        return {course: int(count) for course, count in zip(self.courses, counts)}
+
+
+def encode_enrollment(data):
+    """
+    Dictionary encodes the students and course titles of a registration DataFrame to integer codes in a single pass,
+    then builds the (students x courses) incidence matrix from the codes.
+    Duplicate rows (A student in two sections of the same course title) collapse to a single 1.
+    """
+    student_codes, students = pd.factorize(data['Anonymized ID'])
+    course_codes, courses = pd.factorize(data['Course Title'])
+    ones = np.ones(len(student_codes), dtype=np.int32)
+    incidence = sparse.csr_matrix((ones, (student_codes, course_codes)), shape=(len(students), len(courses)))
+    #csr_matrix sums duplicates, reset everything back to 1
+    incidence.data[:] = 1
+    incidence.sort_indices()
+    return Enrollment(np.asarray(students), np.asarray(courses, dtype=object), incidence)
+
+
+def enrollment_dicts(enrollment):
+    """
+    Builds the student_dict (student -> list of course titles) and student_edges (student -> list of course pairs)
+    used by the rest of the scheduler straight from the incidence matrix.
+    """
+    student_dict = {}
+    student_edges = {}
+    indptr = enrollment.incidence.indptr
+    indices = enrollment.incidence.indices
+    courses = enrollment.courses
+    for i, student in enumerate(enrollment.students.tolist()):
+        student_courses = courses[indices[indptr[i]:indptr[i+1]]].tolist()
+        student_dict[student] = student_courses
+        student_edges[student] = list(combinations(student_courses, 2))
+    return student_dict, student_edges
+
+
+def course_list_from(enrollment):
+    """
+    Every course title in the data except the study away placeholders
+    """
+    return [course for course in enrollment.courses.tolist() if course not in EXCLUDE_COURSES]
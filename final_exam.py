@@ -1,104 +1,108 @@
+import time
+from functools import partial
 import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
+from enrollment import encode_enrollment, enrollment_dicts, course_list_from
+from conflict_graph import ConflictGraph
+from rooms import load_rooms
+from columnar import read_registrations
+import instrument
+from instrument import timed, phase, record, enabled
+from cardinality import ENCODINGS, at_most_one, at_most
+from pysat.formula import IDPool
+from symmetry import chromatic_bounds, clique_fixing
+from kernel import solve_reduced
+from heuristic import dsatur, schedule_phases, align_slots
 
 
 def data_conv(File_Name): 
-    df = pd.DataFrame() # Create a DataFrame directly
-    data = pd.read_csv(File_Name) # Read a CSV file directly
-    #print(data.columns) #Print Column Names
-    student_list = list(set(data['Anonymized ID'])) #Compile the list of Unique Students
-    #print(student_list[:10], len(student_list)) #Print the first 10 and the # of total Students
-    exclude_courses = ['Domestic Study Away', 'International Study Away', 'Doshisha University', 'New College Oxford', 
-                       'Gottingen University', 'UIC Yonsei University', 'Universidad de los Andes']
-    # Filter out the Study away courses and any course that contains 'Lab'
-    course_list = [course for course in list(set(data['Course Title'])) if course not in exclude_courses ] #or 'lab' not in course.lower()
-    #print(course_list)
-
-    """
-    Organize the data frame into a dictionary, Where a key is the students anonymized ID, and the dict returns a list of the Course titles the student is enrolled in
-    """
-    #INIT: Dictionary to Store Students and Course Titles 
-    student_dict = {}
-    #Iterate through the unique students 
-    for student in student_list:
-        # Filter rows for that student
-        student_data = data[data['Anonymized ID'] == student]
-        #print(student_data) #Test print
-        # Create a dictionary or list of courses, terms, etc.
-        courses = list(set(student_data['Course Title'].to_list()))  #Convert to a list
-        #Filter out labs:
-        #courses = [course for course in courses if 'lab' not in course.lower()]
-        
-        # Store it in the dictionary
-        student_dict[student] = courses
+    """
+    Reads the registration file and returns the data frame, the list of courses, and the dictionaries of student:class and student:edges
+    """
+    data, course_list, student_dict, student_edges, enrollment = data_conv_encoded(File_Name)
+    return data, course_list, student_dict, student_edges
+
 
+def data_conv_encoded(File_Name):
     """
-    Create an edge "list", create a new dictionary where key returns the list of possible edges.
+    Same as data_conv, but also returns the Enrollment (integer encoded students, courses and the student x course incidence matrix).
+    Students and course titles are dictionary encoded in one pass instead of filtering the data frame once per student.
     """
-    #Dictionary to store the edges of each student (Reminder: Edges are students enrolled in both nodes(classes))
-    student_edges = {}
-    #Iterate through the dictionary of students
-    for key in student_dict:
-        #Get this students courses 
-        student_courses = student_dict[key]
-        
-        #Create all of the possible edges: 
-        edge_list = []
-        #Iterate through the courses creating all the possible edge pairs
-        for i in range(len(student_courses)-1):
-            for j in range(i+1,len(student_courses)):
-                edge_list.append((student_courses[i],student_courses[j]))
-        student_edges[key] = edge_list
-    #Test: Print the total number of edges created: 
+    with phase('read_csv'):
+        data = read_registrations(File_Name) # Read a CSV file (or columnar .cols directory) directly
+    return data_conv_frame(data)
+
+
+@timed('convert')
+def data_conv_frame(data):
     """
-    totaledge = 0
-    for key in student_edges:
-        totaledge += len(student_edges[key])
-    print("Total Number of Edges Created: ", totaledge)
+    data_conv_encoded for a registration data frame that is already in memory (i.e. a subset of the students)
     """
+    #Columnar (Categorical) subsets still carry every course of the full file, drop the ones nobody here takes
+    data = data.apply(lambda column: column.cat.remove_unused_categories() if isinstance(column.dtype, pd.CategoricalDtype) else column)
+    enrollment = encode_enrollment(data)
+    #print(len(enrollment.students), len(enrollment.courses)) #Print the # of total Students and Courses
 
-    return data, course_list, student_dict, student_edges
+    # Filter out the Study away courses 
+    course_list = course_list_from(enrollment)
+
+    """
+    student_dict: key is the students anonymized ID, returns a list of the Course titles the student is enrolled in
+    student_edges: key is the students anonymized ID, returns the list of possible edges (Reminder: Edges are students enrolled in both nodes(classes))
+    """
+    student_dict, student_edges = enrollment_dicts(enrollment)
+    record(students=len(enrollment), courses=len(course_list))
+
+    return data, course_list, student_dict, student_edges, enrollment
 
 """
 Given the list of all the courses, and all the edges for each student, creates a 2D graph.
 """
-def graph_conv(course_list, student_edges, show):
-    #print(student_edges.keys())
-    keys = list(student_edges.keys())
-    G = nx.MultiGraph()
-    G.add_nodes_from(course_list)
-    #keys = keys[:2] #Test the first two
-    #print(keys)
-    for key in keys:
-        #print("Student: ", key, "Edges: ",student_edges[key]) #Test Print
-        curr_edges = student_edges[key]
-        G.add_edges_from([(u, v, {'label': key}) for u, v in curr_edges])
-    plt.figure(figsize=(10, 8))
-    pos = nx.spring_layout(G, k=0.3, iterations=50)
+def graph_conv(course_list, student_edges, show, enrollment=None):
+    """
+    Returns a weighted ConflictGraph (one edge per conflicting pair, weighted by the # of shared students).
+    If the Enrollment from data_conv_encoded is given, the graph is built from the incidence matrix, otherwise from student_edges.
+    """
+    G = build_conflict_graph(course_list, student_edges, enrollment)
     if show:
-        # Draw and display the graph
-        nx.draw(G, pos, with_labels=True)
-        plt.title(f"Graph Visualization\nNodes: {G.number_of_nodes()}  Edges: {G.number_of_edges()}")
-        plt.show()
+        draw_graph(G)
     return G
 
-import plotly.graph_objects as go
+
+def draw_graph(G):
+    #Plotting libraries are only imported when something is drawn (headless runs start a lot faster)
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    from layout import get_layout
+    # Draw and display the graph
+    plt.figure(figsize=(10, 8))
+    pos = get_layout(G)
+    nx.draw(G.to_networkx(), pos, with_labels=True)
+    plt.title(f"Graph Visualization\nNodes: {G.number_of_nodes()}  Edges: {G.number_of_edges()}")
+    plt.show()
+
+
+@timed('graph')
+def build_conflict_graph(course_list, student_edges, enrollment=None):
+    if enrollment is not None:
+        graph = ConflictGraph.from_incidence(enrollment, course_list)
+    else:
+        graph = ConflictGraph.from_student_edges(course_list, student_edges)
+    record(nodes=graph.number_of_nodes(), edges=graph.number_of_edges())
+    return graph
 
 """
 Given the list of all the courses, and all the edges for each student, creates a 3D graph.
 """
 
-def graph_conv_3d(course_list, student_edges):
-    keys = list(student_edges.keys())
-    G = nx.MultiGraph()
-    G.add_nodes_from(course_list)
-    for key in keys:
-        curr_edges = student_edges[key]
-        G.add_edges_from([(u, v, {'label': key}) for u, v in curr_edges])
+def graph_conv_3d(course_list, student_edges, enrollment=None, show=True):
+    G = build_conflict_graph(course_list, student_edges, enrollment)
+    if not show:
+        return G
+    import plotly.graph_objects as go
+    from layout import get_layout
     
-    # Compute a 3D spring layout
-    pos = nx.spring_layout(G, dim=3, seed=42)
+    # 3D spring layout (shared layout cache)
+    pos = get_layout(G, dim=3)
     
     # Extract node coordinates
     node_x = [pos[node][0] for node in G.nodes()]
@@ -147,7 +151,8 @@ def graph_conv_3d(course_list, student_edges):
     return G
 
 
-def create_clauses(course_list, student_dict, student_edges, graph, k):
+@timed('encode')
+def create_clauses(course_list, student_dict, student_edges, graph, k, encoding='pairwise'):
     """
     For this, all we need to do is find the adjacencies for each of the nodes which can easily be done. From there you need to encode that no adjacent can be
     the same color, to encode this: 
@@ -162,9 +167,21 @@ def create_clauses(course_list, student_dict, student_edges, graph, k):
     - Each node must be at least one color (A color is a proposed exam slot)
     - Each Noode Can only be at most one color
     - Each node cannot be the same color as its neighbors.
+
+    encoding: at-most-one encoding, see cardinality.ENCODINGS ('pairwise', 'commander', 'seqcounter', 'ladder', ...)
     """
 
-    clauses = []
+    translate_dict, reverse_translate = translate_nodes(graph)
+    clauses = list(generate_clauses(graph, k, translate_dict, encoding))
+    if enabled():
+        record(clauses=len(clauses), variables=max((abs(lit) for clause in clauses for lit in clause), default=0))
+    return clauses, reverse_translate
+
+
+def translate_nodes(graph):
+    """
+    Gives each node in the graph a number 0 - n-1, returns node -> number and number -> node
+    """
     translate_dict = {}
     reverse_translate = {}
     counter = 0
@@ -175,8 +192,26 @@ def create_clauses(course_list, student_dict, student_edges, graph, k):
         #Set the counter as the key, correspond to a node
         translate_dict[node] = counter
         counter += 1
+    return translate_dict, reverse_translate
 
 
+def generate_clauses(graph, k, translate_dict, encoding='pairwise', pool=None, fixed=None, slot_limits=None):
+    """
+    Generator version of create_clauses, yields one clause at a time so they can be streamed straight into the solver.
+    encoding: at-most-one encoding for each node's colors (see cardinality.ENCODINGS)
+    pool: pysat IDPool the auxiliary variables come from. Defaults to a new one starting after the len(graph)*k color variables,
+          pool.top is the largest variable used once the generator is exhausted.
+    fixed: optional dict node -> color, added as unit clauses (symmetry breaking, see symmetry.clique_fixing)
+    slot_limits: optional list of (nodes, bound), in every color at most bound of those nodes (room counts, see room_assign.room_slot_limits)
+    """
+    if pool is None:
+        pool = IDPool(start_from=len(translate_dict) * k + 1)
+
+    #Pinned nodes
+    if fixed:
+        for node, color in fixed.items():
+            yield [translate_dict[node] * k + color]
+
     """
     Each Node must be at least one color:
     to translate a node, grab its value from the dict, multiply by k to get its "translation" then add [0,k) to get a unique color 
@@ -184,11 +219,8 @@ def create_clauses(course_list, student_dict, student_edges, graph, k):
     """
     for node in graph: 
         translation = translate_dict[node] * k 
-        least_once = []
         #range [1...k] 
-        for i in range(1,k+1):
-            least_once.append(translation + i)
-        clauses.append(least_once)
+        yield [translation + i for i in range(1,k+1)]
     
 
     #***********************************************************
@@ -196,14 +228,11 @@ def create_clauses(course_list, student_dict, student_edges, graph, k):
     """
     Each Node can only be AT MOST one color: 
     i.e if there were 3 nodes and 3 colors: 0,1,2 to express all 3 colors possible for node 1/0 however you look at it 
-    expressed by: (-1 V -2), (-1 V -3), (-2 V -3)
+    pairwise: (-1 V -2), (-1 V -3), (-2 V -3), the other encodings use auxiliary variables to get fewer clauses
     """
     for node in graph:
         translation = translate_dict[node] * k
-        for i in range(1,k):
-            for j in range(i+1, k+1):
-                most_once = [-(translation + i),-(translation + j)]
-                clauses.append(most_once)
+        yield from at_most_one([translation + i for i in range(1,k+1)], encoding, pool)
     #***********************************************************************************
 
 
@@ -211,132 +240,252 @@ def create_clauses(course_list, student_dict, student_edges, graph, k):
     """
     Each Node Cannot be the Same color as its neighbor: i.e if 1 and 2 are neighbors (3colors):
     (-0 V -3), (-1 V -4), (-2 V -5)
+    Each conflicting pair is only encoded once.
     """
 
-    for node in graph: 
+    for node, adjnode in graph.edges(): 
         node_trans = translate_dict[node]
-        neighbors = graph.neighbors(node)
-        for adjnode in neighbors:
-            neighbor_trans = translate_dict[adjnode]
-            for i in range(1,k+1):
-                diff_neighbors = [-((node_trans*k) + i), -((neighbor_trans*k) + i)]
-                clauses.append(diff_neighbors) 
+        neighbor_trans = translate_dict[adjnode]
+        for i in range(1,k+1):
+            yield [-((node_trans*k) + i), -((neighbor_trans*k) + i)]
      
      #**********************************************************************************
 
-    return clauses, reverse_translate
+    """
+    Each color can only hold so many of the given nodes (i.e. no more big courses in a slot than there are big rooms)
+    """
+    for nodes, bound in slot_limits or []:
+        for i in range(1,k+1):
+            lits = [translate_dict[node]*k + i for node in nodes]
+            yield from at_most(lits, bound, pool)
 
 
-def to_DIMACS(clauses, graph, filename):
+def encoding_report(graph, k, encodings=ENCODINGS, solve=False):
+    """
+    Compares the at-most-one encodings on this graph: # of variables, clauses and literals (memory), encode time and optionally solve time.
+    Returns a list of dicts, one per encoding
+    """
+    report = []
+    translate_dict, reverse_translate = translate_nodes(graph)
+    for encoding in encodings:
+        pool = IDPool(start_from=len(graph) * k + 1)
+        start = time.time()
+        clauses = list(generate_clauses(graph, k, translate_dict, encoding, pool))
+        row = {
+            'encoding': encoding,
+            'variables': max(pool.top, len(graph) * k),
+            'clauses': len(clauses),
+            'literals': sum(len(clause) for clause in clauses),
+            'encode_time': time.time() - start,
+        }
+        if solve:
+            start = time.time()
+            row['sat'] = solve_final_exam(clauses) is not None
+            row['solve_time'] = time.time() - start
+        report.append(row)
+    return report
+
+
+@timed('dimacs')
+def to_DIMACS(clauses, graph, filename, k=None):
     """
     Write the list of clauses to a DIMACS file.
+    The header counts len(graph)*k variables (One per node and color), or the largest variable used if that is bigger (or k isn't given).
+    The whole file is built in memory and written in one go.
     """
-    num_vars = len(graph)  # Number of variables (nodes)
+    num_vars = max((abs(literal) for clause in clauses for literal in clause), default=0)
+    if k is not None:
+        num_vars = max(num_vars, len(graph) * k)
     num_clauses = len(clauses)  # Number of CNF clauses
 
+    lines = [f"p cnf {num_vars} {num_clauses}"]
+    # Write each clause, ensuring correct formatting
+    lines.extend(" ".join(map(str, clause)) + " 0" for clause in clauses)
     with open(filename, "w") as f:
-        # Write the problem line
-        f.write(f"p cnf {num_vars} {num_clauses}\n")
-        
-        # Write each clause, ensuring correct formatting
-        for clause in clauses:
-            for literal in clause:
-                f.write(str(literal) + " ")
-            f.write("0\n")
+        f.write("\n".join(lines))
+        f.write("\n")
     
     print(f"DIMACS file '{filename}' created successfully.")
 
 
-
-def SAT_solve(course_list, student_dict, student_edges, graph, k):
-    clauses, reverse_translate = create_clauses(course_list, student_dict, student_edges, graph, k)
-    to_DIMACS(clauses, graph, 'final_exam.cnf')
-
-    student_times = solve_final_exam_dimacs("final_exam.cnf", k)
-    print(student_times)
-    exam_schedule = []
-    for lit in student_times:
-        if lit > 0:
-            exam_schedule.append(lit)
+def decode_model(model, k, reverse_translate):
+    """
+    Turns a SAT model back into a schedule: course -> slot (1..k)
+    """
     schedule = {}
+    num_vars = len(reverse_translate) * k
     #To Convert back to node 
-    for exam in exam_schedule:
+    for exam in model:
+        #Only the true node/color variables (auxiliary variables come after them)
+        if exam <= 0 or exam > num_vars:
+            continue
         #Subtract 1 to reset indexes
         x = exam - 1
         #Integer Division 
         x = x//k
-        #print(exam, x)
         #Use dictionary to find correct course
         course = reverse_translate[x]
         #Append to the schedule
         schedule[course] = exam - (x * k)
+    return schedule
+
+
+def SAT_solve(course_list, student_dict, student_edges, graph, k, dimacs_file=None, encoding='pairwise', symmetry_breaking=False, reduce=False, warm_start=False):
+    """
+    Encodes the graph coloring and solves it in memory: the clauses are streamed straight into the solver.
+    dimacs_file: optional, also writes the clauses out as a DIMACS file
+    encoding: at-most-one encoding (see cardinality.ENCODINGS)
+    symmetry_breaking: compute the clique lower bound and greedy upper bound first (k below the clique size is rejected without solving),
+                       and pin the clique's courses to slots 1, 2, ...
+    reduce: peel the courses with < k conflicts and solve each connected component of what is left separately (see kernel.py)
+    warm_start: use the DSATUR schedule as the solver's starting phases
+    """
+    if reduce:
+        solve_kernel = partial(solve_coloring, encoding=encoding, symmetry_breaking=symmetry_breaking, warm_start=warm_start)
+        schedule = solve_reduced(graph, k, solve_kernel)
+    else:
+        schedule = solve_coloring(graph, k, dimacs_file, encoding, symmetry_breaking, warm_start)
         
     print(schedule)
     return schedule
 
 
+def solve_coloring(graph, k, dimacs_file=None, encoding='pairwise', symmetry_breaking=False, warm_start=False, slot_limits=None,
+                   timeout=None):
+    """
+    Solves the k slot coloring of graph, returns the schedule: course -> slot, or None if there isn't one (or out of time)
+    slot_limits: optional per slot limits, see generate_clauses
+    timeout: optional solver time limit in seconds, coloring_status tells a timeout from UNSAT
+    """
+    return coloring_status(graph, k, dimacs_file, encoding, symmetry_breaking, warm_start, slot_limits, timeout)[1]
 
-def SMT_solve(graph, data, filename, course_list, k):
-    #Since we want no conflicts at all, only need a set of the conflicts.
-    conflicts = list(set(graph.edges))
-    # Compute a series mapping course title -> count
-    counts = data['Course Title'].value_counts()
-    #print(counts)
-    rooms = pd.read_csv("Exam-Rooms.csv")
-    room_capacities = {}
-    room_list = []
-    for idx, row in rooms.iterrows():
-        room_name    =  row['Building'] + ' ' + str(row['Room'])       # the room identifier
-        room_list.append(room_name)
-        room_capacity = row['EMS']  # whatever the column holding capacity is called
-        room_capacities[room_name] = room_capacity
-    # Convert to a plain dict
 
-    "Enrollments gives a mapping of course title -> number of students enrolled"
-    enrollments = counts.to_dict()
-    LIA_model = solve_SMT_LIA(course_list, conflicts, k, room_list, room_capacities , enrollments)
-    return LIA_model, room_list, room_capacities, enrollments
+def coloring_status(graph, k, dimacs_file=None, encoding='pairwise', symmetry_breaking=False, warm_start=False, slot_limits=None,
+                    timeout=None):
+    """
+    solve_coloring that also returns the status: (status, schedule) with status 'SAT', 'UNSAT' or 'TIMEOUT'
+    warm_start: True for the DSATUR schedule as the starting phases, or the course -> slot schedule to start from
+    """
+    fixed = None
+    if symmetry_breaking:
+        bounds = chromatic_bounds(graph)
+        if k < bounds['lower']:
+            print(f"UNSAT, NO SOLUTION: {bounds['lower']} courses all conflict with each other, k = {k}")
+            return 'UNSAT', None
+        fixed = clique_fixing(bounds['clique'], k)
+
+    translate_dict, reverse_translate = translate_nodes(graph)
+    clauses = generate_clauses(graph, k, translate_dict, encoding, fixed=fixed, slot_limits=slot_limits)
+    if dimacs_file is not None:
+        clauses = list(clauses)
+        to_DIMACS(clauses, graph, dimacs_file, k)
+
+    phases = None
+    if warm_start:
+        hint = warm_start if isinstance(warm_start, dict) else dsatur(graph)
+        #Slots renumbered to agree with the clique pins
+        hint = align_slots(hint, fixed) if fixed else hint
+        phases = schedule_phases(hint, translate_dict, k)
+
+    status, student_times = solve_clauses(clauses, timeout=timeout, phases=phases)
+    print_status(status)
+    if status != 'SAT':
+        return status, None
+    return status, decode_model(student_times, k, reverse_translate)
+
+
+def greedy_solve(graph, k=None, enrollments=None):
+    """
+    Fast mode: DSATUR schedule with no solver.
+    Returns the schedule (course -> slot), or None if it needs more than k slots
+    """
+    schedule = dsatur(graph, enrollments)
+    used = max(schedule.values(), default=0)
+    if k is not None and used > k:
+        print(f"Greedy schedule needs {used} slots, more than k = {k}")
+        return None
+    return schedule
 
 
 
+def SMT_solve(graph, data, filename, course_list, k, warm_start=False):
+    #Since we want no conflicts at all, only need each conflicting pair once.
+    conflicts = graph.edges()
+    "Enrollments gives a mapping of course title -> number of students enrolled"
+    enrollments = data['Course Title'].value_counts().to_dict()
+    #Rooms sorted by capacity, read once per file
+    rooms = load_rooms(filename)
+    if not rooms.check_sizes(course_list, enrollments):
+        return None, rooms.room_list, rooms.room_capacity, enrollments
+    from smt_solve import solve_SMT_LIA
+    #Starting slot values from the DSATUR schedule
+    hint = dsatur(graph, enrollments) if warm_start else None
+    _, LIA_model = solve_SMT_LIA(course_list, conflicts, k, rooms.room_list, rooms.room_capacity, enrollments, hint,
+                              rooms.domains(course_list, enrollments))
+    return LIA_model, rooms.room_list, rooms.room_capacity, enrollments
+
+
+def read_rooms(filename):
+    """
+    Returns the list of room names (smallest first) and room name -> capacity (EMS) of the room file
+    """
+    rooms = load_rooms(filename)
+    return rooms.room_list, rooms.room_capacity
+
+
+def SMT_conflict_solve(graph, data, filename, course_list, k, timeout=None):
+    #Each conflicting pair once, weighted by the # of shared students
+    conflicts = graph.weighted_edges()
+    # Compute a mapping course title -> count
+    enrollments = data['Course Title'].value_counts().to_dict()
+    rooms = load_rooms(filename)
+    if not rooms.check_sizes(course_list, enrollments):
+        return
+    from smt_solve import conflict_solve
+    _, smt_model = conflict_solve(course_list, conflicts, k, rooms.room_list, rooms.room_capacity, enrollments,
+                               domains=rooms.domains(course_list, enrollments), timeout=timeout)
+    print(smt_model)
 
+from solve_final import solve_final_exam, solve_final_exam_dimacs, solve_clauses, print_status
 
-def SMT_conflict_solve(graph, data, filename, course_list, k):
-    conflicts = graph.edges
-    # Compute a series mapping course title -> count
-    counts = data['Course Title'].value_counts()
-    #print(counts)
-    rooms = pd.read_csv(filename)
-    room_capacities = {}
-    room_list = []
-    for idx, row in rooms.iterrows():
-        room_name    =  row['Building'] + ' ' + str(row['Room'])       # the room identifier
-        room_list.append(room_name)
-        room_capacity = row['EMS']  # whatever the column holding capacity is
-        room_capacities[room_name] = room_capacity
-    # Convert to a plain dict
-    enrollments = counts.to_dict()
-    #print(enrollments)
-    #print(room_capacities)
 
-    smt_model = conflict_solve(course_list, conflicts, k, room_list, room_capacities , enrollments)
-    print(smt_model)
+def __getattr__(name):
+    """
+    final_exam used to re-export smt_solve and Assignment_Check with import *, z3 and the checkers are now only imported
+    the first time one of their names is asked for (final_exam.check_Sat, from final_exam import solve_SMT_LIA, ...)
+    """
+    if not name.startswith('__'):
+        import importlib
+        for module_name in ('smt_solve', 'Assignment_Check'):
+            module = importlib.import_module(module_name)
+            if hasattr(module, name):
+                return getattr(module, name)
+    raise AttributeError(f"module 'final_exam' has no attribute {name!r}")
 
-from solve_final import solve_final_exam_dimacs
-from smt_solve import *
-from Assignment_Check import *
-def main():
-    #Registration File: Specify the file name of the registration data
-    registration_file = "test-subset.csv"
-    #Convert the csv file to dictionairies of student:class and student:edges as well as return a course_list and the data frame "data"
-    data, course_list, student_dict, student_edges = data_conv(registration_file)
 
-    print("# of Students: ", len(student_dict))
+def main(registration_file="test-subset.csv", room_file="Room_Test.csv", k=5, conflict_k=4, report_file=None, memory=False,
+         profile=None, show=True):
+    """
+    Runs every solver on one registration file (python cli.py has the single step subcommands).
+    registration_file: registration csv or .cols directory, room_file: room csv
+    k: # of slots for the conflict free solvers, conflict_k: # of slots for the minimum conflict ones (Optimize, MaxSAT, tabu)
+    report_file: optional JSON file for the instrumentation report (per phase wall/CPU time, memory, sizes, solver statistics)
+    memory: also track peak memory per phase (slow), profile: phase to cProfile, i.e. 'sat_solve'
+    show: draw the graph and the schedules
+    """
+    from Assignment_Check import check_Sat, check_SMT
+    if report_file is not None:
+        instrument.enable(memory=memory, profile=profile)
+    #Parsed data and conflict graph, straight from .data_cache if the file hasn't changed since the last run
+    from cache import load_cached
+    data, course_list, enrollment, graph, _ = load_cached(registration_file)
+    #dictionairies of student:class and student:edges
+    student_dict, student_edges = enrollment_dicts(enrollment)
 
-    graph = graph_conv(course_list, student_edges,True)
+    print("# of Students: ", len(student_dict))
 
-    #K = Number of Slots: change for more slots
-    k = 5
+    if show:
+        draw_graph(graph)
 
     #print("Number of nodes: ",graph.number_of_nodes(), " Number of Edges: ", graph.number_of_edges()) #Test print to see the number of nodes and edges
 
@@ -344,20 +493,45 @@ def main():
     print("Sat Solve: \n")
     schedule = SAT_solve(course_list,student_dict,student_edges,graph, k)
     #Manual Check of the SAT solver
-    check_Sat(graph, schedule)
+    check_Sat(graph, schedule, show)
+
+    #Smallest # of slots that still has a schedule with no conflicts
+    from min_slots import find_min_slots
+    min_slots = find_min_slots(graph, k)
+    print("Minimum # of Slots: ", min_slots['k'], " Steps: ", min_slots['steps'])
 
 
-    #room_file: Specify the file name of the room data
-    room_file = "Room_Test.csv"
     #SMT Solver:
     print("SMT Solve \n")
     SMT_schedule, room_list, room_capacity, enrollments = SMT_solve(graph, data, room_file, course_list,k)
     #Check the SMT solver
-    check_SMT(graph,SMT_schedule,room_list,room_capacity, enrollments)
+    check_SMT(graph,SMT_schedule,room_list,room_capacity, enrollments, show)
 
     #SMT With Conflicts:
     print("Optimize Solve: \n")
-    SMT_conflict_solve(graph,data,room_file, course_list,k=4)
+    SMT_conflict_solve(graph,data,room_file, course_list,k=conflict_k)
+
+    #Same thing as weighted MaxSAT (slots only), with a time budget and the best schedule so far
+    from maxsat import min_conflict_solve
+    min_conflicts = min_conflict_solve(graph, conflict_k, timeout=60)
+    print("MaxSAT conflicts: ", min_conflicts['cost'], " Lower bound: ", min_conflicts['lower_bound'], " Gap: ", f"{min_conflicts['gap']:.1%}")
+
+    #Tabu search, for when k is too small for the exact solvers on the full catalogue
+    from localsearch import local_search_solve
+    tabu = local_search_solve(graph, conflict_k, timeout=10)
+    if tabu is None:
+        #No restart finished in time
+        print("Tabu search: TIMEOUT, no solution")
+    else:
+        print("Tabu search conflicts: ", tabu['cost'])
+        check_Sat(graph, tabu['schedule'], show=False)
+        #Student burden: back to back exams, 2-3 exams in a day (3 slots a day)
+        from scoring import ScheduleScorer
+        print("Tabu search burden: ", ScheduleScorer(enrollment, conflict_k, list(graph)).score(tabu['schedule']))
+
+    if report_file is not None:
+        instrument.write_report(report_file)
+        instrument.disable()
 
 
 
@@ -0,0 +1,130 @@
+import heapq
+import numpy as np
+
+
+"""
+DSATUR greedy scheduler: no solver, returns in milliseconds.
+Repeatedly picks the unscheduled course whose neighbors already use the most different slots (saturation), ties broken by
+# of conflicting courses, then # of shared students, then enrollment, and gives it the smallest slot its neighbors don't use.
+Used on its own as a fast mode, and as a warm start (phases/initial values) for the SAT and SMT solvers.
+"""
+
+
+def dsatur(graph, enrollments=None):
+    """
+    Returns the schedule: course -> slot (1, 2, ...)
+    enrollments: optional course -> # of students, bigger courses go first on ties
+    """
+    neighbors = {node: graph.neighbors(node) for node in graph}
+    weighted = weighted_degrees(graph)
+    size = {node: (enrollments or {}).get(node, 0) for node in graph}
+    order = {node: i for i, node in enumerate(graph)}
+
+    #Slots used by the scheduled neighbors of each course
+    neighbor_slots = {node: set() for node in graph}
+    uncolored_degree = {node: len(neighbors[node]) for node in graph}
+    schedule = {}
+
+    def priority(node):
+        #heapq is a min heap, so everything is negated (the last entry keeps the order deterministic)
+        return (-len(neighbor_slots[node]), -uncolored_degree[node], -weighted[node], -size[node], order[node])
+
+    heap = [(priority(node), node) for node in graph]
+    heapq.heapify(heap)
+    while heap:
+        key, node = heapq.heappop(heap)
+        if node in schedule or key != priority(node):
+            #Stale entry, the course was already scheduled or its priority changed since it was pushed
+            continue
+        slot = 1
+        while slot in neighbor_slots[node]:
+            slot += 1
+        schedule[node] = slot
+        for other in neighbors[node]:
+            if other in schedule:
+                continue
+            neighbor_slots[other].add(slot)
+            uncolored_degree[other] -= 1
+            heapq.heappush(heap, (priority(other), other))
+    return schedule
+
+
+def min_conflict_greedy(graph, k, enrollments=None):
+    """
+    Greedy schedule with exactly k slots, when k is too few for a conflict free one.
+    Courses go in order of shared students (most first), each one into the slot where it shares the fewest students
+    with the courses already there (ties: the slot with the fewest courses, then the lowest slot).
+    Returns the schedule: course -> slot (1..k)
+    """
+    weighted = weighted_degrees(graph)
+    size = {node: (enrollments or {}).get(node, 0) for node in graph}
+    order = sorted(graph, key=lambda node: (-weighted[node], -size[node]))
+    schedule = {}
+    load = [0] * (k + 1)
+    for node in order:
+        shared = [0] * (k + 1)
+        for other, weight in _weighted_neighbors(graph, node):
+            if other in schedule:
+                shared[schedule[other]] += weight
+        slot = min(range(1, k+1), key=lambda s: (shared[s], load[s], s))
+        schedule[node] = slot
+        load[slot] += 1
+    return schedule
+
+
+def conflict_cost(graph, schedule):
+    """
+    # of shared students between courses with the same slot (each conflicting pair counted once)
+    """
+    cost = 0
+    for node in graph:
+        slot = schedule[node]
+        for other, weight in _weighted_neighbors(graph, node):
+            if schedule[other] == slot:
+                cost += weight
+    return cost // 2
+
+
+def _weighted_neighbors(graph, node):
+    if hasattr(graph, 'weighted_neighbors'):
+        return graph.weighted_neighbors(node)
+    #networkx graph, count one shared student per edge
+    return [(other, graph.number_of_edges(node, other)) for other in graph.neighbors(node)]
+
+
+def weighted_degrees(graph):
+    """
+    # of shared students with all other courses (# of conflicting courses for a plain networkx graph), course -> count
+    """
+    if hasattr(graph, 'weights'):
+        totals = np.asarray(graph.weights.sum(axis=1)).ravel().tolist()
+        return dict(zip(graph.courses, totals))
+    return {node: graph.degree(node) for node in graph}
+
+
+def schedule_phases(schedule, translate_dict, k):
+    """
+    SAT phases (preferred literal values) for a schedule: x[course, slot] true for its slot and false for the other slots.
+    Slots above k are left out, so the solver only has to repair those courses
+    """
+    phases = []
+    for course, number in translate_dict.items():
+        slot = schedule.get(course)
+        translation = number * k
+        for i in range(1, k+1):
+            phases.append(translation + i if i == slot else -(translation + i))
+    return phases
+
+
+def align_slots(schedule, fixed):
+    """
+    Renumbers the slots of schedule so the courses in fixed (course -> slot) get their fixed slot.
+    The fixed courses must all have different slots in schedule (true for a clique), other slots keep their relative order
+    """
+    mapping = {schedule[course]: slot for course, slot in fixed.items()}
+    taken = set(mapping.values())
+    free = (slot for slot in range(1, len(schedule) + len(taken) + 2) if slot not in taken)
+    for slot in sorted(set(schedule.values())):
+        if slot not in mapping:
+            mapping[slot] = next(free)
+    return {course: mapping[slot] for course, slot in schedule.items()}
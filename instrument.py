@@ -0,0 +1,194 @@
+import cProfile
+import functools
+import json
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    #Not on Windows, the report just won't have max_rss_mb
+    resource = None
+
+
+"""
+Opt-in instrumentation for a pipeline run. Nothing is recorded (and the phases cost one global lookup) until enable() is called.
+- phase(name) / @timed(name): wall and CPU time of a phase, peak traced memory (memory=True turns on tracemalloc, which slows
+  everything down a lot) and the max RSS of the process when the phase ended
+- record(**sizes): problem size of the current phase (nodes, edges, clauses, variables, ...)
+- record_stats(source, stats): solver internals (pysat accum_stats, z3 statistics)
+- profile=<phase name>: runs cProfile around every run of that phase and dumps it to profile_file
+report() returns everything as a dict, write_report() as JSON.
+"""
+
+_run = None
+
+
+class RunReport:
+    def __init__(self, memory=False, profile=None, profile_file=None):
+        self.memory = memory
+        self.profile_phase = profile
+        self.profile_file = profile_file or f"{profile}.prof"
+        self.profiler = cProfile.Profile() if profile else None
+        self.phases = []
+        self.stack = []
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+
+    def to_dict(self):
+        return {
+            'wall': time.perf_counter() - self.start,
+            'cpu': time.process_time() - self.cpu_start,
+            'phases': self.phases,
+            'profile': self.profile_file if self.profiler else None,
+        }
+
+
+def enable(memory=False, profile=None, profile_file=None):
+    """
+    Starts recording a new run.
+    memory: track peak Python memory per phase with tracemalloc
+    profile: name of the phase to cProfile (i.e. 'sat_solve'), dumped to profile_file (defaults to <phase>.prof)
+    """
+    global _run
+    _run = RunReport(memory, profile, profile_file)
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return _run
+
+
+def disable():
+    """
+    Stops recording, returns the report of the run (None if nothing was recorded)
+    """
+    global _run
+    report_dict = report()
+    if _run is not None:
+        if _run.profiler is not None:
+            _run.profiler.dump_stats(_run.profile_file)
+        if _run.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+    _run = None
+    return report_dict
+
+
+def enabled():
+    return _run is not None
+
+
+def report():
+    return _run.to_dict() if _run is not None else None
+
+
+def write_report(filename):
+    with open(filename, "w") as f:
+        json.dump(report(), f, indent=2, default=str)
+
+
+class phase:
+    """
+    Context manager timing one phase of the run, phases can be nested (depth is kept in the report)
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.entry = None
+
+    def __enter__(self):
+        run = _run
+        if run is None:
+            return self
+        self.entry = {'name': self.name, 'depth': len(run.stack)}
+        run.phases.append(self.entry)
+        if run.memory:
+            #Keep the peak seen so far for the enclosing phase before resetting it for this one
+            if run.stack:
+                parent = run.stack[-1]
+                parent['_peak'] = max(parent.get('_peak', 0), tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        run.stack.append(self.entry)
+        if run.profiler is not None and self.name == run.profile_phase:
+            run.profiler.enable()
+        self.entry['_start'] = (time.perf_counter(), time.process_time())
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        run = _run
+        if run is None or self.entry is None:
+            return False
+        wall_start, cpu_start = self.entry.pop('_start')
+        self.entry['wall'] = time.perf_counter() - wall_start
+        self.entry['cpu'] = time.process_time() - cpu_start
+        if run.profiler is not None and self.name == run.profile_phase:
+            run.profiler.disable()
+        run.stack.pop()
+        if run.memory:
+            peak = max(self.entry.pop('_peak', 0), tracemalloc.get_traced_memory()[1])
+            self.entry['peak_memory_mb'] = peak / 2**20
+            if run.stack:
+                parent = run.stack[-1]
+                parent['_peak'] = max(parent.get('_peak', 0), peak)
+        if resource is not None:
+            #ru_maxrss is in KB on Linux
+            self.entry['max_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        if exc_type is not None:
+            self.entry['error'] = repr(exc)
+        return False
+
+
+def timed(name):
+    """
+    Decorator version of phase
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _run is None:
+                return func(*args, **kwargs)
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(**values):
+    """
+    Adds values (sizes, counts) to the innermost running phase
+    """
+    if _run is None or not _run.stack:
+        return
+    _run.stack[-1].update(values)
+
+
+def record_stats(source, stats):
+    """
+    Adds solver statistics (a dict) to the innermost running phase under stats[source]
+    """
+    if _run is None or not _run.stack:
+        return
+    _run.stack[-1].setdefault('stats', {})[source] = stats
+
+
+def record_z3(solver):
+    """
+    Adds the z3 statistics of solver to the innermost running phase (after check)
+    """
+    if _run is not None:
+        record_stats('z3', z3_stats(solver))
+
+
+def record_pysat(solver):
+    """
+    Adds the problem size and the accumulated statistics (restarts, conflicts, decisions, propagations) of a pysat solver
+    """
+    if _run is not None:
+        record(clauses=solver.nof_clauses(), variables=solver.nof_vars())
+        record_stats('pysat', solver.accum_stats())
+
+
+def z3_stats(solver):
+    """
+    z3 Solver/Optimize statistics as a plain dict (conflicts, decisions, propagations, memory, ...)
+    """
+    stats = solver.statistics()
+    return {key: stats.get_key_value(key) for key in stats.keys()}
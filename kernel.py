@@ -0,0 +1,94 @@
+import numpy as np
+from scipy.sparse.csgraph import connected_components
+
+
+"""
+Graph kernelization for the slot coloring.
+A course with fewer than k conflicting courses can always be given a slot after its neighbors have one (some slot is left over),
+so it can be removed before solving. Removing courses lowers the degree of others, so this repeats until every remaining course
+has at least k conflicts (the kernel). The kernel usually splits into several connected components that are solved on their own,
+then the removed courses are put back in the reverse order they were removed in, each into the smallest free slot.
+Only the slot coloring is reduced this way, room capacity is not taken into account.
+"""
+
+
+def peel_low_degree(graph, k):
+    """
+    Repeatedly removes the courses with degree < k.
+    Returns the list of removed courses (in removal order) and the list of courses left in the kernel
+    """
+    degree = {node: graph.degree(node) for node in graph}
+    removed = set()
+    peeled = []
+    stack = [node for node in graph if degree[node] < k]
+    while stack:
+        node = stack.pop()
+        if node in removed:
+            continue
+        removed.add(node)
+        peeled.append(node)
+        for neighbor in graph.neighbors(node):
+            if neighbor in removed:
+                continue
+            degree[neighbor] -= 1
+            if degree[neighbor] < k:
+                stack.append(neighbor)
+    kernel = [node for node in graph if node not in removed]
+    return peeled, kernel
+
+
+def split_components(graph):
+    """
+    Splits a ConflictGraph into its connected components, returns a list of lists of courses (largest first)
+    """
+    if len(graph) == 0:
+        return []
+    count, labels = connected_components(graph.weights, directed=False)
+    courses = np.array(graph.courses, dtype=object)
+    components = [courses[labels == label].tolist() for label in range(count)]
+    components.sort(key=len, reverse=True)
+    return components
+
+
+def reinsert_peeled(graph, schedule, peeled, k):
+    """
+    Gives every peeled course the smallest slot none of its already scheduled neighbors have, last removed first.
+    Returns False if a course had no free slot (can't happen for courses peeled with this k)
+    """
+    for node in reversed(peeled):
+        taken = {schedule[other] for other in graph.neighbors(node) if other in schedule}
+        slot = 1
+        while slot in taken:
+            slot += 1
+        if slot > k:
+            return False
+        schedule[node] = slot
+    return True
+
+
+def reduce_graph(graph, k):
+    """
+    Returns the peeled courses and the kernel split into components (each a ConflictGraph)
+    """
+    peeled, kernel = peel_low_degree(graph, k)
+    kernel_graph = graph.subgraph(kernel)
+    components = [kernel_graph.subgraph(component) for component in split_components(kernel_graph)]
+    return peeled, components
+
+
+def solve_reduced(graph, k, solve_kernel):
+    """
+    Peels, solves each kernel component with solve_kernel(component_graph, k) -> schedule (course -> slot) or None,
+    then merges the component schedules and reinserts the peeled courses.
+    Returns the full schedule, or None if any component has no schedule
+    """
+    peeled, components = reduce_graph(graph, k)
+    schedule = {}
+    for component in components:
+        component_schedule = solve_kernel(component, k)
+        if component_schedule is None:
+            return None
+        schedule.update(component_schedule)
+    if not reinsert_peeled(graph, schedule, peeled, k):
+        return None
+    return schedule
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+
+from conflict_graph import as_networkx
+
+
+"""
+Shared node positions for all of the graph drawings (graph_conv, graph_conv_3d, visualize_schedule, visualize_schedule_by_room).
+Positions are only computed when something is actually drawn, and are cached by the graph's node and edge signature:
+first in memory, then on disk in LAYOUT_CACHE_DIR so the full catalogue only has to be laid out once.
+"""
+
+LAYOUT_CACHE_DIR = ".layout_cache"
+
+#Spring layout parameters used by every view, so the 2D graph and the schedule colorings line up
+SPRING_OPTIONS = {'k': 0.3, 'iterations': 50, 'seed': 42}
+
+#(signature, dim) -> {node: position}
+_layouts = {}
+
+
+def graph_signature(graph):
+    """
+    Hash of the sorted node and edge lists, two graphs with the same courses and conflicts share a layout
+    """
+    digest = hashlib.sha1()
+    for node in sorted(map(str, graph.nodes())):
+        digest.update(node.encode())
+        digest.update(b'\0')
+    digest.update(b'\1')
+    edges = sorted(tuple(sorted((str(u), str(v)))) for u, v in graph.edges())
+    for u, v in edges:
+        digest.update(u.encode())
+        digest.update(b'\0')
+        digest.update(v.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _cache_file(cache_dir, signature, dim):
+    return os.path.join(cache_dir, f"{signature}_{dim}d.json")
+
+
+def get_layout(graph, dim=2, cache_dir=LAYOUT_CACHE_DIR):
+    """
+    Returns a dict node -> position (list of dim floats) for graph.
+    cache_dir=None keeps the cache in memory only.
+    """
+    signature = graph_signature(graph)
+    key = (signature, dim)
+    if key in _layouts:
+        return _layouts[key]
+
+    if cache_dir is not None:
+        path = _cache_file(cache_dir, signature, dim)
+        if os.path.exists(path):
+            with open(path) as f:
+                stored = json.load(f)
+            pos = dict(zip(stored['nodes'], stored['positions']))
+            _layouts[key] = pos
+            return pos
+
+    import networkx as nx
+    drawn = as_networkx(graph)
+    pos = nx.spring_layout(drawn, dim=dim, **SPRING_OPTIONS)
+    pos = {node: [float(x) for x in coords] for node, coords in pos.items()}
+    _layouts[key] = pos
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        nodes = list(pos.keys())
+        with open(_cache_file(cache_dir, signature, dim), "w") as f:
+            json.dump({'nodes': nodes, 'positions': [pos[node] for node in nodes]}, f)
+    return pos
+
+
+def clear_layouts(cache_dir=LAYOUT_CACHE_DIR):
+    """
+    Drops the in memory layouts, and the saved ones if cache_dir is given
+    """
+    _layouts.clear()
+    if cache_dir is not None and os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(cache_dir, name))
@@ -0,0 +1,230 @@
+import time
+
+import numpy as np
+
+from heuristic import min_conflict_greedy
+from parallel import run_parallel, DEFAULT_WORKERS
+from room_assign import room_slot_limits, assign_rooms
+from instrument import timed
+
+
+"""
+Tabu search over the course -> slot assignment, for the full catalogue with k too small for a conflict free schedule
+(where the Optimize/SMT and MaxSAT solvers don't finish).
+- conflict weights come straight from the ConflictGraph's CSR matrix
+- shared[i, s] = # of students course i shares with the courses in slot s, so moving course i from slot s to t
+  changes the cost by shared[i, t] - shared[i, s], and the move only updates the rows of i's neighbors (O(degree))
+- every iteration makes the best move of a course that is in conflict, a course can't go back to a slot it just left
+  for a few iterations (tabu tenure) unless that gives a new best schedule
+- rooms (optional): the per slot room count limits from room_assign.room_slot_limits, every course over a limit costs
+  room_penalty. With no course over a limit every slot has a room matching (see room_assign.py)
+Restarts run in parallel, each from the greedy schedule with a different random part reshuffled.
+"""
+
+#Tabu tenure = random(0..TABU_RANDOM) + TABU_FACTOR * # of courses in conflict (TabuCol)
+TABU_RANDOM = 10
+TABU_FACTOR = 0.6
+
+
+class TabuState:
+    """
+    Slots (0 based) of every course plus the incremental move tables
+    - slots[i]: slot of course i
+    - shared[i, s]: # of shared students between course i and the courses in slot s
+    - level[i]: # of room limits course i counts toward (the limits are nested, course i is in the first level[i] of them)
+    - counts[l, s]: # of courses of room limit l in slot s, bound[l] the most that fit
+    """
+
+    def __init__(self, indptr, indices, data, slots, k, level=None, bound=None, room_penalty=0):
+        self.indptr, self.indices, self.data = indptr, indices, data
+        self.k = k
+        n = len(slots)
+        self.slots = np.array(slots, dtype=np.int64)
+        self.shared = np.zeros((n, k), dtype=np.int64)
+        rows = np.repeat(np.arange(n), np.diff(indptr))
+        np.add.at(self.shared, (rows, self.slots[indices]), data)
+
+        self.level = np.zeros(n, dtype=np.int64) if level is None else np.asarray(level, dtype=np.int64)
+        self.bound = np.zeros(0, dtype=np.int64) if bound is None else np.asarray(bound, dtype=np.int64)
+        self.room_penalty = room_penalty
+        self.counts = np.zeros((len(self.bound), k), dtype=np.int64)
+        for l in range(len(self.bound)):
+            self.counts[l] = np.bincount(self.slots[self.level > l], minlength=k)
+
+    def conflicts(self):
+        return int(self.shared[np.arange(len(self.slots)), self.slots].sum()) // 2
+
+    def room_excess(self):
+        return int(np.maximum(self.counts - self.bound[:, None], 0).sum())
+
+    def cost(self):
+        return self.conflicts() + self.room_penalty * self.room_excess()
+
+    def candidates(self):
+        """
+        Courses worth moving: in conflict, or counted in a room limit that their slot is over
+        """
+        current = self.shared[np.arange(len(self.slots)), self.slots]
+        moving = current > 0
+        if len(self.bound):
+            over = self.counts > self.bound[:, None]
+            #over_below[l, s]: # of limits < l over in slot s
+            over_below = np.vstack([np.zeros((1, self.k), dtype=np.int64), np.cumsum(over, axis=0)])
+            moving |= over_below[self.level, self.slots] > 0
+        return np.flatnonzero(moving)
+
+    def deltas(self, courses):
+        """
+        (len(courses), k) cost change of moving each course to each slot (0 for its own slot)
+        """
+        own = self.slots[courses]
+        delta = self.shared[courses] - self.shared[courses, own][:, None]
+        if len(self.bound):
+            over = (self.counts > self.bound[:, None]).astype(np.int64)
+            full = (self.counts >= self.bound[:, None]).astype(np.int64)
+            zero = np.zeros((1, self.k), dtype=np.int64)
+            over_below = np.vstack([zero, np.cumsum(over, axis=0)])
+            full_below = np.vstack([zero, np.cumsum(full, axis=0)])
+            level = self.level[courses]
+            #Leaving own slot fixes one excess per limit that slot is over, joining slot t adds one per limit t is full in
+            room = full_below[level] - over_below[level, own][:, None]
+            delta = delta + self.room_penalty * room
+        delta[np.arange(len(courses)), own] = 0
+        return delta
+
+    def move(self, i, t):
+        s = self.slots[i]
+        start, end = self.indptr[i], self.indptr[i+1]
+        neighbors = self.indices[start:end]
+        weights = self.data[start:end]
+        self.shared[neighbors, s] -= weights
+        self.shared[neighbors, t] += weights
+        if self.level[i]:
+            self.counts[:self.level[i], s] -= 1
+            self.counts[:self.level[i], t] += 1
+        self.slots[i] = t
+
+
+def tabu_search(indptr, indices, data, slots, k, timeout, seed=0, max_iterations=None, level=None, bound=None, room_penalty=0):
+    """
+    Runs tabu search from slots (0 based) until the cost is 0, timeout seconds pass or max_iterations moves are made.
+    Returns (best cost, best slots, # of iterations)
+    """
+    start = time.time()
+    rng = np.random.default_rng(seed)
+    state = TabuState(indptr, indices, data, slots, k, level, bound, room_penalty)
+    cost = state.cost()
+    best_cost, best_slots = cost, state.slots.copy()
+    tabu_until = np.zeros((len(slots), k), dtype=np.int64)
+
+    iteration = 0
+    while best_cost > 0 and time.time() - start < timeout:
+        if max_iterations is not None and iteration >= max_iterations:
+            break
+        iteration += 1
+        courses = state.candidates()
+        if len(courses) == 0:
+            break
+        delta = state.deltas(courses)
+        own = state.slots[courses]
+        allowed = tabu_until[courses] < iteration
+        #Aspiration: a tabu move is fine if it beats the best schedule
+        allowed |= cost + delta < best_cost
+        allowed[np.arange(len(courses)), own] = False
+        if not allowed.any():
+            continue
+        masked = np.where(allowed, delta, np.iinfo(np.int64).max)
+        options = np.flatnonzero(masked == masked.min())
+        choice = options[rng.integers(len(options))]
+        row, t = divmod(int(choice), k)
+        i = int(courses[row])
+
+        tabu_until[i, state.slots[i]] = iteration + rng.integers(TABU_RANDOM + 1) + int(TABU_FACTOR * len(courses))
+        cost += int(delta[row, t])
+        state.move(i, t)
+        if cost < best_cost:
+            best_cost, best_slots = cost, state.slots.copy()
+    return best_cost, best_slots, iteration
+
+
+def restart_task(indptr, indices, data, slots, k, timeout, seed, shake, level, bound, room_penalty):
+    """
+    Worker: one tabu run, reshuffling a shake fraction of the starting slots first (seed 0 keeps the greedy start)
+    Returns (status, (best cost, best slots, iterations))
+    """
+    rng = np.random.default_rng(seed)
+    slots = np.array(slots, dtype=np.int64)
+    if seed and shake:
+        picked = rng.random(len(slots)) < shake
+        slots[picked] = rng.integers(k, size=int(picked.sum()))
+    return 'SAT', tabu_search(indptr, indices, data, slots, k, timeout, seed, None, level, bound, room_penalty)
+
+
+@timed('local_search')
+def local_search_solve(graph, k, timeout=30, restarts=None, workers=None, seed=0, shake=0.1, enrollments=None,
+                       room_list=None, room_capacity=None, room_penalty=None):
+    """
+    Minimum conflict schedule of graph (a ConflictGraph) in k slots by tabu search.
+    timeout: wall clock seconds for every restart, workers: # of processes (defaults to the # of CPUs),
+    restarts: # of tabu runs (defaults to the # of workers)
+    room_list, room_capacity, enrollments: optional rooms, the search then also keeps every slot within what the rooms can hold
+    room_penalty: cost of one course over a room limit (defaults to the heaviest conflict + 1, so rooms come first)
+    Returns a dict with
+    - schedule: course -> slot (check_Sat), or course -> [slot, room] when rooms are given and every course got a room (check_SMT)
+    - cost: # of shared students in the same slot, room_excess: # of courses over a room limit (0 without rooms)
+    - unplaced: courses left without a room (then schedule stays course -> slot), empty without rooms
+    - restarts: cost of every restart, time: seconds
+    """
+    start = time.time()
+    courses = list(graph)
+    weights = graph.weights
+    indptr = weights.indptr.astype(np.int64)
+    indices = weights.indices.astype(np.int64)
+    data = weights.data.astype(np.int64)
+
+    greedy = min_conflict_greedy(graph, k, enrollments)
+    slots = [greedy[course] - 1 for course in courses]
+
+    level = bound = None
+    rooms = room_list is not None
+    if rooms:
+        limits = room_slot_limits(courses, room_list, room_capacity, enrollments)
+        index = {course: i for i, course in enumerate(courses)}
+        level = np.zeros(len(courses), dtype=np.int64)
+        for l, (bigger, _) in enumerate(limits):
+            level[[index[course] for course in bigger]] = l + 1
+        bound = [limit for _, limit in limits]
+        if room_penalty is None:
+            room_penalty = int(data.max(initial=0)) + 1
+    else:
+        room_penalty = 0
+
+    workers = workers or DEFAULT_WORKERS
+    if restarts is None:
+        restarts = workers
+    tasks = [(indptr, indices, data, slots, k, timeout, seed + r, shake, level, bound, room_penalty) for r in range(restarts)]
+    #One process: the restarts run right here and stop on their own timeout, no pool needed to enforce it
+    results = run_parallel(restart_task, tasks, workers, deadline=None if workers == 1 else timeout + 30)
+    finished = [result['result'] for result in results if result['status'] == 'SAT']
+    if not finished:
+        return None
+    best_cost, best_slots, _ = min(finished, key=lambda result: result[0])
+
+    schedule = {course: int(slot) + 1 for course, slot in zip(courses, best_slots)}
+    state = TabuState(indptr, indices, data, best_slots, k, level, bound, room_penalty)
+    report = {
+        'schedule': schedule,
+        'cost': state.conflicts(),
+        'room_excess': state.room_excess(),
+        'restarts': [result['result'][0] if result['status'] == 'SAT' else None for result in results],
+        'unplaced': [],
+    }
+    if rooms:
+        #Every course gets a room when room_excess is 0. Otherwise the schedule keeps every course (slots only)
+        #and the ones the matching couldn't place are listed
+        room_schedule, unplaced = assign_rooms(schedule, room_list, room_capacity, enrollments)
+        report['unplaced'] = unplaced
+        if not unplaced:
+            report['schedule'] = room_schedule
+    report['time'] = time.time() - start
+    return report
@@ -0,0 +1,120 @@
+import time
+from threading import Timer
+
+from pysat.examples.rc2 import RC2Stratified
+from pysat.formula import WCNF, IDPool
+
+from final_exam import translate_nodes, decode_model
+from cardinality import at_most_one
+from heuristic import min_conflict_greedy, conflict_cost, weighted_degrees
+from localsearch import local_search_solve
+from symmetry import find_large_clique
+from instrument import timed, record
+
+
+"""
+Minimum conflict scheduling as weighted partial MaxSAT, for k too small for a conflict free schedule (i.e. k = 4).
+- hard: every course gets exactly one slot
+- soft: for every conflicting pair and every slot, (-x[u, slot] V -x[v, slot]) weighted by the # of shared students.
+  A course only has one slot, so a pair breaks at most one of its k soft clauses and the cost is the # of students with two exams at once.
+Solved with pysat's RC2 (core guided). RC2 only raises its lower bound until it finds the optimum, so the best schedule so far
+comes from a short tabu search (localsearch.py, starting from min_conflict_greedy) and is replaced by RC2's model when RC2
+finishes within the time budget.
+"""
+
+#Seconds for the tabu search that gives the incumbent (at most a quarter of the timeout)
+SEED_SEARCH_TIMEOUT = 10
+
+
+def precedence_order(graph, k):
+    """
+    Courses whose slots are restricted by the slot symmetry breaking: a large clique first (they tend to get different slots),
+    then the rest by shared students. The i-th course (0 based) only gets slots 1..i+1
+    """
+    clique = find_large_clique(graph)
+    weighted = weighted_degrees(graph)
+    in_clique = set(clique)
+    rest = sorted((node for node in graph if node not in in_clique), key=lambda node: -weighted[node])
+    return (clique + rest)[:k-1]
+
+
+def min_conflict_wcnf(graph, k, translate_dict, encoding='pairwise', symmetry_breaking=True):
+    """
+    Builds the WCNF above. symmetry_breaking: slot labels are interchangeable, so number the slots in order of first use
+    along precedence_order (the i-th course can't use a slot above i+1), doesn't change the optimum
+    """
+    wcnf = WCNF()
+    pool = IDPool(start_from=len(translate_dict) * k + 1)
+    for node in graph:
+        lits = [translate_dict[node] * k + i for i in range(1, k+1)]
+        wcnf.append(lits)
+        for clause in at_most_one(lits, encoding, pool):
+            wcnf.append(clause)
+
+    if symmetry_breaking:
+        for position, node in enumerate(precedence_order(graph, k)):
+            for i in range(position + 2, k+1):
+                wcnf.append([-(translate_dict[node] * k + i)])
+
+    for u, v, weight in graph.weighted_edges():
+        for i in range(1, k+1):
+            wcnf.append([-(translate_dict[u] * k + i), -(translate_dict[v] * k + i)], weight=weight)
+    return wcnf
+
+
+@timed('maxsat')
+def min_conflict_solve(graph, k, timeout=None, solver_name='g3', encoding='pairwise', symmetry_breaking=True, enrollments=None):
+    """
+    Schedules graph into k slots with as few students with two exams at once as possible.
+    timeout: seconds RC2 gets before it is interrupted (solver_name has to be a pysat solver that can be interrupted, i.e. g3, g4, m22)
+    Returns a dict with
+    - status: 'OPTIMAL' or 'TIMEOUT'
+    - schedule: best schedule found, course -> slot
+    - cost: its # of shared students in the same slot
+    - lower_bound: no schedule has a lower cost (equal to cost when optimal)
+    - gap: (cost - lower_bound) / cost, 0 when optimal
+    - source: 'greedy', 'tabu' or 'rc2', time: seconds
+    """
+    start = time.time()
+    schedule = min_conflict_greedy(graph, k, enrollments)
+    cost = conflict_cost(graph, schedule)
+    source = 'greedy'
+    lower_bound = 0
+
+    if cost > 0:
+        #RC2 has no model until the optimum, so the incumbent is the better of the greedy and the tabu schedule
+        search_time = SEED_SEARCH_TIMEOUT if timeout is None else min(SEED_SEARCH_TIMEOUT, timeout / 4)
+        searched = local_search_solve(graph, k, timeout=search_time, restarts=1, workers=1, enrollments=enrollments)
+        if searched is not None and searched['cost'] < cost:
+            schedule, cost, source = searched['schedule'], searched['cost'], 'tabu'
+
+    if cost > 0:
+        translate_dict, reverse_translate = translate_nodes(graph)
+        wcnf = min_conflict_wcnf(graph, k, translate_dict, encoding, symmetry_breaking)
+        record(hard=len(wcnf.hard), soft=len(wcnf.soft), variables=wcnf.nv)
+        remaining = None if timeout is None else max(timeout - (time.time() - start), 0)
+        with RC2Stratified(wcnf, solver=solver_name, adapt=True, exhaust=True, minz=True) as rc2:
+            timer = None
+            if remaining is not None:
+                timer = Timer(remaining, rc2.interrupt)
+                timer.start()
+            model = rc2.compute(expect_interrupt=timer is not None)
+            if timer is not None:
+                timer.cancel()
+            if model is not None:
+                schedule = decode_model(model, k, reverse_translate)
+                cost = lower_bound = rc2.cost
+                source = 'rc2'
+            else:
+                #Interrupted, every core found so far still counts toward the lower bound
+                lower_bound = min(rc2.cost, cost)
+
+    return {
+        'status': 'OPTIMAL' if cost == lower_bound else 'TIMEOUT',
+        'schedule': schedule,
+        'cost': cost,
+        'lower_bound': lower_bound,
+        'gap': (cost - lower_bound) / cost if cost else 0.0,
+        'source': source,
+        'time': time.time() - start,
+    }
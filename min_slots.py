@@ -0,0 +1,147 @@
+import time
+from pysat.formula import IDPool
+from pysat.solvers import Solver
+
+from final_exam import translate_nodes, generate_clauses, decode_model
+from solve_final import solve_with_timeout
+from symmetry import chromatic_bounds, clique_fixing
+from instrument import timed, record, record_pysat
+
+
+"""
+Find the minimum number of exam slots.
+The coloring is encoded once for an upper bound k_max, with one activation literal per slot:
+    (-x[node, s] V a[s]) for every node and slot s
+Assuming -a[s] turns slot s off, so every smaller k is checked on the same solver instance with assumptions,
+and the clauses it learned on earlier k values are kept.
+"""
+
+
+def encode_min_slots(graph, k_max, solver_name='g3', encoding='pairwise', fixed=None):
+    """
+    Builds the solver for k_max slots plus the activation literals.
+    fixed: optional course -> slot pins (symmetry breaking)
+    Returns the solver, the activation literal of each slot (index 0 = slot 1), and number -> node
+    """
+    translate_dict, reverse_translate = translate_nodes(graph)
+    solver = Solver(name=solver_name)
+    pool = IDPool(start_from=len(translate_dict) * k_max + 1)
+    for clause in generate_clauses(graph, k_max, translate_dict, encoding, pool, fixed):
+        solver.add_clause(clause)
+
+    #Activation literals come after the node/color and auxiliary variables
+    activation = [pool.id() for s in range(k_max)]
+    for index in range(len(translate_dict)):
+        translation = index * k_max
+        for s in range(k_max):
+            solver.add_clause([-(translation + s + 1), activation[s]])
+    return solver, activation, reverse_translate
+
+
+def compact_slots(schedule):
+    """
+    Renumbers the slots a schedule uses to 1..(# of used slots), keeping their order
+    """
+    renumber = {slot: i for i, slot in enumerate(sorted(set(schedule.values())), start=1)}
+    return {course: renumber[slot] for course, slot in schedule.items()}
+
+
+def _check_slots(solver, activation, k, step_timeout=None):
+    """
+    Solve with only slots 1..k turned on.
+    Returns True/False, or None if step_timeout (seconds) ran out first
+    """
+    assumptions = activation[:k] + [-a for a in activation[k:]]
+    return solve_with_timeout(solver, assumptions, step_timeout)
+
+
+@timed('min_slots')
+def find_min_slots(graph, k_max, k_min=1, strategy='linear', solver_name='g3', step_timeout=None, encoding='pairwise', symmetry_breaking=False,
+                   timeout=None):
+    """
+    Finds the smallest k in [k_min, k_max] for which the graph has a valid exam schedule.
+    strategy: 'linear' walks down from k_max (jumping straight below the # of slots the last schedule actually used),
+              'binary' binary searches between k_min and k_max, a midpoint that runs out of time counts as unknown and
+              the search goes on above it.
+    solver_name: any pysat solver name that supports assumptions ('g3', 'g4', 'cadical153', 'm22', ...)
+    encoding: at-most-one encoding (see cardinality.ENCODINGS)
+    step_timeout: optional time limit in seconds for each k, with 'linear' a step that runs out stops the search (ignored by solvers that can't be interrupted, e.g. CaDiCaL)
+    symmetry_breaking: narrow [k_min, k_max] to the clique lower bound and greedy upper bound, and pin the clique to the first slots
+    timeout: optional time limit in seconds for the whole search, every step gets at most what is left of it
+    Returns a dict with the smallest k found (None if k_max is infeasible, or no step found a schedule in time), its schedule,
+    whether that k is proven minimal (no smaller k timed out), and the timing of every step (sat None = out of time)
+    """
+    encode_start = time.time()
+    deadline = None if timeout is None else encode_start + timeout
+    best_k = None
+    best_schedule = None
+    fixed = None
+    if symmetry_breaking:
+        bounds = chromatic_bounds(graph)
+        k_min = max(k_min, bounds['lower'])
+        #The greedy schedule already works for its # of slots, only fewer slots are left to check
+        if bounds['upper'] <= k_max:
+            best_k, best_schedule = bounds['upper'], bounds['greedy']
+            k_max = bounds['upper'] - 1
+        fixed = clique_fixing(bounds['clique'], k_max)
+        if k_max < k_min:
+            return {
+                'k': best_k,
+                'schedule': best_schedule,
+                'proven': best_k is not None,
+                'encode_time': time.time() - encode_start,
+                'steps': [],
+                'total_time': time.time() - encode_start,
+            }
+    solver, activation, reverse_translate = encode_min_slots(graph, k_max, solver_name, encoding, fixed)
+    encode_time = time.time() - encode_start
+
+    steps = []
+
+    def attempt(k):
+        start = time.time()
+        limit = step_timeout
+        if deadline is not None:
+            left = max(deadline - start, 0.001)
+            limit = left if limit is None else min(limit, left)
+        satisfiable = _check_slots(solver, activation, k, limit)
+        steps.append({'k': k, 'sat': satisfiable, 'time': time.time() - start})
+        if not satisfiable:
+            return None
+        return compact_slots(decode_model(solver.get_model(), k_max, reverse_translate))
+
+    if strategy == 'linear':
+        k = k_max
+        while k >= k_min:
+            schedule = attempt(k)
+            if schedule is None:
+                break
+            #The schedule may not use every slot, skip straight past the ones it left empty
+            best_k, best_schedule = len(set(schedule.values())), schedule
+            k = best_k - 1
+    elif strategy == 'binary':
+        low, high = k_min, k_max
+        while low <= high:
+            k = (low + high) // 2
+            schedule = attempt(k)
+            if schedule is None:
+                #UNSAT, or unknown after a timeout: either way only the k above are left to try
+                low = k + 1
+            else:
+                best_k, best_schedule = len(set(schedule.values())), schedule
+                high = best_k - 1
+    else:
+        solver.delete()
+        raise ValueError(f"Unknown strategy: {strategy}")
+
+    record_pysat(solver)
+    record(steps=len(steps))
+    solver.delete()
+    return {
+        'k': best_k,
+        'schedule': best_schedule,
+        'proven': best_k is not None and not any(step['sat'] is None and step['k'] < best_k for step in steps),
+        'encode_time': encode_time,
+        'steps': steps,
+        'total_time': encode_time + sum(step['time'] for step in steps),
+    }
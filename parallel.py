@@ -0,0 +1,172 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from final_exam import data_conv_encoded, build_conflict_graph, translate_nodes, generate_clauses, decode_model
+from solve_final import solve_clauses
+from kernel import reduce_graph, reinsert_peeled
+
+
+"""
+Runs independent pieces of the scheduling problem in a ProcessPoolExecutor:
+- the connected components of the (peeled) conflict graph
+- the room assignment of each exam slot
+- whole runs for separate registration files / k values
+Every task function returns (status, result) with status 'SAT', 'UNSAT' or 'TIMEOUT'.
+Results always come back in task order, no matter which worker finishes first, so merged schedules are deterministic.
+"""
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def _timed_call(func, args):
+    """
+    Runs one task inside a worker, a crash in the task comes back as an 'ERROR' status instead of killing the pool
+    """
+    start = time.time()
+    try:
+        status, result = func(*args)
+        error = None
+    except Exception as exc:
+        status, result, error = 'ERROR', None, repr(exc)
+    return {'status': status, 'result': result, 'time': time.time() - start, 'error': error}
+
+
+def terminate_pool(executor):
+    """
+    Stops the pool without waiting for running tasks (a solver that can't be interrupted would otherwise keep it alive)
+    """
+    if hasattr(executor, 'terminate_workers'):
+        #Python 3.14+
+        executor.terminate_workers()
+        return
+    #Older versions have no public way to kill the workers: ProcessPoolExecutor._processes (pid -> Process) is private,
+    #so only use it if it is still there, otherwise the workers finish their task after the shutdown
+    processes = getattr(executor, '_processes', None)
+    if isinstance(processes, dict):
+        for process in list(processes.values()):
+            process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_parallel(func, tasks, workers=None, deadline=None):
+    """
+    Runs func(*args) for every args tuple in tasks.
+    workers: # of processes (defaults to the # of CPUs), 1 runs everything in this process
+    deadline: optional limit in seconds for the whole batch, unfinished tasks get a 'TIMEOUT' status
+    Returns a list of dicts {'status', 'result', 'time', 'error'} in the same order as tasks
+    """
+    workers = workers or DEFAULT_WORKERS
+    if workers == 1 and deadline is None:
+        return [_timed_call(func, args) for args in tasks]
+
+    results = [None] * len(tasks)
+    executor = ProcessPoolExecutor(max_workers=workers)
+    futures = {executor.submit(_timed_call, func, args): i for i, args in enumerate(tasks)}
+    end = None if deadline is None else time.time() + deadline
+    pending = set(futures)
+    while pending:
+        remaining = None if end is None else end - time.time()
+        if remaining is not None and remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except Exception as exc:
+                #The task never ran to _timed_call's try: unpicklable arguments/result, or a worker died (BrokenProcessPool)
+                results[futures[future]] = {'status': 'ERROR', 'result': None, 'time': None, 'error': repr(exc)}
+
+    if pending:
+        terminate_pool(executor)
+        for future in pending:
+            results[futures[future]] = {'status': 'TIMEOUT', 'result': None, 'time': deadline, 'error': None}
+    else:
+        executor.shutdown()
+    return results
+
+
+def combined_status(results):
+    """
+    'UNSAT' if any task is UNSAT, otherwise 'ERROR'/'TIMEOUT' if any task didn't finish, otherwise 'SAT'
+    """
+    statuses = [result['status'] for result in results]
+    for status in ('UNSAT', 'ERROR', 'TIMEOUT'):
+        if status in statuses:
+            return status
+    return 'SAT'
+
+
+def color_task(graph, k, encoding='pairwise', solver_name='g3', timeout=None):
+    """
+    Worker: k slot coloring of one graph, returns (status, course -> slot)
+    """
+    translate_dict, reverse_translate = translate_nodes(graph)
+    status, model = solve_clauses(generate_clauses(graph, k, translate_dict, encoding), solver_name, timeout)
+    if status != 'SAT':
+        return status, None
+    return status, decode_model(model, k, reverse_translate)
+
+
+def solve_components_parallel(graph, k, encoding='pairwise', solver_name='g3', timeout=None, workers=None):
+    """
+    Peels the courses with < k conflicts, solves every kernel component in its own worker, merges and reinserts the peeled courses.
+    timeout: per component solver time limit in seconds
+    Returns (status, schedule) where schedule maps course -> slot (None unless status is 'SAT')
+    """
+    peeled, components = reduce_graph(graph, k)
+    tasks = [(component, k, encoding, solver_name, timeout) for component in components]
+    results = run_parallel(color_task, tasks, workers)
+    status = combined_status(results)
+    if status != 'SAT':
+        return status, None
+
+    schedule = {}
+    for result in results:
+        schedule.update(result['result'])
+    if not reinsert_peeled(graph, schedule, peeled, k):
+        return 'UNSAT', None
+    return 'SAT', schedule
+
+
+def assign_rooms_parallel(slot_schedule, room_list, room_capacity, enrollments, timeout=None, workers=None):
+    """
+    Given a slot schedule (course -> slot), assigns rooms to the courses of each slot in parallel.
+    timeout: per slot solver time limit in seconds
+    Returns (status, schedule) where schedule maps course -> [slot, room] like solve_SMT_LIA
+    """
+    from smt_solve import solve_slot_rooms
+    slots = sorted(set(slot_schedule.values()))
+    by_slot = {slot: [] for slot in slots}
+    for course, slot in slot_schedule.items():
+        by_slot[slot].append(course)
+    tasks = [(by_slot[slot], room_list, room_capacity, enrollments, timeout) for slot in slots]
+    results = run_parallel(solve_slot_rooms, tasks, workers)
+    status = combined_status(results)
+    if status != 'SAT':
+        return status, None
+
+    schedule = {}
+    for slot, result in zip(slots, results):
+        for course in by_slot[slot]:
+            schedule[course] = [slot, result['result'][course]]
+    return 'SAT', schedule
+
+
+def file_task(registration_file, k, encoding='pairwise', solver_name='g3', timeout=None):
+    """
+    Worker: full SAT run (convert, graph, solve) for one registration file and k, returns (status, summary dict)
+    """
+    start = time.time()
+    data, course_list, student_dict, student_edges, enrollment = data_conv_encoded(registration_file)
+    graph = build_conflict_graph(course_list, student_edges, enrollment)
+    status, schedule = color_task(graph, k, encoding, solver_name, timeout)
+    return status, {'file': registration_file, 'k': k, 'courses': len(graph), 'schedule': schedule, 'time': time.time() - start}
+
+
+def solve_grid_parallel(registration_files, ks, encoding='pairwise', solver_name='g3', timeout=None, workers=None):
+    """
+    Runs every (registration file, k) combination in parallel, results are in file-major order
+    """
+    tasks = [(registration_file, k, encoding, solver_name, timeout) for registration_file in registration_files for k in ks]
+    return run_parallel(file_task, tasks, workers)
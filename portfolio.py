@@ -0,0 +1,147 @@
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from final_exam import translate_nodes, generate_clauses, decode_model
+from solve_final import solve_clauses
+from parallel import terminate_pool
+from symmetry import find_large_clique, clique_fixing
+
+
+"""
+Solver portfolio: the same slot coloring encoding is solved by several backends at once, each in its own process.
+The first SAT/UNSAT answer wins and the other processes are terminated.
+Backends are pysat solver names ('g3', 'g4', 'cadical195', 'mcb', 'm22', ...) or 'z3'.
+"""
+
+DEFAULT_BACKENDS = ['g4', 'cadical195', 'mcb', 'm22', 'z3']
+
+
+def solve_z3_clauses(clauses, timeout=None):
+    """
+    Solves the CNF clauses with z3 (one Bool per variable), returns (status, model) like solve_final.solve_clauses
+    """
+    import z3
+    solver = z3.Solver()
+    if timeout is not None:
+        solver.set('timeout', int(timeout * 1000))
+    variables = {}
+
+    def literal(lit):
+        var = variables.get(abs(lit))
+        if var is None:
+            var = variables[abs(lit)] = z3.Bool(f"x{abs(lit)}")
+        return var if lit > 0 else z3.Not(var)
+
+    for clause in clauses:
+        solver.add(z3.Or([literal(lit) for lit in clause]))
+    result = solver.check()
+    if result == z3.sat:
+        model = solver.model()
+        return 'SAT', [v if z3.is_true(model.eval(var, model_completion=True)) else -v for v, var in sorted(variables.items())]
+    if result == z3.unsat:
+        return 'UNSAT', None
+    return 'TIMEOUT', None
+
+
+def backend_task(backend, graph, k, encoding='pairwise', timeout=None, fixed=None):
+    """
+    Worker: encodes graph for k slots and solves it with one backend.
+    fixed: optional course -> slot pins (symmetry breaking)
+    Returns a dict with the backend, status, schedule and solve time
+    """
+    start = time.time()
+    translate_dict, reverse_translate = translate_nodes(graph)
+    clauses = generate_clauses(graph, k, translate_dict, encoding, fixed=fixed)
+    if backend == 'z3':
+        status, model = solve_z3_clauses(clauses, timeout)
+    else:
+        status, model = solve_clauses(clauses, backend, timeout)
+    schedule = decode_model(model, k, reverse_translate) if status == 'SAT' else None
+    return {'backend': backend, 'status': status, 'schedule': schedule, 'time': time.time() - start}
+
+
+def portfolio_solve(graph, k, backends=DEFAULT_BACKENDS, encoding='pairwise', timeout=None, log_file=None, symmetry_breaking=False):
+    """
+    Races the backends on the k slot coloring of graph.
+    timeout: seconds before giving up on every backend
+    symmetry_breaking: pin a clique to the first slots in every backend's encoding (k below the clique size is UNSAT right away)
+    log_file: optional file the result is appended to as one JSON line (k, # of courses/conflicts, winner, times), to tune the default backend
+    Returns a dict with the status ('SAT', 'UNSAT', 'TIMEOUT', or 'ERROR' when every backend failed), schedule, winning backend,
+    wall time, the answers of every backend that finished before the winner, and the error messages when the status is 'ERROR'
+    """
+    start = time.time()
+    finished = []
+    winner = None
+    fixed = None
+    if symmetry_breaking:
+        clique = find_large_clique(graph)
+        if k < len(clique):
+            winner = {'backend': 'clique', 'status': 'UNSAT', 'schedule': None, 'time': time.time() - start}
+            finished.append(winner)
+        fixed = clique_fixing(clique, k)
+
+    if winner is None:
+        #No processes at all when the clique already answered
+        executor = ProcessPoolExecutor(max_workers=len(backends))
+        futures = {executor.submit(backend_task, backend, graph, k, encoding, timeout, fixed): backend for backend in backends}
+        pending = set(futures)
+        while pending and winner is None:
+            remaining = None if timeout is None else timeout - (time.time() - start)
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    result = {'backend': futures[future], 'status': 'ERROR', 'schedule': None, 'time': time.time() - start, 'error': repr(exc)}
+                finished.append(result)
+                if winner is None and result['status'] in ('SAT', 'UNSAT'):
+                    winner = result
+
+        #Stop everyone still solving
+        terminate_pool(executor)
+
+    if winner is not None:
+        status = winner['status']
+    elif finished and len(finished) == len(backends) and all(result['status'] == 'ERROR' for result in finished):
+        #Every backend failed (bad solver name, worker crash, ...): that isn't running out of time
+        status = 'ERROR'
+    else:
+        status = 'TIMEOUT'
+    report = {
+        'status': status,
+        'schedule': winner['schedule'] if winner else None,
+        'winner': winner['backend'] if winner else None,
+        'time': time.time() - start,
+        'results': [{key: value for key, value in result.items() if key != 'schedule'} for result in finished],
+    }
+    if status == 'ERROR':
+        report['errors'] = {result['backend']: result.get('error') for result in finished}
+    if log_file is not None:
+        with open(log_file, "a") as f:
+            f.write(json.dumps({
+                'k': k,
+                'courses': len(graph),
+                'conflicts': graph.number_of_edges(),
+                'encoding': encoding,
+                'status': report['status'],
+                'winner': report['winner'],
+                'time': report['time'],
+                'results': report['results'],
+            }) + "\n")
+    return report
+
+
+def portfolio_wins(log_file):
+    """
+    Reads a portfolio log and counts how often each backend won, backend -> # of wins
+    """
+    wins = {}
+    with open(log_file) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry['winner'] is not None:
+                wins[entry['winner']] = wins.get(entry['winner'], 0) + 1
+    return wins
@@ -0,0 +1,307 @@
+import time
+from threading import Timer
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from pysat.examples.rc2 import RC2Stratified
+from pysat.formula import WCNF, IDPool
+
+from enrollment import EXCLUDE_COURSES
+from final_exam import translate_nodes, generate_clauses, decode_model
+from solve_final import solve_clauses
+from room_assign import match_rooms, place_unmatched, assign_rooms
+from instrument import timed, record
+
+
+"""
+Incremental rescheduling after add/drop, instead of rerunning final_exam.main on the new registrations.
+1. apply_delta: (student, course, 'add'/'drop') rows update the Enrollment's incidence matrix and the ConflictGraph's
+   weights in place. Only the rows of the students in the delta are looked at, the weight change is
+   new_rows^T new_rows - old_rows^T old_rows.
+2. reschedule: only conflicts touching a changed course can be new, so the region to repair starts as the courses of
+   those conflicts plus the courses without a slot. Everything outside the region keeps its slot (their slots are just
+   forbidden for their neighbors in the region). The region is solved as weighted MaxSAT: hard = k coloring,
+   soft = "course keeps its old slot" (RC2 tries the old slots as assumptions), so the fewest exams move.
+   If the region has no schedule it grows by its neighbors and is solved again, up to the whole graph.
+3. Rooms (optional): a course keeps its old room when it is still in the same slot and still fits, the others are
+   matched to the free rooms of their slot (room_assign.match_rooms), the local SMT fallback places what is left.
+"""
+
+DELTA_COLUMNS = ['Anonymized ID', 'Course Title', 'Action']
+
+
+def _delta_rows(delta):
+    #DataFrame (DELTA_COLUMNS) or an iterable of (student, course, action)
+    if isinstance(delta, pd.DataFrame):
+        return list(delta[DELTA_COLUMNS].itertuples(index=False, name=None))
+    return list(delta)
+
+
+def _slot(value):
+    #check_Sat schedules are course -> slot, check_SMT ones course -> [slot, room]
+    return value[0] if isinstance(value, (list, tuple)) else value
+
+
+@timed('apply_delta')
+def apply_delta(enrollment, graph, delta):
+    """
+    Applies add/drop rows to enrollment (Enrollment) and graph (ConflictGraph) in place.
+    delta: DataFrame with DELTA_COLUMNS, or (student, course, action) tuples, action is 'add' or 'drop' (later rows win).
+    Adding a registration that already exists or dropping one that doesn't is ignored. New students and courses are added,
+    new courses (except the study away placeholders) become graph nodes.
+    Returns the set of courses whose registrations changed
+    """
+    wanted = {}
+    for student, course, action in _delta_rows(delta):
+        action = str(action).lower()
+        if action not in ('add', 'drop'):
+            raise ValueError(f"Unknown action {action!r} for {student}, {course} (expected 'add' or 'drop')")
+        wanted[(student, course)] = action == 'add'
+
+    #New students and courses get the next codes
+    student_index = {student: i for i, student in enumerate(enrollment.students.tolist())}
+    new_students = [student for student, _ in wanted if student not in student_index]
+    new_courses = [course for _, course in wanted if course not in enrollment.course_index]
+    for student in dict.fromkeys(new_students):
+        student_index[student] = len(student_index)
+    for course in dict.fromkeys(new_courses):
+        enrollment.course_index[course] = len(enrollment.course_index)
+    if new_students:
+        enrollment.students = np.append(enrollment.students, list(dict.fromkeys(new_students)))
+    if new_courses:
+        enrollment.courses = np.append(enrollment.courses, np.asarray(list(dict.fromkeys(new_courses)), dtype=object))
+    incidence = enrollment.incidence
+    incidence.resize((len(enrollment.students), len(enrollment.courses)))
+
+    rows, cols, values = [], [], []
+    for (student, course), add in wanted.items():
+        i, j = student_index[student], enrollment.course_index[course]
+        if bool(incidence[i, j]) != add:
+            rows.append(i)
+            cols.append(j)
+            values.append(1 if add else -1)
+    changed = {enrollment.courses[j] for j in cols}
+    record(delta_rows=len(wanted), changes=len(values))
+    if not values:
+        return changed
+
+    students = np.unique(rows)
+    old_rows = incidence[students]
+    change = sparse.csr_matrix((values, (rows, cols)), shape=incidence.shape, dtype=incidence.dtype)
+    incidence = incidence + change
+    incidence.eliminate_zeros()
+    incidence.sort_indices()
+    enrollment.incidence = incidence
+    new_rows = incidence[students]
+    weight_change = (new_rows.T @ new_rows - old_rows.T @ old_rows).tocoo()
+    off_diagonal = weight_change.row != weight_change.col
+    i, j, w = weight_change.row[off_diagonal], weight_change.col[off_diagonal], weight_change.data[off_diagonal]
+
+    #Courses that now conflict with something, and new real courses, have to be nodes
+    needed = set(i.tolist()) | {enrollment.course_index[course] for course in new_courses if course not in EXCLUDE_COURSES}
+    for code in sorted(needed):
+        course = enrollment.courses[code]
+        if course not in graph.index:
+            graph.index[course] = len(graph.courses)
+            graph.courses.append(course)
+    n = len(graph.courses)
+    to_graph = np.asarray([graph.index.get(course, -1) for course in enrollment.courses.tolist()])
+    weights = graph.weights
+    weights.resize((n, n))
+    weights = weights + sparse.csr_matrix((w, (to_graph[i], to_graph[j])), shape=(n, n))
+    weights.eliminate_zeros()
+    weights.sort_indices()
+    graph.weights = weights
+    return changed
+
+
+def keep_slots_wcnf(graph, region, slots, k):
+    """
+    MaxSAT for re-slotting the region: k coloring of the region's courses, their neighbors outside the region keep their slots,
+    one soft clause (weight 1) per region course with an old slot for keeping it.
+    Returns (wcnf, reverse_translate)
+    """
+    subgraph = graph.subgraph(region)
+    translate_dict, reverse_translate = translate_nodes(subgraph)
+    wcnf = WCNF()
+    pool = IDPool(start_from=len(translate_dict) * k + 1)
+    for clause in generate_clauses(subgraph, k, translate_dict, pool=pool):
+        wcnf.append(clause)
+    inside = set(region)
+    for course in region:
+        translation = translate_dict[course] * k
+        for neighbor in graph.neighbors(course):
+            slot = slots.get(neighbor)
+            if neighbor not in inside and slot is not None and 1 <= slot <= k:
+                wcnf.append([-(translation + slot)])
+        old = slots.get(course)
+        if old is not None and 1 <= old <= k:
+            wcnf.append([translation + old], weight=1)
+    return wcnf, reverse_translate
+
+
+def solve_region(graph, region, slots, k, timeout=None, solver_name='g3'):
+    """
+    New slots for the region's courses with as few of them as possible leaving their old slot.
+    Returns (status, course -> slot), status is 'SAT', 'UNSAT' or 'TIMEOUT'
+    """
+    wcnf, reverse_translate = keep_slots_wcnf(graph, region, slots, k)
+    interrupted = []
+    with RC2Stratified(wcnf, solver=solver_name, adapt=True, exhaust=True, minz=True) as rc2:
+        def stop():
+            interrupted.append(True)
+            rc2.interrupt()
+        timer = None
+        if timeout is not None:
+            timer = Timer(max(timeout, 0), stop)
+            timer.start()
+        model = rc2.compute(expect_interrupt=timer is not None)
+        if timer is not None:
+            timer.cancel()
+    if model is not None:
+        return 'SAT', decode_model(model, k, reverse_translate)
+    return 'TIMEOUT' if interrupted else 'UNSAT', None
+
+
+def keep_rooms(slot_schedule, previous, room_list, room_capacity, enrollments):
+    """
+    Rooms for a new slot schedule, keeping each course's old room when it stays in its slot and still fits.
+    Returns (course -> [slot, room], list of courses without a room)
+    """
+    by_slot = {}
+    for course, slot in slot_schedule.items():
+        by_slot.setdefault(slot, []).append(course)
+    schedule = {}
+    unplaced = []
+    for slot, courses in by_slot.items():
+        kept = {}
+        for course in courses:
+            old = previous.get(course)
+            if (isinstance(old, (list, tuple)) and old[0] == slot and old[1] in room_capacity
+                    and room_capacity[old[1]] >= enrollments.get(course, 0) and old[1] not in kept.values()):
+                kept[course] = old[1]
+        rest = [course for course in courses if course not in kept]
+        free = [room for room in room_list if room not in set(kept.values())]
+        rooms, missing = match_rooms(rest, free, room_capacity, enrollments)
+        if missing:
+            #Keeping the old rooms blocks a matching, rematch the whole slot
+            kept = {}
+            rooms, missing = match_rooms(courses, room_list, room_capacity, enrollments)
+        for course, room in {**kept, **rooms}.items():
+            schedule[course] = [slot, room]
+        unplaced.extend(missing)
+    return schedule, unplaced
+
+
+def full_solve(graph, k, room_list=None, room_capacity=None, enrollments=None):
+    """
+    From scratch SAT coloring (+ room matching), what rerunning the pipeline would do. Returns the schedule or None
+    """
+    translate_dict, reverse_translate = translate_nodes(graph)
+    status, model = solve_clauses(generate_clauses(graph, k, translate_dict))
+    if status != 'SAT':
+        return None
+    schedule = decode_model(model, k, reverse_translate)
+    if room_list is not None:
+        schedule, _ = assign_rooms(schedule, room_list, room_capacity, enrollments)
+    return schedule
+
+
+def _moved(previous, schedule):
+    return {course: (_slot(previous[course]), _slot(value)) for course, value in schedule.items()
+            if course in previous and _slot(previous[course]) != _slot(value)}
+
+
+@timed('reschedule')
+def reschedule(graph, previous, k, changed, room_list=None, room_capacity=None, enrollments=None, timeout=None, compare_full=False):
+    """
+    Repairs previous (course -> slot, or course -> [slot, room]) after the courses in changed got new registrations
+    (see apply_delta), moving as few exams as possible.
+    room_list, room_capacity, enrollments: also keep/repair rooms (the result is then course -> [slot, room])
+    timeout: seconds for each region solve, compare_full: also time a from scratch solve for comparison
+    Returns a dict with
+    - status: 'SAT', 'UNSAT' or 'TIMEOUT', schedule: the new schedule (None unless SAT)
+    - moved: course -> (old slot, new slot), room_changes: course -> (old room, new room), added: courses that had no slot
+    - region: # of courses re-solved in the last round, rounds: # of region solves
+    - time: seconds, full_time / full_moved: the same for a from scratch solve (compare_full only)
+    """
+    start = time.time()
+    slots = {course: _slot(value) for course, value in previous.items() if course in graph.index}
+    added = [course for course in graph if course not in slots]
+    conflicting = set()
+    for course in changed:
+        if course not in graph.index or course not in slots:
+            continue
+        for neighbor in graph.neighbors(course):
+            if slots.get(neighbor) == slots[course]:
+                conflicting.update((course, neighbor))
+    region = list(dict.fromkeys(added + sorted(conflicting, key=str)))
+
+    status = 'SAT'
+    new_slots = dict(slots)
+    rounds = 0
+    while region:
+        rounds += 1
+        status, region_slots = solve_region(graph, region, slots, k, timeout)
+        if status == 'SAT':
+            new_slots.update(region_slots)
+            break
+        if status == 'TIMEOUT' or len(region) == len(graph):
+            break
+        #No schedule with only these courses moving, let their neighbors move too
+        grown = set(region)
+        for course in region:
+            grown.update(graph.neighbors(course))
+        region = region + [course for course in graph if course in grown and course not in set(region)]
+    record(region=len(region), rounds=rounds)
+
+    report = {'status': status, 'schedule': None, 'moved': {}, 'room_changes': {}, 'added': added,
+              'region': len(region), 'rounds': rounds}
+    if status == 'SAT':
+        schedule = {course: new_slots[course] for course in graph}
+        if room_list is not None:
+            schedule, unplaced = keep_rooms(schedule, previous, room_list, room_capacity, enrollments)
+            if unplaced and not place_unmatched(unplaced, schedule, graph, k, room_list, room_capacity, enrollments, timeout):
+                print("No room assignment found for:", unplaced)
+                report['status'] = 'UNSAT'
+                schedule = None
+            elif schedule is not None:
+                report['room_changes'] = {course: (previous[course][1], value[1]) for course, value in schedule.items()
+                                          if isinstance(previous.get(course), (list, tuple)) and previous[course][1] != value[1]}
+        report['schedule'] = schedule
+        if schedule is not None:
+            report['moved'] = _moved(previous, schedule)
+    report['time'] = time.time() - start
+
+    if compare_full:
+        full_start = time.time()
+        full = full_solve(graph, k, room_list, room_capacity, enrollments)
+        report['full_time'] = time.time() - full_start
+        report['full_moved'] = len(_moved(previous, full)) if full is not None else None
+    return report
+
+
+def update_schedule(enrollment, graph, previous, delta, k, room_list=None, room_capacity=None, enrollments=None, timeout=None,
+                    compare_full=False):
+    """
+    apply_delta + reschedule in one call.
+    enrollments: needed with room_list, course -> # of registration rows (data['Course Title'].value_counts(), the sizes every
+                 other room path uses). Updated in place with the delta's adds and drops, like enrollment and graph.
+    Returns the reschedule report plus 'changed' (courses in the delta) and 'update_time' (apply_delta seconds)
+    """
+    if room_list is not None and enrollments is None:
+        raise ValueError("update_schedule with room_list needs the enrollments (course -> # of registration rows)")
+    start = time.time()
+    before = enrollment.course_sizes() if enrollments is not None else None
+    changed = apply_delta(enrollment, graph, delta)
+    if enrollments is not None:
+        #Every applied add/drop changes a course by one student, same as its # of rows
+        after = enrollment.course_sizes()
+        for course in changed:
+            enrollments[course] = enrollments.get(course, 0) + after[course] - before.get(course, 0)
+    update_time = time.time() - start
+    report = reschedule(graph, previous, k, changed, room_list, room_capacity, enrollments, timeout, compare_full)
+    report['changed'] = sorted(changed, key=str)
+    report['update_time'] = update_time
+    return report
@@ -0,0 +1,229 @@
+import time
+from bisect import bisect_left
+
+from final_exam import coloring_status
+from rooms import RoomCatalogue, load_rooms
+
+
+"""
+Two stage scheduling, instead of one SMT problem with a room constraint for every pair of courses:
+1. Slots: SAT slot coloring of the conflict graph. With room_aware=True each slot is also limited to what the rooms can hold
+   (no more courses bigger than c in a slot than there are rooms bigger than c, for every room capacity c).
+   These limits are added lazily: only the ones a coloring actually broke are added before solving again.
+   Before any SAT solve, k below the pigeonhole bound of the limits is UNSAT right away, and a short room aware tabu
+   search (localsearch.py) runs first: its schedule is used as is when it has no conflict and fits the rooms,
+   otherwise it is the SAT solver's starting phases.
+2. Rooms: inside a slot, courses only compete with each other, so every slot is matched on its own.
+   A course fits the rooms at least as big as its enrollment, these sets are nested, so giving the biggest course the smallest room
+   that still fits, then the next biggest, ... finds a matching whenever one exists.
+If a slot still can't be matched (e.g. the slots came from somewhere else), the courses that didn't fit are placed with a
+small local SMT solve over the free (slot, room) pairs.
+The result is the same course -> [slot, room] schedule as solve_SMT_LIA, with a 'SAT', 'UNSAT' or 'TIMEOUT' status.
+"""
+
+#Seconds for the room aware tabu search before the SAT slot coloring (at most a quarter of the timeout)
+ROOM_SEARCH_TIMEOUT = 10
+
+
+def room_slot_limits(courses, room_list, room_capacity, enrollments):
+    """
+    Per slot limits for generate_clauses: for every room capacity level c (and 0),
+    at most (# of rooms bigger than c) of the courses bigger than c in one slot.
+    Together these are exactly the conditions for a slot's courses to have a room matching.
+    """
+    capacities = sorted(room_capacity[room] for room in room_list)
+    limits = []
+    for level in [0] + sorted(set(capacities)):
+        bigger = [course for course in courses if enrollments[course] > level]
+        bound = len(capacities) - bisect_left(capacities, level + 1)
+        if len(bigger) > bound:
+            limits.append((bigger, bound))
+    return limits
+
+
+def room_slot_bound(limits):
+    """
+    Smallest k the room limits allow: the courses bigger than a level need at least ceil(# of them / bound) slots
+    """
+    return max((-(-len(bigger) // bound) for bigger, bound in limits if bound > 0), default=1)
+
+
+def broken_limits(slot_schedule, limits):
+    """
+    The (courses, bound) limits that some slot of slot_schedule goes over
+    """
+    by_slot = {}
+    for course, slot in slot_schedule.items():
+        by_slot.setdefault(slot, set()).add(course)
+    return [(bigger, bound) for bigger, bound in limits
+            if any(len(courses.intersection(bigger)) > bound for courses in by_slot.values())]
+
+
+def match_rooms(courses, room_list, room_capacity, enrollments):
+    """
+    Greedy largest-first matching for the courses of one slot: biggest course first, each gets the smallest free room that fits.
+    Returns (course -> room, list of courses that didn't get a room)
+    """
+    free = sorted(room_list, key=lambda room: room_capacity[room])
+    sizes = [room_capacity[room] for room in free]
+    rooms = {}
+    unplaced = []
+    for course in sorted(courses, key=lambda course: enrollments[course], reverse=True):
+        index = bisect_left(sizes, enrollments[course])
+        if index == len(free):
+            unplaced.append(course)
+            continue
+        rooms[course] = free.pop(index)
+        sizes.pop(index)
+    return rooms, unplaced
+
+
+def place_unmatched(unplaced, schedule, graph, k, room_list, room_capacity, enrollments, timeout=None):
+    """
+    Local SMT fallback: finds a (slot, room) for each unplaced course among the pairs nobody uses yet,
+    without conflicts with the courses already in that slot or with each other.
+    schedule: course -> [slot, room] of the placed courses, updated in place.
+    Returns True if every course was placed, False if they can't be, None if the solver ran out of time
+    """
+    from z3 import Solver, Int, Or, And, Distinct, sat, unsat
+    used = {(slot, room) for slot, room in schedule.values()}
+    slot_courses = {slot: set() for slot in range(1, k+1)}
+    for course, (slot, room) in schedule.items():
+        slot_courses[slot].add(course)
+
+    solver = Solver()
+    if timeout is not None:
+        solver.set('timeout', int(timeout * 1000))
+    exam_time = {course: Int(f"{course}_time") for course in unplaced}
+    exam_room = {course: Int(f"{course}_room") for course in unplaced}
+    for course in unplaced:
+        options = []
+        for slot in range(1, k+1):
+            if any(neighbor in slot_courses[slot] for neighbor in graph.neighbors(course)):
+                continue
+            for i, room in enumerate(room_list, start=1):
+                if (slot, room) not in used and room_capacity[room] >= enrollments[course]:
+                    options.append(And(exam_time[course] == slot, exam_room[course] == i))
+        solver.add(Or(options or [False]))
+    #The unplaced courses can't share a (slot, room) or a slot with a conflicting course
+    if len(unplaced) > 1:
+        solver.add(Distinct([exam_time[course] * (len(room_list) + 1) + exam_room[course] for course in unplaced]))
+    unplaced_set = set(unplaced)
+    for course in unplaced:
+        for neighbor in graph.neighbors(course):
+            if neighbor in unplaced_set and str(course) < str(neighbor):
+                solver.add(exam_time[course] != exam_time[neighbor])
+
+    result = solver.check()
+    if result != sat:
+        return False if result == unsat else None
+    model = solver.model()
+    for course in unplaced:
+        schedule[course] = [model[exam_time[course]].as_long(), room_list[model[exam_room[course]].as_long()-1]]
+    return True
+
+
+def assign_rooms(slot_schedule, room_list, room_capacity, enrollments):
+    """
+    Matches the courses of every slot to rooms.
+    Returns (course -> [slot, room] for the matched courses, list of courses without a room)
+    """
+    by_slot = {}
+    for course, slot in slot_schedule.items():
+        by_slot.setdefault(slot, []).append(course)
+    schedule = {}
+    unplaced = []
+    for slot in sorted(by_slot):
+        rooms, missing = match_rooms(by_slot[slot], room_list, room_capacity, enrollments)
+        for course, room in rooms.items():
+            schedule[course] = [slot, room]
+        unplaced.extend(missing)
+    return schedule, unplaced
+
+
+def two_stage_solve(graph, k, room_list, room_capacity, enrollments, slot_schedule=None, encoding='pairwise', room_aware=True,
+                    symmetry_breaking=False, timeout=None):
+    """
+    Slot coloring, then per slot room matching (see the top of this file).
+    slot_schedule: optional course -> slot (1..k) to start from instead of the SAT coloring (e.g. DSATUR when it fits in k).
+                   ValueError if it uses a slot outside 1..k
+    room_aware: add the room count limits to the SAT coloring so every slot can be matched
+    timeout: time limit in seconds for the whole solve, the SAT colorings and the local SMT fallback share it
+    Returns (status 'SAT', 'UNSAT' or 'TIMEOUT', schedule course -> [slot, room] or None, dict of stage timings)
+    """
+    if slot_schedule is not None:
+        outside = sorted({slot for slot in slot_schedule.values() if not 1 <= slot <= k})
+        if outside:
+            raise ValueError(f"slot_schedule uses slots {outside} outside 1..{k}")
+    deadline = None if timeout is None else time.time() + timeout
+
+    def remaining():
+        #z3 reads a 0 ms timeout as none at all
+        return None if deadline is None else max(deadline - time.time(), 0.001)
+
+    timings = {}
+    courses = list(graph.nodes())
+    rooms = RoomCatalogue(room_list, [room_capacity[room] for room in room_list])
+    if not rooms.check_sizes(courses, enrollments):
+        return 'UNSAT', None, timings
+
+    start = time.time()
+    status = 'SAT'
+    if slot_schedule is None:
+        all_limits = room_slot_limits(courses, room_list, room_capacity, enrollments) if room_aware else []
+        warm_start = False
+        if room_aware:
+            needed = room_slot_bound(all_limits)
+            if k < needed:
+                print(f"UNSAT, NO SOLUTION: the rooms need at least {needed} slots, k = {k}")
+                timings['slots'] = time.time() - start
+                return 'UNSAT', None, timings
+            from localsearch import local_search_solve
+            search_time = ROOM_SEARCH_TIMEOUT if deadline is None else min(ROOM_SEARCH_TIMEOUT, remaining() / 4)
+            searched = local_search_solve(graph, k, timeout=search_time, restarts=1, workers=1, enrollments=enrollments,
+                                          room_list=room_list, room_capacity=room_capacity)
+            timings['room_search'] = time.time() - start
+            if searched is not None:
+                warm_start = {course: value[0] if isinstance(value, list) else value
+                              for course, value in searched['schedule'].items()}
+                if searched['cost'] == 0 and not broken_limits(warm_start, all_limits):
+                    #Already conflict free and every slot has a room matching
+                    slot_schedule = warm_start
+        slot_limits = []
+        searching = slot_schedule is None
+        while searching:
+            status, slot_schedule = coloring_status(graph, k, encoding=encoding, symmetry_breaking=symmetry_breaking,
+                                                    warm_start=warm_start, slot_limits=slot_limits, timeout=remaining())
+            broken = broken_limits(slot_schedule, all_limits) if slot_schedule is not None else []
+            if not broken:
+                break
+            slot_limits.extend(broken)
+        timings['room_limits'] = len(slot_limits)
+    timings['slots'] = time.time() - start
+    if slot_schedule is None:
+        return status, None, timings
+
+    start = time.time()
+    schedule, unplaced = assign_rooms(slot_schedule, room_list, room_capacity, enrollments)
+    timings['rooms'] = time.time() - start
+
+    if unplaced:
+        start = time.time()
+        placed = place_unmatched(unplaced, schedule, graph, k, room_list, room_capacity, enrollments, remaining())
+        timings['fallback'] = time.time() - start
+        if not placed:
+            print("No room assignment found for:", unplaced)
+            return 'UNSAT' if placed is False else 'TIMEOUT', None, timings
+    return 'SAT', schedule, timings
+
+
+def two_stage_SMT_solve(graph, data, filename, k, **options):
+    """
+    Drop in for final_exam.SMT_solve: reads the rooms and enrollments the same way and returns
+    (schedule, room_list, room_capacities, enrollments) for check_SMT
+    """
+    rooms = load_rooms(filename)
+    enrollments = data['Course Title'].value_counts().to_dict()
+    status, schedule, timings = two_stage_solve(graph, k, rooms.room_list, rooms.room_capacity, enrollments, **options)
+    print("Two stage:", status, timings)
+    return schedule, rooms.room_list, rooms.room_capacity, enrollments
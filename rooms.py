@@ -0,0 +1,99 @@
+from bisect import bisect_left
+
+import pandas as pd
+
+
+"""
+Exam rooms, loaded once per file and sorted by capacity (EMS).
+Because the rooms are sorted, the rooms a course fits in are always the last ones of the list: a course of size n
+fits rooms first_fit(n) .. # of rooms, found by binary search. The solvers get that room domain for every course
+instead of one capacity implication per (course, room) pair.
+"""
+
+#filename -> RoomCatalogue
+_catalogues = {}
+
+
+class RoomCatalogue:
+    """
+    - room_list: room names ("Building Room"), smallest capacity first
+    - room_capacity: room name -> capacity (EMS)
+    - capacities: the capacities in room_list order (sorted), for the binary searches
+    """
+
+    def __init__(self, names, capacities):
+        #Stable sort, rooms with the same capacity keep the order of the file
+        order = sorted(range(len(names)), key=lambda i: capacities[i])
+        self.room_list = [names[i] for i in order]
+        self.capacities = [capacities[i] for i in order]
+        self.room_capacity = dict(zip(self.room_list, self.capacities))
+
+    @classmethod
+    def from_csv(cls, filename):
+        rooms = pd.read_csv(filename)
+        names = (rooms['Building'] + ' ' + rooms['Room'].astype(str)).tolist()
+        return cls(names, rooms['EMS'].tolist())
+
+    def __len__(self):
+        return len(self.room_list)
+
+    def largest(self):
+        return self.capacities[-1] if self.capacities else 0
+
+    def first_fit(self, enrollment):
+        """
+        Index (0 based) of the smallest room that holds enrollment students, len(self) if none does
+        """
+        return bisect_left(self.capacities, enrollment)
+
+    def feasible_rooms(self, enrollment):
+        """
+        Names of the rooms big enough for enrollment students, smallest first
+        """
+        return self.room_list[self.first_fit(enrollment):]
+
+    def domains(self, courses, enrollments):
+        """
+        course -> list of the 1 based room numbers (room_list order) the course fits in, always a range ending at the biggest room.
+        Empty if no room is big enough
+        """
+        return {course: list(range(self.first_fit(enrollments[course]) + 1, len(self) + 1)) for course in courses}
+
+    def oversized(self, courses, enrollments):
+        """
+        Courses bigger than every room, these can never be scheduled
+        """
+        largest = self.largest()
+        return [course for course in courses if enrollments[course] > largest]
+
+    def check_sizes(self, courses, enrollments):
+        """
+        Prints the courses no room can hold, returns True if every course fits somewhere.
+        Catches the problem before it turns into a slow UNSAT in the solver
+        """
+        too_big = self.oversized(courses, enrollments)
+        if too_big:
+            print(f"No room is big enough for (largest room holds {self.largest()}):")
+            for course in too_big:
+                print(f"    {course}: {enrollments[course]} students")
+        return not too_big
+
+
+def load_rooms(filename):
+    """
+    The RoomCatalogue of filename, read from disk the first time only
+    """
+    catalogue = _catalogues.get(filename)
+    if catalogue is None:
+        catalogue = _catalogues[filename] = RoomCatalogue.from_csv(filename)
+    return catalogue
+
+
+def room_domains(courses, classroom_list, classroom_capacity, enrollments):
+    """
+    course -> list of the 1 based room numbers (classroom_list order) that can hold it,
+    for room lists that didn't come from a RoomCatalogue (any order)
+    """
+    by_size = sorted(range(len(classroom_list)), key=lambda i: classroom_capacity[classroom_list[i]])
+    sizes = [classroom_capacity[classroom_list[i]] for i in by_size]
+    return {course: sorted(i + 1 for i in by_size[bisect_left(sizes, enrollments[course]):]) for course in courses}
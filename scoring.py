@@ -0,0 +1,137 @@
+import numpy as np
+from scipy import sparse
+
+from instrument import timed
+
+
+"""
+Student burden of a schedule without looping over student_dict.
+The (students x courses) incidence matrix B is built once. A schedule is a (courses x slots) 0/1 matrix S
+(column 0 = no slot), so H = S^T @ B^T is every student's slot histogram: H[t, s] = # of exams student s has in slot t.
+Many schedules are scored at once by stacking their S^T matrices, one sparse product for the whole batch
+(schedule major, so every metric below is a reduction over contiguous memory).
+Metrics (all counts, lower is better):
+- conflicts: pairs of exams of one student in the same slot (the same number as heuristic.conflict_cost)
+- conflict_students: students with two exams in one slot
+- back_to_back: pairs of consecutive slots on the same day where a student has an exam in both
+- multi_exam_days: (student, day) with two or more exams, three_exam_days: with three or more
+- unscheduled: (student, exam) pairs whose exam has no slot (i.e. left out by the soft solve), unscheduled_students
+Slots are numbered 1..k and grouped into days of slots_per_day consecutive slots.
+"""
+
+METRICS = ['conflicts', 'conflict_students', 'back_to_back', 'multi_exam_days', 'three_exam_days', 'unscheduled',
+           'unscheduled_students']
+
+#score_many scores at most this many schedules per sparse product, the dense (schedules, k+1, students) histograms
+#and the temporaries of the metrics are built one chunk at a time
+SCORE_CHUNK = 64
+
+#Weights of the combined penalty (see ScheduleScorer.penalty)
+DEFAULT_WEIGHTS = {'conflicts': 1000, 'unscheduled': 1000, 'three_exam_days': 10, 'back_to_back': 1}
+
+
+class ScheduleScorer:
+    """
+    Scores course -> slot schedules (or course -> [slot, room]) for one set of registrations.
+    enrollment: Enrollment, courses: the courses schedules are over (defaults to every course of the enrollment),
+    k: # of slots, slots_per_day: slots in one exam day
+    """
+
+    def __init__(self, enrollment, k, courses=None, slots_per_day=3):
+        if courses is None:
+            courses = enrollment.courses.tolist()
+        self.courses = list(courses)
+        self.index = {course: i for i, course in enumerate(self.courses)}
+        self.k = k
+        self.slots_per_day = slots_per_day
+        columns = [enrollment.course_index[course] for course in self.courses]
+        incidence = enrollment.incidence[:, columns].tocsr().astype(np.int32)
+        #Only students with at least one of the courses matter
+        has_course = np.diff(incidence.indptr) > 0
+        self.students = enrollment.students[has_course]
+        #Stored transposed (courses x students), the side the products need
+        self.incidence_t = incidence[has_course].T.tocsr()
+        #same_day[t] is True if slots t+1 and t+2 are on the same day
+        slots = np.arange(1, k)
+        self.same_day = ((slots - 1) // slots_per_day == slots // slots_per_day)[:, None]
+        self.days = -(-k // slots_per_day)
+
+    def slot_array(self, schedule):
+        """
+        Slot of every course (in self.courses order) as an int array, 0 for courses not in schedule or out of 1..k
+        """
+        slots = np.zeros(len(self.courses), dtype=np.int64)
+        for course, value in schedule.items():
+            i = self.index.get(course)
+            if i is not None:
+                slot = value[0] if isinstance(value, (list, tuple)) else value
+                slots[i] = slot if slot is not None and 1 <= slot <= self.k else 0
+        return slots
+
+    def histograms(self, slot_arrays):
+        """
+        (schedules, k+1, students) slot histograms of a (schedules, courses) array of slots, slot 0 counts unscheduled exams
+        """
+        slot_arrays = np.atleast_2d(np.asarray(slot_arrays, dtype=np.int64))
+        m, n = slot_arrays.shape
+        width = self.k + 1
+        #One row per course, one 1 per schedule: S of every schedule side by side, built straight in CSR
+        assignment = sparse.csr_matrix((np.ones(m * n, dtype=np.int32), (np.arange(m) * width + slot_arrays.T).ravel(),
+                                        np.arange(0, m * n + 1, m)), shape=(n, m * width))
+        histogram = (assignment.T.tocsr() @ self.incidence_t).toarray()
+        return histogram.reshape(m, width, -1)
+
+    def score_many(self, slot_arrays, chunk=SCORE_CHUNK):
+        """
+        Metrics of a batch of schedules given as a (schedules, courses) array of slots (see slot_array).
+        chunk: # of schedules scored together, memory is bounded by the chunk, not the batch
+        Returns a dict metric -> array with one value per schedule
+        """
+        slot_arrays = np.atleast_2d(np.asarray(slot_arrays, dtype=np.int64))
+        if len(slot_arrays) <= chunk:
+            return self._score_chunk(slot_arrays)
+        parts = [self._score_chunk(slot_arrays[i:i + chunk]) for i in range(0, len(slot_arrays), chunk)]
+        return {metric: np.concatenate([part[metric] for part in parts]) for metric in METRICS}
+
+    def _score_chunk(self, slot_arrays):
+        histogram = self.histograms(slot_arrays)
+        m, _, students = histogram.shape
+        missing = histogram[:, 0]
+        exams = histogram[:, 1:]
+        occupied = exams > 0
+
+        if self.k % self.slots_per_day:
+            #Pad the last day with empty slots
+            exams = np.concatenate([exams, np.zeros((m, self.days * self.slots_per_day - self.k, students), dtype=exams.dtype)], axis=1)
+        per_day = exams.reshape(m, self.days, self.slots_per_day, students).sum(axis=2)
+
+        def count(values):
+            return np.count_nonzero(values.reshape(m, -1), axis=1)
+        return {
+            'conflicts': (exams * (exams - 1)).reshape(m, -1).sum(axis=1) // 2,
+            'conflict_students': count((exams > 1).any(axis=1)),
+            'back_to_back': count(occupied[:, :-1] & occupied[:, 1:] & self.same_day),
+            'multi_exam_days': count(per_day >= 2),
+            'three_exam_days': count(per_day >= 3),
+            'unscheduled': missing.sum(axis=1),
+            'unscheduled_students': count(missing > 0),
+        }
+
+    @timed('score')
+    def score(self, schedule):
+        """
+        Metrics of one schedule as a dict metric -> int
+        """
+        return {metric: int(values[0]) for metric, values in self.score_many(self.slot_array(schedule)).items()}
+
+    def penalty(self, metrics, weights=DEFAULT_WEIGHTS):
+        """
+        Weighted sum of the metrics (a score or score_many result), one number for search heuristics to minimize
+        """
+        return sum(weight * metrics[metric] for metric, weight in weights.items())
+
+    def per_student(self, schedule):
+        """
+        (students, k+1) slot histogram of one schedule, row i is self.students[i] (the students taking at least one of the courses)
+        """
+        return self.histograms(self.slot_array(schedule))[0].T
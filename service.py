@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import contextlib
+import http.client
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cache import load_cached, CACHE_DIR
+from rooms import RoomCatalogue
+from parallel import color_task, terminate_pool, DEFAULT_WORKERS
+from heuristic import dsatur
+from room_assign import two_stage_solve
+from maxsat import min_conflict_solve
+from localsearch import local_search_solve
+from min_slots import find_min_slots
+from Assignment_Check import validate_schedule
+from scoring import ScheduleScorer
+
+
+"""
+Scheduling daemon: the registrations, conflict graph and room catalogue are parsed once and stay in memory, so a what-if
+question ("k=6?", "without room X?") costs a solve instead of a new python final_exam.py process.
+- asyncio HTTP/1.1 server on a TCP port or a Unix socket, JSON in and out, one request per connection
+- solves run in a ProcessPoolExecutor whose workers load the same data once at startup (from the .data_cache entry
+  the server just wrote), requests are answered concurrently up to the # of workers and queue after that
+- every request has a timeout: it bounds the whole solve of every method, and the server stops waiting timeout + REQUEST_GRACE
+  seconds later. A worker can't be stopped mid-solve, so after such a 504 the pool is replaced by a new one for the next
+  requests, and the old pool (with the stuck worker) is terminated once its other requests are answered or time out
+Endpoints:
+    GET  /health   courses, students, rooms, workers
+    GET  /rooms    the room catalogue
+    POST /solve    {"k": 6, "method": "two_stage", "timeout": 30, "drop_rooms": ["..."]}
+                   -> status, schedule (course -> slot, or course -> [slot, room]), valid, violations, burden, time
+    POST /score    {"k": 6, "schedule": {...}} -> violations and burden of a schedule made elsewhere
+Run with: python service.py --port 8765 (or --unix /tmp/final_exam.sock), query with ask("/solve", {...}).
+"""
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+DEFAULT_TIMEOUT = 60
+#Extra seconds the server waits for a worker after the request's timeout
+REQUEST_GRACE = 5
+
+#method -> does it place rooms
+METHODS = {'sat': False, 'greedy': False, 'maxsat': False, 'min_slots': False, 'two_stage': True, 'tabu': True}
+
+#Data of this process (the server or one pool worker)
+_state = None
+
+
+def load_state(registration_file, room_file, cache_dir=CACHE_DIR):
+    """
+    Everything a request needs: graph, Enrollment, rooms (RoomCatalogue), enrollments (course -> # of registrations)
+    """
+    data, course_list, enrollment, graph, rooms = load_cached(registration_file, room_file, cache_dir)
+    return {
+        'registration_file': registration_file,
+        'graph': graph,
+        'enrollment': enrollment,
+        'rooms': rooms,
+        'enrollments': data['Course Title'].value_counts().to_dict(),
+        'scorers': {},
+    }
+
+
+def _init_worker(registration_file, room_file, cache_dir):
+    global _state
+    #Ctrl-C goes to the whole process group, only the server handles it (and shuts the pool down)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _state = load_state(registration_file, room_file, cache_dir)
+
+
+def _jsonable(schedule):
+    #numpy ints and tuples don't survive json.dumps
+    return {str(course): [int(value[0]), str(value[1])] if isinstance(value, (list, tuple)) else int(value)
+            for course, value in schedule.items()}
+
+
+def without_rooms(rooms, dropped):
+    """
+    RoomCatalogue minus the dropped room names (ValueError for a name that isn't in it)
+    """
+    unknown = [room for room in dropped if room not in rooms.room_capacity]
+    if unknown:
+        raise ValueError(f"Unknown rooms: {unknown}")
+    dropped = set(dropped)
+    kept = [room for room in rooms.room_list if room not in dropped]
+    return RoomCatalogue(kept, [rooms.room_capacity[room] for room in kept])
+
+
+def parse_solve_request(request, rooms):
+    """
+    Checks a /solve body, returns (method, k, timeout, rooms without the dropped ones). Raises ValueError
+    """
+    if not isinstance(request, dict) or 'k' not in request:
+        raise ValueError("Expected a JSON object with at least k")
+    method = request.get('method', 'two_stage')
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {sorted(METHODS)}")
+    k = int(request['k'])
+    if k < 1:
+        raise ValueError("k must be at least 1")
+    timeout = float(request.get('timeout', DEFAULT_TIMEOUT))
+    return method, k, timeout, without_rooms(rooms, request.get('drop_rooms', []))
+
+
+def _solve(method, graph, k, rooms, enrollments, timeout):
+    #Returns (status, schedule, extra response fields)
+    if method == 'sat':
+        status, schedule = color_task(graph, k, timeout=timeout)
+        return status, schedule, {}
+    if method == 'greedy':
+        schedule = dsatur(graph, enrollments)
+        used = max(schedule.values(), default=0)
+        return ('SAT', schedule, {}) if used <= k else ('UNKNOWN', None, {'slots_used': used})
+    if method == 'two_stage':
+        status, schedule, timings = two_stage_solve(graph, k, rooms.room_list, rooms.room_capacity, enrollments, timeout=timeout)
+        return status, schedule, {'stages': timings}
+    if method == 'maxsat':
+        result = min_conflict_solve(graph, k, timeout=timeout, enrollments=enrollments)
+        return result['status'], result['schedule'], {key: result[key] for key in ('cost', 'lower_bound', 'gap')}
+    if method == 'tabu':
+        result = local_search_solve(graph, k, timeout=timeout, workers=1, enrollments=enrollments,
+                                    room_list=rooms.room_list, room_capacity=rooms.room_capacity)
+        if result is None:
+            return 'TIMEOUT', None, {}
+        #Like maxsat: TIMEOUT = best schedule found in the time budget, still with conflicts or rooms over their limits
+        status = 'SAT' if result['cost'] == 0 and result['room_excess'] == 0 else 'TIMEOUT'
+        return status, result['schedule'], {'cost': result['cost'], 'room_excess': result['room_excess'], 'unplaced': result['unplaced']}
+    #min_slots: k is the largest # of slots to try
+    result = find_min_slots(graph, k, symmetry_breaking=True, timeout=timeout)
+    meta = {'min_k': result['k'], 'proven': result['proven']}
+    if result['k'] is None:
+        #UNSAT only when k itself is proven infeasible, not when it ran out of time
+        timed_out = any(step['sat'] is None for step in result['steps'])
+        return 'TIMEOUT' if timed_out else 'UNSAT', None, meta
+    return 'SAT', result['schedule'], meta
+
+
+def _scorer(state, k):
+    if k not in state['scorers']:
+        state['scorers'][k] = ScheduleScorer(state['enrollment'], k, list(state['graph']))
+    return state['scorers'][k]
+
+
+def quality(state, schedule, k, rooms=None):
+    """
+    Violation counts (Assignment_Check.validate_schedule) and student burden (scoring.py) of a schedule
+    """
+    graph = state['graph']
+    has_rooms = rooms is not None and any(isinstance(value, (list, tuple)) for value in schedule.values())
+    if has_rooms:
+        report = validate_schedule(graph, schedule, rooms.room_capacity, state['enrollments'])
+    else:
+        report = validate_schedule(graph, {course: value[0] if isinstance(value, (list, tuple)) else value
+                                           for course, value in schedule.items()})
+    return {
+        'valid': report['valid'],
+        'violations': {key: len(value) for key, value in report.items() if key != 'valid'},
+        'burden': _scorer(state, k).score(schedule),
+    }
+
+
+def solve_request(request):
+    """
+    Worker: answers one /solve body with the resident data, returns a JSON ready dict
+    """
+    start = time.time()
+    method, k, timeout, rooms = parse_solve_request(request, _state['rooms'])
+    #The solvers print their progress, keep it out of the daemon's output
+    with contextlib.redirect_stdout(io.StringIO()):
+        status, schedule, extra = _solve(method, _state['graph'], k, rooms, _state['enrollments'], timeout)
+    response = {'method': method, 'k': k, 'status': status, 'schedule': None, **extra}
+    if schedule is not None:
+        response['schedule'] = _jsonable(schedule)
+        response.update(quality(_state, schedule, k, rooms if METHODS[method] else None))
+    response['time'] = time.time() - start
+    return response
+
+
+class SchedulingService:
+    """
+    The asyncio side: holds the data for the cheap endpoints and hands solves to the worker pool
+    """
+
+    def __init__(self, registration_file, room_file, workers=None, cache_dir=CACHE_DIR):
+        global _state
+        start = time.time()
+        self.state = _state = load_state(registration_file, room_file, cache_dir)
+        self.workers = workers or DEFAULT_WORKERS
+        self.pool_args = (registration_file, room_file, cache_dir)
+        self.executor = self.start_pool()
+        #executor -> # of requests it is still running, and the pools replaced after a 504
+        self.in_flight = {}
+        self.retired = set()
+        self.load_time = time.time() - start
+
+    def start_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=self.pool_args)
+
+    def retire(self, executor):
+        """
+        A request on executor timed out and its worker may still be solving: new requests go to a fresh pool,
+        executor is terminated when none of its requests are left
+        """
+        if executor is self.executor:
+            self.executor = self.start_pool()
+        self.retired.add(executor)
+
+    async def route(self, method, path, body):
+        """
+        Returns (HTTP status, JSON ready dict)
+        """
+        state = self.state
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'ok', 'registrations': state['registration_file'], 'courses': len(state['graph']),
+                         'students': len(state['enrollment']), 'rooms': len(state['rooms'].room_list),
+                         'workers': self.workers, 'load_time': self.load_time}
+        if method == 'GET' and path == '/rooms':
+            return 200, {'rooms': state['rooms'].room_capacity}
+        if method != 'POST' or path not in ('/solve', '/score'):
+            return 404, {'error': f"No endpoint {method} {path}"}
+
+        try:
+            request = json.loads(body or b'{}')
+            if path == '/score':
+                schedule, k = request['schedule'], int(request['k'])
+                return 200, quality(state, schedule, k, state['rooms'])
+            _, _, timeout, _ = parse_solve_request(request, state['rooms'])
+        except (ValueError, KeyError, TypeError) as exc:
+            return 400, {'error': str(exc)}
+
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        self.in_flight[executor] = self.in_flight.get(executor, 0) + 1
+        try:
+            response = await asyncio.wait_for(loop.run_in_executor(executor, solve_request, request), timeout + REQUEST_GRACE)
+        except asyncio.TimeoutError:
+            self.retire(executor)
+            return 504, {'status': 'TIMEOUT', 'error': f"No answer within {timeout + REQUEST_GRACE:.0f}s"}
+        finally:
+            self.in_flight[executor] -= 1
+            if not self.in_flight[executor]:
+                del self.in_flight[executor]
+                if executor in self.retired:
+                    self.retired.discard(executor)
+                    terminate_pool(executor)
+        return 200, response
+
+    async def handle(self, reader, writer):
+        """
+        One HTTP request per connection
+        """
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            try:
+                status, response = await self.route(method.upper(), target.split('?')[0], body)
+            except Exception as exc:
+                status, response = 500, {'error': repr(exc)}
+            payload = json.dumps(response).encode()
+            writer.write(f"HTTP/1.1 {status} {http.client.responses.get(status, '')}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode()
+                         + payload)
+            await writer.drain()
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            #Malformed request or the client went away
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=SERVICE_HOST, port=SERVICE_PORT, unix_path=None):
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+            where = unix_path
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            where = f"http://{host}:{port}"
+        print(f"Serving {self.state['registration_file']} on {where} ({self.workers} workers, loaded in {self.load_time:.2f}s)", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for executor in self.retired:
+                terminate_pool(executor)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if unix_path is not None and os.path.exists(unix_path):
+                os.remove(unix_path)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def ask(path, payload=None, host=SERVICE_HOST, port=SERVICE_PORT, unix_path=None, timeout=None):
+    """
+    Client: GET path (payload None) or POST payload as JSON, returns (HTTP status, response dict)
+    """
+    if unix_path is not None:
+        connection = UnixHTTPConnection(unix_path, timeout)
+    else:
+        connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        if payload is None:
+            connection.request("GET", path)
+        else:
+            connection.request("POST", path, body=json.dumps(payload), headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b'{}')
+    finally:
+        connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Final exam scheduling service (data and solvers stay loaded)")
+    parser.add_argument("--registrations", default="Course_Reg.csv", help="registration csv or .cols directory")
+    parser.add_argument("--rooms", default="Exam-Rooms.csv")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="solver processes (defaults to the # of CPUs)")
+    parser.add_argument("--no-cache", action="store_true", help="always parse the registration file")
+    args = parser.parse_args(argv)
+
+    service = SchedulingService(args.registrations, args.rooms, args.workers, None if args.no_cache else CACHE_DIR)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
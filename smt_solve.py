@@ -1,7 +1,56 @@
+import time
+
 from z3 import *
+from rooms import room_domains
+from instrument import timed, record, record_z3
+
+
+def out_of_time(start, timeout):
+    #Building the pairwise constraints of a big instance can take longer than the whole time limit
+    return timeout is not None and time.time() - start > timeout
+
+
+def check_status(solver, start, timeout):
+    """
+    solver.check() within what is left of timeout seconds since start (building the constraints counts too).
+    The limit is set on this solver, not with the global z3.set_param. Returns 'SAT', 'UNSAT' or 'TIMEOUT' (z3's unknown:
+    out of time or another resource limit, not a proof that there is no schedule)
+    """
+    if timeout is not None:
+        #Never 0 ms, z3 reads that as no limit
+        solver.set('timeout', max(int((timeout - (time.time() - start)) * 1000), 1))
+    result = solver.check()
+    if result == sat:
+        return 'SAT'
+    if result == unsat:
+        return 'UNSAT'
+    return 'TIMEOUT'
+
+
+def set_hint(solver, exam_time, hint, k):
+    """
+    Gives the solver starting values for the exam times (z3's set_initial_value), slots above k are left for the solver
+    """
+    if not hint or not hasattr(solver, 'set_initial_value'):
+        return
+    for course, slot in hint.items():
+        if course in exam_time and slot <= k:
+            solver.set_initial_value(exam_time[course], slot)
+
+
+def in_domain(var, domain):
+    """
+    var takes one of the room numbers in domain: two bounds when the numbers are consecutive (RoomCatalogue order), else an Or
+    """
+    if not domain:
+        return BoolVal(False)
+    if domain[-1] - domain[0] + 1 == len(domain):
+        return And(var >= domain[0], var <= domain[-1])
+    return Or([var == i for i in domain])
 
 
-def solve_SMT_LIA(course_list, course_conflicts, k, classroom_list, classroom_capacity, enrollments):
+@timed('smt_solve')
+def solve_SMT_LIA(course_list, course_conflicts, k, classroom_list, classroom_capacity, enrollments, hint=None, domains=None, timeout=None):
     """
     Overview: 
     - Creates the solver, 
@@ -11,35 +60,40 @@ def solve_SMT_LIA(course_list, course_conflicts, k, classroom_list, classroom_ca
         - Classroom capacity, Must be greater than or equal to enrollment size
         - two courses cannot be in the same room at the same time
         - Eliminate course conflicts
+    hint: optional course -> slot starting values (e.g. the DSATUR schedule), the solver then repairs it instead of starting from nothing
+    domains: optional course -> room numbers that can hold it (RoomCatalogue.domains), computed from the capacities if not given
+    timeout: optional time limit in seconds
+    Returns (status, schedule): status 'SAT', 'UNSAT' or 'TIMEOUT', schedule course -> [slot, room] or None
     """
+    start = time.time()
     # Define your courses and available time slots
 
 
-    # Create the Z3 solver instance
-    solver = Solver()
+    # Create the Z3 solver instance (Starting values are only supported by the plain SMT solver)
+    solver = SimpleSolver() if hint else Solver()
 
     #Create an SMT variable for each course's exam time, restricting it to domain 1..k
     #Create a dictionary in which course name corresponds to an Int SMT variable.
     exam_time = {course: Int(course) for course in course_list}
+    set_hint(solver, exam_time, hint, k)
 
     #begin to add constraints such that each course must be assigned to a "slot" between 1 annd k
     for course in course_list:
         solver.add(And(exam_time[course] >= 1, exam_time[course] <= k))
 
-    # Create an SMT variable for each course's exam room, restricting to domain 1..number of classrooms
+    # Create an SMT variable for each course's exam room, restricted to the rooms that can hold the course's enrollment
+    # (replaces one capacity implication per course and room)
+    if domains is None:
+        domains = room_domains(course_list, classroom_list, classroom_capacity, enrollments)
     exam_room = {course: Int(f"{course}_room") for course in course_list}
     for course in course_list:
-        solver.add(And(exam_room[course] >= 1, exam_room[course] <= len(classroom_list)))
-
-    # Add classroom capacity constraints: ensure each assigned room can hold the course's enrollment
-    for course in course_list:
-        for i, room in enumerate(classroom_list, start=1):
-            #EX: Course 1 in Classroom 1 -> classroom_capacity[room] >= enrollments[course]
-            solver.add(Implies(exam_room[course] == i, classroom_capacity[room] >= enrollments[course]))
+        solver.add(in_domain(exam_room[course], domains[course]))
 
 
     # Prevent two courses from being scheduled in the same room at the same time
     for i, c1 in enumerate(course_list):
+        if out_of_time(start, timeout):
+            return 'TIMEOUT', None
         #C1Time != C2Time or C1Room != C2Room
         for c2 in course_list[i+1:]:
             solver.add(Or(exam_time[c1] != exam_time[c2], exam_room[c1] != exam_room[c2]))
@@ -49,11 +103,14 @@ def solve_SMT_LIA(course_list, course_conflicts, k, classroom_list, classroom_ca
     # This could be computed from student enrollment data.
 
     # Add the conflict constraints to the solver
-    for c1, c2, key in course_conflicts:
+    for c1, c2 in course_conflicts:
         solver.add(exam_time[c1] != exam_time[c2])
 
     # Check if the constraints are satisfiable and, if so, print a schedule.
-    if solver.check() == sat:
+    status = check_status(solver, start, timeout)
+    record(courses=len(course_list), conflicts=len(course_conflicts))
+    record_z3(solver)
+    if status == 'SAT':
         model = solver.model()
         print("Final Exam Schedule:")
         schedule = {}
@@ -64,41 +121,49 @@ def solve_SMT_LIA(course_list, course_conflicts, k, classroom_list, classroom_ca
             assigned_room_translation = classroom_list[assigned_room-1]
             #print(f"Room: {classroom_list[assigned_room-1]}")
             schedule[course] = [assigned_slot, assigned_room_translation]
-        return schedule
+        return status, schedule
 
     else:
-        print("No valid exam schedule found.")
+        print("No valid exam schedule found." if status == 'UNSAT' else "Out of time, no exam schedule found.")
+        return status, None
 
 
-def conflict_solve(course_list, course_conflicts, k, classroom_list, classroom_capacity, enrollments):
+@timed('optimize')
+def conflict_solve(course_list, course_conflicts, k, classroom_list, classroom_capacity, enrollments, hint=None, domains=None,
+                   timeout=None):
     """
     Use Z3's Library to solve the problem as optimally as possible.
+    hint: optional course -> slot starting values
+    domains: optional course -> room numbers that can hold it
+    timeout: optional time limit in seconds
+    Returns (status, schedule) like solve_SMT_LIA, 'SAT' = optimal schedule
     """
+    start = time.time()
     # Create the Z3 solver instance
     solver = Optimize()
 
     #Create an SMT variable for each course's exam time, restricting it to domain 1..k
     #Create a dictionary in which course name corresponds to an Int SMT variable.
     exam_time = {course: Int(course) for course in course_list}
+    set_hint(solver, exam_time, hint, k)
 
     #begin to add constraints such that each course must be assigned to a "slot" between 1 annd k
     for course in course_list:
         solver.add(And(exam_time[course] >= 1, exam_time[course] <= k))
 
-    # Create an SMT variable for each course's exam room, restricting to domain 1..number of classrooms
+    # Create an SMT variable for each course's exam room, restricted to the rooms that can hold the course's enrollment
+    # (replaces one capacity implication per course and room)
+    if domains is None:
+        domains = room_domains(course_list, classroom_list, classroom_capacity, enrollments)
     exam_room = {course: Int(f"{course}_room") for course in course_list}
     for course in course_list:
-        solver.add(And(exam_room[course] >= 1, exam_room[course] <= len(classroom_list)))
-
-    # Add classroom capacity constraints: ensure each assigned room can hold the course's enrollment
-    for course in course_list:
-        for i, room in enumerate(classroom_list, start=1):
-            #EX: Course 1 in Classroom 1 -> classroom_capacity[room] >= enrollments[course]
-            solver.add(Implies(exam_room[course] == i, classroom_capacity[room] >= enrollments[course]))
+        solver.add(in_domain(exam_room[course], domains[course]))
 
 
     # Prevent two courses from being scheduled in the same room at the same time
     for i, c1 in enumerate(course_list):
+        if out_of_time(start, timeout):
+            return 'TIMEOUT', None
         #C1Time != C2Time or C1Room != C2Room
         for c2 in course_list[i+1:]:
             solver.add(Or(exam_time[c1] != exam_time[c2], exam_room[c1] != exam_room[c2]))
@@ -109,27 +174,33 @@ def conflict_solve(course_list, course_conflicts, k, classroom_list, classroom_c
 
 
     
-    # build a list of 0/1 penalties: 1 if two conflicting courses _share_ a slot
+    # build a list of penalties: the # of shared students if two conflicting courses _share_ a slot
     penalties = [
-        If(exam_time[c1] == exam_time[c2], 1, 0)
-        for c1, c2, _ in course_conflicts
+        If(exam_time[c1] == exam_time[c2], weight, 0)
+        for c1, c2, weight in course_conflicts
     ]
 
     # Optimize and retrieve model
     solver.minimize(cost := Int('conflict_cost'))
     solver.add(cost == Sum(penalties))
-    if solver.check() == sat:
+    status = check_status(solver, start, timeout)
+    record(courses=len(course_list), conflicts=len(course_conflicts))
+    record_z3(solver)
+    if status == 'SAT':
         m = solver.model()
         print("Conflicts remaining:", m[cost])
         print("Final Exam Schedule (with minimized conflicts):")
+        schedule = {}
         for course in course_list:
             assigned_slot = m[exam_time[course]].as_long()
             print(f"Course {course}: Exam Slot {assigned_slot}")
             assigned_room = m[exam_room[course]].as_long()
             print(f"Room: {classroom_list[assigned_room-1]}")
+            schedule[course] = [assigned_slot, classroom_list[assigned_room-1]]
+        return status, schedule
     else:
-        print("No valid assignment found")
-        return
+        print("No valid assignment found" if status == 'UNSAT' else "Out of time, no assignment found")
+        return status, None
     
 
     #Encode in QF_LRA, Can compare to QF_LIA
@@ -137,7 +208,8 @@ def conflict_solve(course_list, course_conflicts, k, classroom_list, classroom_c
     #
 
 
-def solve_SMT_lra(course_list, course_conflicts, k, classroom_list, classroom_capacity, enrollments):
+@timed('smt_solve')
+def solve_SMT_lra(course_list, course_conflicts, k, classroom_list, classroom_capacity, enrollments, domains=None, timeout=None):
     """
     Overview: 
     - Creates the solver, 
@@ -147,7 +219,10 @@ def solve_SMT_lra(course_list, course_conflicts, k, classroom_list, classroom_ca
         - Classroom capacity, Must be greater than or equal to enrollment size
         - two courses cannot be in the same room at the same time
         - Eliminate course conflicts
+    timeout: optional time limit in seconds
+    Returns (status, schedule) like solve_SMT_LIA
     """
+    start = time.time()
     # Define your courses and available time slots
 
 
@@ -178,22 +253,20 @@ def solve_SMT_lra(course_list, course_conflicts, k, classroom_list, classroom_ca
     for course in course_list:
         solver.add(And(exam_room[course] >= 1, exam_room[course] <= len(classroom_list)))
     """
-     # and likewise for rooms:
+     # and likewise for rooms, only the ones that can hold the course's enrollment:
+    if domains is None:
+        domains = room_domains(course_list, classroom_list, classroom_capacity, enrollments)
     for c in course_list:
         solver.add(
             Or(*[ exam_room[c] == i
-                for i in range(1, len(classroom_list)+1) ])
+                for i in domains[c] ] or [False])
         )
 
-    # Add classroom capacity constraints: ensure each assigned room can hold the course's enrollment
-    for course in course_list:
-        for i, room in enumerate(classroom_list, start=1):
-            #EX: Course 1 in Classroom 1 -> classroom_capacity[room] >= enrollments[course]
-            solver.add(Implies(exam_room[course] == i, classroom_capacity[room] >= enrollments[course]))
-
 
     # Prevent two courses from being scheduled in the same room at the same time
     for i, c1 in enumerate(course_list):
+        if out_of_time(start, timeout):
+            return 'TIMEOUT', None
         #C1Time != C2Time or C1Room != C2Room
         for c2 in course_list[i+1:]:
             solver.add(Or(exam_time[c1] != exam_time[c2], exam_room[c1] != exam_room[c2]))
@@ -203,22 +276,63 @@ def solve_SMT_lra(course_list, course_conflicts, k, classroom_list, classroom_ca
     # This could be computed from student enrollment data.
 
     # Add the conflict constraints to the solver
-    for c1, c2, key in course_conflicts:
+    for c1, c2 in course_conflicts:
         solver.add(exam_time[c1] != exam_time[c2])
 
     # Check if the constraints are satisfiable and, if so, print a schedule.
-    if solver.check() == sat:
+    status = check_status(solver, start, timeout)
+    record(courses=len(course_list), conflicts=len(course_conflicts))
+    record_z3(solver)
+    if status == 'SAT':
         model = solver.model()
         print("Final Exam Schedule:")
+        schedule = {}
         for course in course_list:
             assigned_slot = model[exam_time[course]]
             num = assigned_slot.numerator_as_long()
             denom = assigned_slot.denominator_as_long()
             print(f"Course {course}: Exam Slot {num}/{denom}")
             assigned_room = model[exam_room[course]]
-            num = assigned_room.numerator_as_long()
-            denom = assigned_room.denominator_as_long()
-            print(f"Room: {num}/{denom}")
+            room_num = assigned_room.numerator_as_long()
+            room_denom = assigned_room.denominator_as_long()
+            print(f"Room: {room_num}/{room_denom}")
             #print(f"Room: {classroom_list[assigned_room-1]}")
+            #The domains only allow whole numbers, so these are integers
+            schedule[course] = [num // denom, classroom_list[room_num // room_denom - 1]]
+        return status, schedule
     else:
-        print("No valid exam schedule found.")
\ No newline at end of file
+        print("No valid exam schedule found." if status == 'UNSAT' else "Out of time, no exam schedule found.")
+        return status, None
+
+def solve_slot_rooms(courses, classroom_list, classroom_capacity, enrollments, timeout=None, domains=None):
+    """
+    Room assignment for the courses sharing one exam slot: every course gets its own room, big enough for its enrollment.
+    Slots don't interact once the slot coloring is fixed, so each slot is a small independent problem.
+    timeout: optional time limit in seconds
+    domains: optional course -> room numbers that can hold it
+    Returns (status, rooms) where status is 'SAT', 'UNSAT' or 'TIMEOUT' and rooms maps course -> room name (None unless SAT)
+    """
+    #More courses than rooms, no need to ask the solver (pigeonhole problems are slow for it)
+    if len(courses) > len(classroom_list):
+        return 'UNSAT', None
+
+    solver = Solver()
+    if timeout is not None:
+        solver.set('timeout', int(timeout * 1000))
+
+    if domains is None:
+        domains = room_domains(courses, classroom_list, classroom_capacity, enrollments)
+    exam_room = {course: Int(f"{course}_room") for course in courses}
+    for course in courses:
+        #Only the rooms that can hold the course
+        solver.add(in_domain(exam_room[course], domains[course]))
+    if len(courses) > 1:
+        solver.add(Distinct([exam_room[course] for course in courses]))
+
+    result = solver.check()
+    if result == sat:
+        model = solver.model()
+        return 'SAT', {course: classroom_list[model[exam_room[course]].as_long()-1] for course in courses}
+    if result == unsat:
+        return 'UNSAT', None
+    return 'TIMEOUT', None
@@ -1,9 +1,12 @@
 from pysat.formula import CNF
-from pysat.solvers import Glucose3
+from threading import Timer
+from pysat.solvers import Glucose3, Solver
+from instrument import timed, record_pysat
 
 
 
 
+@timed('sat_solve')
 def solve_final_exam_dimacs(dimacs_file, k):
     cnf = CNF(from_file= dimacs_file)
     solver = Glucose3()
@@ -11,6 +14,7 @@ def solve_final_exam_dimacs(dimacs_file, k):
 
     #solve
     satisfiable = solver.solve()
+    record_pysat(solver)
     if satisfiable:
         print("SAT:")
     else: 
@@ -23,4 +27,77 @@ def solve_final_exam_dimacs(dimacs_file, k):
     
 
     return model
-    
+
+
+def solve_final_exam(clauses, solver_name='g3', timeout=None, phases=None):
+    """
+    Solves the clauses in memory (any iterable of clauses, e.g. the generate_clauses generator), no DIMACS file needed.
+    phases: optional list of preferred literals (warm start, see heuristic.schedule_phases)
+    Returns the model, or None if UNSAT (or out of time)
+    """
+    status, model = solve_clauses(clauses, solver_name, timeout, phases)
+    print_status(status)
+    return model
+
+
+def print_status(status):
+    if status == 'SAT':
+        print("SAT:")
+    elif status == 'UNSAT':
+        print("UNSAT, NO SOLUTION")
+    else:
+        print("TIMEOUT, NO SOLUTION FOUND")
+
+
+@timed('sat_solve')
+def solve_clauses(clauses, solver_name='g3', timeout=None, phases=None):
+    """
+    Quiet version of solve_final_exam for workers and benchmarks.
+    solver_name: any pysat solver name, timeout: seconds (only for solvers that can be interrupted)
+    phases: optional list of preferred literals the solver tries first
+    Returns (status, model) where status is 'SAT', 'UNSAT' or 'TIMEOUT' and model is None unless SAT
+    """
+    solver = Solver(name=solver_name)
+    for clause in clauses:
+        solver.add_clause(clause)
+    if phases:
+        solver.set_phases(phases)
+
+    satisfiable = solve_with_timeout(solver, timeout=timeout)
+    record_pysat(solver)
+    if satisfiable:
+        status, model = 'SAT', solver.get_model()
+    elif satisfiable is None:
+        status, model = 'TIMEOUT', None
+    else:
+        status, model = 'UNSAT', None
+    solver.delete()
+    return status, model
+
+
+def supports_interrupt(solver):
+    """
+    Not every pysat solver can be interrupted (CaDiCaL, Lingeling can't)
+    """
+    try:
+        solver.clear_interrupt()
+    except NotImplementedError:
+        return False
+    return True
+
+
+def solve_with_timeout(solver, assumptions=None, timeout=None):
+    """
+    Runs solver.solve, stopping after timeout seconds if the solver supports being interrupted.
+    Returns True/False, or None if it ran out of time
+    """
+    if assumptions is None:
+        assumptions = []
+    if timeout is None or not supports_interrupt(solver):
+        return solver.solve(assumptions=assumptions)
+    timer = Timer(timeout, solver.interrupt)
+    timer.start()
+    satisfiable = solver.solve_limited(assumptions=assumptions, expect_interrupt=True)
+    timer.cancel()
+    solver.clear_interrupt()
+    return satisfiable
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from enrollment import Enrollment, EXCLUDE_COURSES
+from conflict_graph import ConflictGraph
+from columnar import is_columnar, ColumnarRegistrations
+from instrument import timed, record
+
+
+"""
+Streaming ingestion for registration exports too big to load as one data frame (several terms, a whole consortium).
+The files are read chunksize rows at a time (csv chunks, or slices of the memory mapped codes of a .cols directory),
+only the Anonymized ID and Course Title columns are kept, and neither the raw frame nor student_dict/student_edges
+is ever built. Two modes:
+- grouped=False (any row order): every chunk is reduced to unique (student code, course code) pairs packed in one int64,
+  so memory is 8 bytes per registration (plus the ID -> code dictionaries) instead of the frame + the per student
+  edge lists. The Enrollment is built from the pairs at the end.
+- grouped=True (the input is sorted by Anonymized ID, across all the files): once a student's rows are complete they
+  are folded into the (courses x courses) co-enrollment matrix and forgotten, so memory is bounded by the chunk plus
+  the matrix (# of conflicting course pairs) no matter how many rows or students the input has.
+  The diagonal of the matrix is the per course enrollment. No Enrollment (incidence matrix) is kept in this mode.
+  Only the last folded ID is kept to check the order: every new student has to come after it, otherwise it is a
+  ValueError (a student showing up again would be counted twice). Contiguous but unsorted rows are rejected too,
+  sort the export by Anonymized ID or use grouped=False. Course_Reg.csv is not sorted.
+Rows with a missing Anonymized ID or Course Title are a ValueError in both modes.
+"""
+
+STREAM_CHUNKSIZE = 100_000
+STREAM_COLUMNS = ['Anonymized ID', 'Course Title']
+
+#Unique pairs are merged once this many new ones have piled up
+MERGE_EVERY = 1_000_000
+
+
+def iter_registration_chunks(filenames, chunksize=STREAM_CHUNKSIZE):
+    """
+    Yields (Anonymized ID, Course Title) data frames of at most chunksize rows from every file in turn (csv or .cols)
+    """
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    for filename in filenames:
+        if is_columnar(filename):
+            columns = ColumnarRegistrations(filename)
+            codes = {column: columns.codes(column) for column in STREAM_COLUMNS}
+            for start in range(0, len(columns), chunksize):
+                #Only this slice of the mmap'd codes is read
+                chunk = {}
+                for column in STREAM_COLUMNS:
+                    chunk_codes = np.asarray(codes[column][start:start + chunksize])
+                    #-1 is a missing value, indexing with it would quietly give the last value of the dictionary
+                    if (chunk_codes < 0).any():
+                        raise ValueError(f"{filename}: missing {column} in row {start + int(np.argmax(chunk_codes < 0))}")
+                    chunk[column] = columns.values(column)[chunk_codes]
+                yield pd.DataFrame(chunk)
+        else:
+            yield from pd.read_csv(filename, usecols=STREAM_COLUMNS, chunksize=chunksize)
+
+
+class Codes:
+    """
+    Growing value -> integer code dictionary shared by all the chunks (codes in order of first appearance, like pd.factorize)
+    """
+
+    def __init__(self):
+        self.index = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, column):
+        """
+        Integer codes of a chunk's column, new values get the next codes
+        """
+        local_codes, uniques = pd.factorize(column)
+        if (local_codes < 0).any():
+            raise ValueError(f"Missing {column.name} in a registration row")
+        mapping = np.empty(len(uniques), dtype=np.int64)
+        for u, value in enumerate(uniques.tolist()):
+            code = self.index.get(value)
+            if code is None:
+                code = self.index[value] = len(self.values)
+                self.values.append(value)
+            mapping[u] = code
+        return mapping[local_codes]
+
+
+def _fold(co_enrollment, courses, chunk, last):
+    """
+    co_enrollment plus the shared student counts of the complete students in chunk, the # of those students and the last one's ID.
+    A student in two sections of a course counts once.
+    last: ID of the last student folded so far (None at the start). ValueError if the chunk's IDs aren't sorted after it
+    """
+    course_codes = courses.encode(chunk['Course Title'])
+    student_codes, students = pd.factorize(chunk['Anonymized ID'])
+    #factorize numbers the students in order of appearance, so sorted input means strictly increasing uniques
+    ids = students.to_numpy()
+    unsorted = np.flatnonzero(ids[1:] <= ids[:-1])
+    if len(unsorted) or (last is not None and ids[0] <= last):
+        student = ids[unsorted[0] + 1] if len(unsorted) else ids[0]
+        raise ValueError(f"The registrations are not sorted by Anonymized ID (at student {student}), "
+                         "stream with grouped=False or sort them first")
+    n = len(courses)
+    incidence = sparse.csr_matrix((np.ones(len(student_codes), dtype=np.int32), (student_codes, course_codes)), shape=(len(students), n))
+    incidence.data[:] = 1
+    #New courses showed up in this chunk
+    co_enrollment.resize((n, n))
+    return co_enrollment + incidence.T @ incidence, len(students), ids[-1]
+
+
+@timed('stream')
+def stream_registrations(filenames, chunksize=STREAM_CHUNKSIZE, grouped=False):
+    """
+    Reads one or more registration files (csv or .cols) chunk by chunk and returns (course_list, course_sizes, graph, enrollment):
+    - course_list: every course except the study away placeholders, in order of first appearance (same as data_conv)
+    - course_sizes: course -> # of unique students enrolled
+    - graph: ConflictGraph, the same graph build_conflict_graph makes from the whole file
+    - enrollment: the Enrollment, None with grouped=True
+    grouped=True: the rows are sorted by Anonymized ID, completed students are folded into the counts right away (bounded memory).
+                  ValueError if they aren't
+    """
+    courses = Codes()
+    chunks = 0
+    rows = 0
+    if grouped:
+        num_students = 0
+        last_student = None
+        co_enrollment = sparse.csr_matrix((0, 0), dtype=np.int64)
+        pending = None
+        for chunk in iter_registration_chunks(filenames, chunksize):
+            chunks += 1
+            rows += len(chunk)
+            if pending is not None:
+                chunk = pd.concat([pending, chunk], ignore_index=True)
+            #The last student of the chunk may go on in the next one, hold their rows back
+            ids = chunk['Anonymized ID'].to_numpy()
+            other = ids[::-1] != ids[-1]
+            cut = len(ids) - int(other.argmax()) if other.any() else 0
+            chunk, pending = chunk.iloc[:cut], chunk.iloc[cut:]
+            if len(chunk):
+                co_enrollment, folded, last_student = _fold(co_enrollment, courses, chunk, last_student)
+                num_students += folded
+        if pending is not None and len(pending):
+            co_enrollment, folded, last_student = _fold(co_enrollment, courses, pending, last_student)
+            num_students += folded
+        sizes = co_enrollment.diagonal()
+        enrollment = None
+    else:
+        students = Codes()
+        pairs = np.zeros(0, dtype=np.int64)
+        new_pairs = []
+        new_count = 0
+        for chunk in iter_registration_chunks(filenames, chunksize):
+            chunks += 1
+            rows += len(chunk)
+            key = (students.encode(chunk['Anonymized ID']) << 32) | courses.encode(chunk['Course Title'])
+            new_pairs.append(np.unique(key))
+            new_count += len(new_pairs[-1])
+            if new_count >= MERGE_EVERY:
+                pairs = np.unique(np.concatenate([pairs] + new_pairs))
+                new_pairs, new_count = [], 0
+        pairs = np.unique(np.concatenate([pairs] + new_pairs))
+        student_codes = pairs >> 32
+        course_codes = pairs & 0xFFFFFFFF
+        incidence = sparse.csr_matrix((np.ones(len(pairs), dtype=np.int32), (student_codes, course_codes)),
+                                      shape=(len(students), len(courses)))
+        enrollment = Enrollment(np.asarray(students.values), np.asarray(courses.values, dtype=object), incidence)
+        co_enrollment = incidence.T @ incidence
+        num_students = len(students)
+        sizes = np.asarray(incidence.sum(axis=0)).ravel()
+
+    course_list = [course for course in courses.values if course not in EXCLUDE_COURSES]
+    course_sizes = {course: int(size) for course, size in zip(courses.values, sizes)}
+    graph = ConflictGraph.from_co_enrollment(courses.values, co_enrollment, course_list)
+    record(chunks=chunks, rows=rows, students=num_students, courses=len(course_list),
+           nodes=graph.number_of_nodes(), edges=graph.number_of_edges())
+    return course_list, course_sizes, graph, enrollment
@@ -0,0 +1,61 @@
+"""
+Preprocessing on the conflict graph before the SAT solve.
+Slot labels are interchangeable, so a clique of courses (every pair shares a student) can be pinned to slots 1, 2, ... without losing any schedule.
+The clique also gives a lower bound on the # of slots needed, and the DSATUR coloring (heuristic.py) gives an upper bound:
+    k < lower bound -> no schedule, no need to call the solver
+    k >= upper bound -> the greedy coloring is already a schedule
+"""
+
+from heuristic import dsatur, weighted_degrees
+
+
+def _adjacency(graph):
+    return {node: set(graph.neighbors(node)) for node in graph}
+
+
+def find_large_clique(graph, tries=20):
+    """
+    Greedy clique search, started from the tries highest degree courses.
+    From a start course, keep adding the candidate with the most neighbors among the remaining candidates
+    (ties go to the course with the most shared students), where the candidates are the courses adjacent to everything picked so far.
+    Returns the largest clique found as a list of courses
+    """
+    adjacency = _adjacency(graph)
+    weighted = weighted_degrees(graph)
+    order = sorted(adjacency, key=lambda node: (len(adjacency[node]), weighted[node]), reverse=True)
+
+    best = []
+    for start in order[:tries]:
+        #No clique through this node can beat the best one
+        if len(adjacency[start]) + 1 <= len(best):
+            continue
+        clique = [start]
+        candidates = set(adjacency[start])
+        while candidates:
+            node = max(candidates, key=lambda c: (len(adjacency[c] & candidates), weighted[c], str(c)))
+            clique.append(node)
+            candidates &= adjacency[node]
+        if len(clique) > len(best):
+            best = clique
+    return best
+
+
+def chromatic_bounds(graph, tries=20):
+    """
+    Returns a dict with
+    - lower: size of the largest clique found (need at least this many slots)
+    - upper: # of slots the DSATUR coloring used (this many slots is always enough)
+    - clique: the clique
+    - greedy: the DSATUR schedule
+    """
+    clique = find_large_clique(graph, tries)
+    greedy = dsatur(graph)
+    upper = max(greedy.values(), default=0)
+    return {'lower': len(clique), 'upper': upper, 'clique': clique, 'greedy': greedy}
+
+
+def clique_fixing(clique, k):
+    """
+    Pins the i-th course of the clique to slot i (course -> slot), for the first k clique courses
+    """
+    return {course: slot for slot, course in enumerate(clique[:k], start=1)}